@@ -1,16 +1,32 @@
-import os
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import Flask, Response, render_template, request, redirect, url_for, session, flash, jsonify
 from flask_login import login_user, logout_user, current_user, login_required
+from sqlalchemy import or_
+from sqlalchemy.orm import joinedload
 
 from datetime import datetime, timedelta
 
-from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
 
 from cinema import create_app, db
 from cinema.models import Usuario, Filme, Cinema, Alimento, Sala, Sessao, CompraAlimento, CompraSessao, Carrinho, AssentoComprado
+from cinema.consultas import consulta_sessoes_filtrada, filtros_sessoes, catalogo_filmes, catalogo_salas, catalogo_alimentos, catalogo_sessoes
+from cinema.cache import cache_catalogo
+from cinema.respostas import pagina_em_cache
+from cinema.imagens import salvar_poster
+from cinema.identidade import registrar_login, registrar_logout
+from cinema.senhas import gerar_hash, autenticar, verificar_senha, confirmar_senha, SenhasOcupadas
+from cinema.assentos import mapa_da_sessao, indice_assento, rotulo_assento
+from cinema.reservas import assentos_reservados, reservar_assento, cancelar_reserva
+from cinema.pedidos import finalizar_compra, CarrinhoVazio, AssentosIndisponiveis
+from cinema.migracoes import aplicar_migracoes
+from cinema.carrinho import obter_carrinho, adicionar_alimento_ao_carrinho, adicionar_sessao_ao_carrinho, itens_do_carrinho
+from cinema.agenda import conflito_sessao
+from cinema.paginacao import pagina_admin, filtro_prefixo
+from cinema.busca import buscar, TIPOS as TIPOS_BUSCA
+from cinema.analises import RELATORIOS, ler_periodo, receita_por_dia, ranking_filmes, ocupacao_sessoes, alimentos_por_cinema, relatorio_csv
+from cinema.programacao import gerar_programacao, gravar_programacao, ler_hora, proxima_segunda
 
 from functools import wraps
+import secrets
 
 
 app = create_app()
@@ -22,7 +38,7 @@ app.permanent_session_lifetime = timedelta(days=7)
 def login_required(f): 
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'usuario_id' not in session:
+        if 'usuario_id' not in session or not current_user.is_authenticated:  # Sessão antiga após troca de senha também sai
             flash("Você precisa estar logado para acessar esta página.", "warning")
             return redirect(url_for('login')) # Redireciona para login se não estiver logado
         return f(*args, **kwargs)
@@ -39,8 +55,15 @@ def admin_required(f):
     return decorated_function
 
 
+# Muitas verificações de senha ao mesmo tempo
+@app.errorhandler(SenhasOcupadas)
+def senhas_ocupadas(erro):
+    return "Muitos acessos no momento. Tente novamente em alguns segundos.", 503
+
+
 # Página inicial
 @app.route('/')
+@pagina_em_cache('estatico')
 def inicio():
     return render_template('Inicio.html')
 
@@ -57,8 +80,9 @@ def login():
         senha = request.form['senha']
         usuario = Usuario.query.filter_by(email=email).first()  # Verifica se o e-mail já está registrado
 
-        if usuario and check_password_hash(usuario.senha, senha):  # Compara a senha
+        if autenticar(usuario, senha):  # Compara a senha (e atualiza o hash se os parâmetros mudaram)
             login_user(usuario)  # Usa o login_user do Flask-Login
+            registrar_login(usuario)  # Guarda id, admin e versão na sessão
             return redirect(url_for('logado'))
         else:
             flash("Credenciais inválidas. Tente novamente.", "danger")
@@ -70,6 +94,7 @@ def login():
 @app.route('/logout')
 def logout():
     logout_user()  # Encerra a sessão do usuário
+    registrar_logout()
     return redirect(url_for('login'))
 
 
@@ -95,7 +120,7 @@ def criar_usuario():
 
         is_admin = email == 'sofiarodriguessilva2@gmail.com' # Define o admin com base no email
         data_nascimento = datetime.strptime(data_nascimento_str, '%Y-%m-%d').date()
-        senha_hash = generate_password_hash(senha)
+        senha_hash = gerar_hash(senha)
         novo_usuario = Usuario(nome, email, senha_hash, data_nascimento, is_admin)
 
         db.session.add(novo_usuario) # Adiciona o novo usuário ao banco de dados
@@ -116,15 +141,21 @@ def perfil():
 @login_required
 @admin_required
 def listar_usuarios():
-    usuarios = Usuario.query.all()
-    return render_template('listarUsuarios.html', usuarios=usuarios)
+    consulta = Usuario.query
+    busca = request.args.get('q', '').strip()
+    if busca:
+        consulta = consulta.filter(or_(filtro_prefixo(Usuario.nome, busca), filtro_prefixo(Usuario.email, busca)))
+    if request.args.get('admin') in ('0', '1'):
+        consulta = consulta.filter(Usuario.is_admin == (request.args['admin'] == '1'))
+
+    # Uma página por vez, buscando a partir da última linha vista (sem OFFSET nem contagem da tabela)
+    pagina = pagina_admin(consulta, {'id': Usuario.id, 'nome': Usuario.nome, 'email': Usuario.email}, 'id', Usuario.id)
+    return render_template('listarUsuarios.html', usuarios=pagina.items, pagina=pagina)
 
 # Deletar usuário
 @app.route('/deletar_usuario', methods=['GET', 'POST'])
 @login_required
 def deletar_usuario():
-    usuario_atual = Usuario.query.get(current_user.id)
-
     if request.method == 'POST':
         email = request.form['email']
         senha = request.form['senha']
@@ -134,13 +165,15 @@ def deletar_usuario():
             flash("E-mail não encontrado.", "danger")
             return redirect(url_for('deletar_usuario'))
 
-        if usuario.id != usuario_atual.id:
+        if usuario.id != current_user.id:
             flash("Não é permitido deletar a conta de outro usuário.", "danger")
             return redirect(url_for('deletar_usuario'))
 
-        if check_password_hash(usuario.senha, senha):
+        if verificar_senha(usuario.senha, senha):
             db.session.delete(usuario)
             db.session.commit()
+            logout_user()
+            registrar_logout()
             flash("Conta deletada com sucesso.", "success")
             return redirect(url_for('inicio'))
         else:
@@ -155,14 +188,15 @@ def deletar_usuario():
 @app.route('/usuario/atualizar', methods=['GET', 'POST'])
 @login_required
 def atualizar_usuario():
-    usuario = Usuario.query.get(current_user.id)
+    usuario = current_user  # Dados do usuário em memória, suficientes para o formulário
 
     if request.method == 'POST':
+        usuario = db.session.get(Usuario, current_user.id)  # Objeto do banco só para a alteração
         senha_atual = request.form['senha_atual']
         senha_nova = request.form['senha_nova']
         novo_email = request.form['email']
 
-        if not check_password_hash(usuario.senha, senha_atual):
+        if not verificar_senha(usuario.senha, senha_atual):
             flash("Senha atual incorreta.", "danger")
             return redirect(url_for('atualizar_usuario'))
 
@@ -172,10 +206,11 @@ def atualizar_usuario():
 
         usuario.nome = request.form['nome']
         usuario.email = novo_email
-        usuario.senha = generate_password_hash(senha_nova)
+        usuario.senha = gerar_hash(senha_nova)
         usuario.data_nascimento = datetime.strptime(request.form['data_nascimento'], '%Y-%m-%d').date()
 
         db.session.commit()
+        session['usuario_versao'] = usuario.versao  # Mantém esta sessão válida após a troca de senha
         flash("Dados atualizados com sucesso.", "success")
         return redirect(url_for('perfil'))
 
@@ -186,8 +221,49 @@ def atualizar_usuario():
 @login_required
 @admin_required
 def gerenciar_filmes():
-    filmes = Filme.query.all()  # Busca todos os filmes cadastrados
-    return render_template('filmes.html', filmes=filmes)
+    consulta = Filme.query
+    busca = request.args.get('q', '').strip()
+    if busca:
+        consulta = consulta.filter(filtro_prefixo(Filme.titulo, busca))
+    if request.args.get('genero'):
+        consulta = consulta.filter(Filme.genero == request.args['genero'])
+    if request.args.get('classificacao'):
+        consulta = consulta.filter(Filme.classificacao == request.args['classificacao'])
+
+    pagina = pagina_admin(consulta, {'id': Filme.id, 'titulo': Filme.titulo}, 'titulo', Filme.id)  # Uma página de filmes
+    return render_template('filmes.html', filmes=pagina.items, pagina=pagina)
+
+#Estatísticas do cache do catálogo
+@app.route('/cache/estatisticas')
+@login_required
+@admin_required
+def estatisticas_cache():
+    return jsonify(cache_catalogo.estatisticas())
+
+# Relatórios de vendas e ocupação (lidos dos resumos, não das tabelas de vendas)
+@app.route('/relatorios')
+@login_required
+@admin_required
+def relatorios():
+    desde, ate = ler_periodo(request.args)
+    cinema_id = request.args.get('cinema_id', type=int)
+    dias = receita_por_dia(desde, ate, cinema_id)
+    return render_template('relatorios.html', desde=desde, ate=ate, cinema_id=cinema_id,
+                           cinemas=Cinema.query.order_by(Cinema.nome).all(), dias=dias,
+                           total=sum(d['receita_ingressos'] + d['receita_alimentos'] for d in dias),
+                           filmes=ranking_filmes(desde, ate), sessoes=ocupacao_sessoes(desde, ate, cinema_id),
+                           alimentos=alimentos_por_cinema(desde, ate, cinema_id))
+
+@app.route('/relatorios/<nome>.csv')
+@login_required
+@admin_required
+def exportar_relatorio(nome):
+    if nome not in RELATORIOS:
+        return "Relatório não encontrado", 404
+    desde, ate = ler_periodo(request.args)
+    conteudo = relatorio_csv(nome, desde, ate, request.args.get('cinema_id', type=int))
+    arquivo = f"{nome}_{desde.isoformat()}_{ate.isoformat()}.csv"
+    return Response(conteudo, mimetype='text/csv', headers={'Content-Disposition': f'attachment; filename={arquivo}'})
 
 #Adicionar os filmes
 @app.route('/adicionar_filmes', methods=['GET', 'POST'])
@@ -202,10 +278,9 @@ def adicionar_filmes():
         data_lancamento = datetime.strptime(request.form['data_lancamento'], '%Y-%m-%d')
         foto = request.files['foto']
 
-        # Verifica se a foto foi enviada
+        # Verifica se a foto foi enviada (as miniaturas são geradas em segundo plano)
         if foto:
-            foto_filename = secure_filename(foto.filename)
-            foto.save(os.path.join('cinema', 'static', 'img', 'uploads', foto_filename))
+            foto_filename = salvar_poster(app, foto)
         else:
             foto_filename = None
 
@@ -225,9 +300,24 @@ def adicionar_filmes():
 #listar todos os filmes
 @app.route('/listar_filmes', methods=['GET'])
 @login_required
+@pagina_em_cache('filmes')
 def listar_filmes():
-    filmes = Filme.query.all()  # Recupera todos os filmes no banco de dados
-    return render_template('listar_filmes.html', filmes=filmes)  # Renderiza a página e passa os filmes para o template
+    filmes = catalogo_filmes()  # Recupera todos os filmes (do cache, quando possível)
+    busca = request.args.get('q', '').strip()
+    if busca:
+        por_id = {filme.id: filme for filme in filmes}
+        filmes = [por_id[r['id']] for r in buscar('filmes', busca, limite=50) if r['id'] in por_id]
+    return render_template('listar_filmes.html', filmes=filmes, busca=busca)  # Renderiza a página e passa os filmes para o template
+
+# Autocompletar de filmes e alimentos (JSON)
+@app.route('/busca')
+@login_required
+def busca():
+    tipo = request.args.get('tipo', 'filmes')
+    if tipo not in TIPOS_BUSCA:
+        return jsonify({'erro': 'tipo inválido'}), 400
+    limite = min(max(request.args.get('limite', 10, type=int), 1), 50)
+    return jsonify(buscar(tipo, request.args.get('q', ''), limite))
 
 #deletar filme
 @app.route('/deletar_filme', methods=['GET', 'POST'])
@@ -243,8 +333,7 @@ def deletar_filme():
             flash("Filme não encontrado.", "warning")
             return redirect(url_for('deletar_filme'))
 
-        admin = Usuario.query.get(current_user.id) # Verifica se a senha do admin está correta
-        if not check_password_hash(admin.senha, senha_admin):
+        if not confirmar_senha(current_user, senha_admin): # Verifica se a senha do admin está correta
             flash("Senha incorreta. Tente novamente.", "danger")
             return redirect(url_for('deletar_filme'))
 
@@ -279,8 +368,7 @@ def atualizar_filme():
             return redirect(url_for('atualizar_filme'))
 
         # Verifica a senha do admin
-        admin = Usuario.query.get(current_user.id)
-        if not check_password_hash(admin.senha, senha_admin):
+        if not confirmar_senha(current_user, senha_admin):
             flash("Senha incorreta. Tente novamente.", "danger")
             return redirect(url_for('atualizar_filme'))
 
@@ -294,9 +382,7 @@ def atualizar_filme():
         # Processa a nova foto, se enviada
         foto = request.files['foto']
         if foto:
-            foto_filename = secure_filename(foto.filename)
-            foto.save(os.path.join('cinema', 'static', 'img', 'uploads', foto_filename))
-            filme.foto = foto_filename
+            filme.foto = salvar_poster(app, foto)
 
         try:
             db.session.commit()  # Salva as mudanças no banco de dados
@@ -314,8 +400,13 @@ def atualizar_filme():
 @login_required
 @admin_required
 def gerenciar_cinemas():
-    cinema = Cinema.query.all()  # Busca todos os filmes cadastrados
-    return render_template('cinemas.html', cinema=cinema)
+    consulta = Cinema.query
+    busca = request.args.get('q', '').strip()
+    if busca:
+        consulta = consulta.filter(filtro_prefixo(Cinema.nome, busca))
+
+    pagina = pagina_admin(consulta, {'id': Cinema.id, 'nome': Cinema.nome}, 'nome', Cinema.id)  # Uma página de cinemas
+    return render_template('cinemas.html', cinema=pagina.items, pagina=pagina)
 
 #Adicionar cinema
 @app.route('/adicionar_cinema', methods=['GET', 'POST'])
@@ -356,8 +447,7 @@ def atualizar_cinema():
             return redirect(url_for('atualizar_cinema'))
 
         # Verifica a senha do admin
-        admin = Usuario.query.get(current_user.id)
-        if not check_password_hash(admin.senha, senha_admin):
+        if not confirmar_senha(current_user, senha_admin):
             flash("Senha incorreta. Tente novamente.", "danger")
             return redirect(url_for('atualizar_filme'))
 
@@ -390,8 +480,7 @@ def deletar_cinema():
             flash("Filme não encontrado.", "warning")
             return redirect(url_for('deletar_cinema'))
 
-        admin = Usuario.query.get(current_user.id) # Verifica se a senha do admin está correta
-        if not check_password_hash(admin.senha, senha_admin):
+        if not confirmar_senha(current_user, senha_admin): # Verifica se a senha do admin está correta
             flash("Senha incorreta. Tente novamente.", "danger")
             return redirect(url_for('deletar_cinema'))
 
@@ -413,8 +502,15 @@ def deletar_cinema():
 @login_required
 @admin_required
 def gerenciar_salas():
-    salas = Sala.query.all()  # Busca todas as salas cadastradas
-    return render_template('salas.html', salas=salas)  # Tabela de Salas
+    consulta = Sala.query.options(joinedload(Sala.cinema))  # O template mostra o nome do cinema de cada sala
+    if request.args.get('cinema_id', type=int):
+        consulta = consulta.filter(Sala.cinema_id == request.args.get('cinema_id', type=int))
+    busca = request.args.get('q', '').strip()
+    if busca:
+        consulta = consulta.filter(filtro_prefixo(Sala.numero, busca))
+
+    pagina = pagina_admin(consulta, {'id': Sala.id, 'numero': Sala.numero, 'cinema': Sala.cinema_id}, 'id', Sala.id)
+    return render_template('salas.html', salas=pagina.items, pagina=pagina)  # Tabela de Salas
 
 #Adicionar sala
 @app.route('/adicionar_sala', methods=['GET', 'POST'])
@@ -457,8 +553,7 @@ def atualizar_sala():
             return redirect(url_for('atualizar_sala'))
 
         # Verifica a senha do admin
-        admin = Usuario.query.get(current_user.id)
-        if not check_password_hash(admin.senha, senha_admin):
+        if not confirmar_senha(current_user, senha_admin):
             flash("Senha incorreta. Tente novamente.", "danger")
             return redirect(url_for('atualizar_filme'))
 
@@ -490,8 +585,7 @@ def deletar_sala():
             flash("Sala não encontrada.", "warning")
             return redirect(url_for('deletar_sala'))
 
-        admin = Usuario.query.get(current_user.id) # Verifica se a senha do admin está correta
-        if not check_password_hash(admin.senha, senha_admin):
+        if not confirmar_senha(current_user, senha_admin): # Verifica se a senha do admin está correta
             flash("Senha incorreta. Tente novamente.", "danger")
             return redirect(url_for('deletar_sala'))
 
@@ -513,14 +607,16 @@ def deletar_sala():
 @login_required
 @admin_required
 def gerenciar_sessoes():
-    sessao = Sessao.query.all()  # Busca todas as sessoes cadastradas
-    return render_template('sessao.html', sessao=sessao)  # Tabela de sessoes
+    consulta = consulta_sessoes_filtrada(request.args)  # Sessões com filme e sala já carregados
+    pagina = pagina_admin(consulta, {'horario': Sessao.horario, 'id': Sessao.id}, 'horario', Sessao.id)
+    return render_template('sessao.html', sessao=pagina.items, pagina=pagina)  # Tabela de sessoes
 
 @app.route('/sessoes')
 @login_required
+@pagina_em_cache('sessoes')
 def ver_Sessoes():
-    sessao = Sessao.query.all()  # Busca todas as sessoes cadastradas
-    return render_template('listar_sessoes.html', sessao=sessao)  # Tabela de sessoes
+    pagina = catalogo_sessoes(**filtros_sessoes(request.args))  # Busca as sessoes (do cache, quando possível)
+    return render_template('listar_sessoes.html', sessao=pagina.items, pagina=pagina)  # Tabela de sessoes
 
 #adicionar sessoes
 @app.route('/adicionar_sessao', methods=['GET', 'POST'])
@@ -536,6 +632,11 @@ def adicionar_sessao():
         horario = datetime.strptime(horario, "%Y-%m-%dT%H:%M")
         nova_sessao = Sessao(filme_id=filme_id, sala_id=sala_id, horario=horario, preco=preco) # Cria uma nova sessão
 
+        conflito = conflito_sessao(int(sala_id), int(filme_id), horario)  # A sala precisa estar livre (filme + limpeza)
+        if conflito:
+            flash(f'A sala já tem a sessão de {conflito.filme.titulo} às {conflito.horario.strftime("%d/%m/%Y %H:%M")} nesse horário.', 'warning')
+            return render_template('adicionar_sessao.html', filmes=catalogo_filmes(), salas=catalogo_salas())
+
         try:
             db.session.add(nova_sessao)
             db.session.commit()
@@ -545,11 +646,41 @@ def adicionar_sessao():
             db.session.rollback()
             flash(f'Ocorreu um erro ao adicionar a sessão: {e}', 'danger')
 
-    filmes = Filme.query.all() # Busca filmes e salas disponíveis para o formulário
-    salas = Sala.query.all()
+    filmes = catalogo_filmes() # Busca filmes e salas disponíveis para o formulário
+    salas = catalogo_salas()
 
     return render_template('adicionar_sessao.html', filmes=filmes, salas=salas)
 
+#gerar a programação da semana
+@app.route('/gerar_programacao', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def gerar_programacao_semana():
+    filmes = catalogo_filmes()
+    cinemas = Cinema.query.order_by(Cinema.nome).all()
+
+    if request.method == 'POST':
+        try:
+            inicio = datetime.strptime(request.form['inicio'], "%Y-%m-%d").date()
+            abertura = ler_hora(request.form['abertura'])
+            fechamento = ler_hora(request.form['fechamento'])
+            preco = float(request.form['preco'])
+            cinema_id = int(request.form['cinema_id']) if request.form.get('cinema_id') else None
+            pesos = {f.id: float(request.form.get(f'peso_{f.id}') or 1) for f in filmes}  # Procura de cada filme
+        except ValueError:
+            flash('Formato inválido para data, horário, preço ou peso.', 'danger')
+            return redirect(url_for('gerar_programacao_semana'))
+
+        try:
+            planejadas = gerar_programacao(inicio, abertura, fechamento, pesos, cinema_id)
+            quantidade = gravar_programacao(planejadas, preco)  # INSERTs em massa numa transação só
+            flash(f'{quantidade} sessões geradas para a semana de {inicio.strftime("%d/%m/%Y")}.', 'success')
+            return redirect(url_for('gerenciar_sessoes'))
+        except Exception as e:
+            flash(f'Ocorreu um erro ao gerar a programação: {e}', 'danger')
+
+    return render_template('gerar_programacao.html', filmes=filmes, cinemas=cinemas, inicio=proxima_segunda())
+
 #atualizar sessao
 @app.route('/atualizar_sessao', methods=['GET', 'POST'])
 @login_required
@@ -567,6 +698,11 @@ def atualizar_sessao():
                 flash('Sessão não encontrada.', 'warning')
                 return redirect(url_for('gerenciar_sessoes'))
 
+            conflito = conflito_sessao(int(request.form['sala_id']), int(request.form['filme_id']), sessao.horario, ignorar_id=sessao.id)
+            if conflito:
+                flash(f'A sala já tem a sessão de {conflito.filme.titulo} às {conflito.horario.strftime("%d/%m/%Y %H:%M")} nesse horário.', 'warning')
+                return redirect(url_for('atualizar_sessao', id=sessao.id))
+
             # Atualiza os dados da sessão
             sessao.filme_id = request.form['filme_id']
             sessao.sala_id = request.form['sala_id']
@@ -594,8 +730,8 @@ def atualizar_sessao():
         else:
             sessao = None
     
-    filmes = Filme.query.all()# Busca filmes e salas para exibir no formulário
-    salas = Sala.query.all()
+    filmes = catalogo_filmes()# Busca filmes e salas para exibir no formulário
+    salas = catalogo_salas()
 
     return render_template('atualizar_sessao.html', filmes=filmes, salas=salas, sessao=sessao)
 
@@ -629,7 +765,7 @@ def deletar_sessao():
             db.session.rollback()
             flash(f'Ocorreu um erro ao deletar a sessão: {e}', 'danger')
 
-    filmes = Filme.query.all()
+    filmes = catalogo_filmes()
     return render_template('deletarSessao.html', filmes=filmes)
 
 
@@ -638,14 +774,21 @@ def deletar_sessao():
 @login_required
 @admin_required
 def gerenciar_alimentos():
-    alimentos = Alimento.query.all()  # Busca todas as salas cadastradas
-    return render_template('alimento.html', alimentos=alimentos)  # Tabela de Salas
+    consulta = Alimento.query
+    busca = request.args.get('q', '').strip()
+    if busca:
+        consulta = consulta.filter(filtro_prefixo(Alimento.nome, busca))
+    if request.args.get('tipo'):
+        consulta = consulta.filter(Alimento.tipoDeAlimentos == request.args['tipo'])
+
+    pagina = pagina_admin(consulta, {'id': Alimento.id, 'nome': Alimento.nome}, 'nome', Alimento.id)
+    return render_template('alimento.html', alimentos=pagina.items, pagina=pagina)  # Tabela de alimentos
 
 @app.route('/alimentos')
 @login_required
 def ver_alimentos():
-    carrinho = Carrinho.query.filter_by(usuario_id=current_user.id).first()
-    alimentos = Alimento.query.all()  # Busca todas as sessoes cadastradas
+    carrinho = obter_carrinho(current_user.id)
+    alimentos = catalogo_alimentos()  # Busca todos os alimentos (do cache, quando possível)
     return render_template('listar_alimentos.html', alimentos=alimentos, carrinho=carrinho)  # Tabela de sessoes
 
 #adicionar alimentos
@@ -687,8 +830,7 @@ def atualizar_alimentos():
             return redirect(url_for('gerenciar_alimentos'))
 
         # Verifica a senha do admin
-        admin = Usuario.query.get(current_user.id)
-        if not check_password_hash(admin.senha, senha_admin):
+        if not confirmar_senha(current_user, senha_admin):
             flash("Senha incorreta. Tente novamente.", "danger")
             return redirect(url_for('atualizar_alimentos'))  # Mantém na página de atualização
 
@@ -725,8 +867,7 @@ def deletar_alimentos():
             return redirect(url_for('gerenciar_alimentos'))  # Redireciona para a página de gerenciamento
 
         # Verifica a senha do admin
-        admin = Usuario.query.get(current_user.id)
-        if not check_password_hash(admin.senha, senha_admin):
+        if not confirmar_senha(current_user, senha_admin):
             flash("Senha incorreta. Tente novamente.", "danger")
             return redirect(url_for('deletar_alimentos'))  # Mantém na página de deleção
 
@@ -759,62 +900,123 @@ def comprar_assento():
         if not sessao:
             return "Sessão não encontrada", 404
 
+    mapa = mapa_da_sessao(sessao) if sessao else None  # Mapa de ocupação da sala para a sessão
+
     if request.method == 'POST':
         assento = request.form['assento']  # Número do assento
         # Se a sessão foi encontrada, criamos o assento comprado
         if sessao:
-            novo_item = AssentoComprado(sessao_id=sessao.id, assento=assento)
-            db.session.add(novo_item)
-            db.session.commit()
-            return redirect(url_for('ver_carrinho'))  # Redireciona para o carrinho
+            indice = indice_assento(assento, mapa.capacidade)
+            if indice is None:
+                flash("Assento inválido para esta sala.", "danger")
+                return redirect(url_for('comprar_assento', sessao_id=sessao.id))
+            if mapa.ocupado(indice):
+                flash("Este assento já foi comprado. Escolha outro.", "warning")
+                return redirect(url_for('comprar_assento', sessao_id=sessao.id))
+
+            # Reserva o assento por alguns minutos até a confirmação da compra
+            assento = rotulo_assento(indice)
+            if not reservar_assento(sessao.id, assento, current_user.id):
+                flash("Este assento está reservado por outra pessoa. Escolha outro.", "warning")
+                return redirect(url_for('comprar_assento', sessao_id=sessao.id))
+            return redirect(url_for('confirmar_assento', sessao_id=sessao.id, assento=assento))
+
+    reservados = assentos_reservados(sessao.id) if sessao else set()
 
     # Retorna o template com a sessão
-    return render_template('comprar_assento.html', sessao=sessao)
+    return render_template('comprar_assento.html', sessao=sessao, mapa=mapa, reservados=reservados)
+
+#confirmar a compra do assento reservado
+@app.route('/confirmar_assento', methods=['GET', 'POST'])
+@login_required
+def confirmar_assento():
+    sessao = Sessao.query.get_or_404(request.args.get('sessao_id'))
+    assento = request.args.get('assento')
+
+    if request.method == 'POST':
+        if request.form.get('acao') == 'cancelar':
+            cancelar_reserva(sessao.id, assento, current_user.id)
+            flash("Reserva cancelada.", "info")
+            return redirect(url_for('comprar_assento', sessao_id=sessao.id))
+
+        # Renova a reserva e coloca o ingresso no carrinho; a compra acontece no checkout
+        if reservar_assento(sessao.id, assento, current_user.id):
+            adicionar_sessao_ao_carrinho(obter_carrinho(current_user.id, criar=True), sessao, assento=assento)
+            flash("Assento adicionado ao carrinho. Finalize a compra antes que a reserva expire.", "success")
+            return redirect(url_for('ver_carrinho'))  # Redireciona para o carrinho
+
+        flash("Sua reserva expirou ou o assento já foi vendido. Escolha outro.", "danger")
+        return redirect(url_for('comprar_assento', sessao_id=sessao.id))
+
+    return render_template('confirmar_assento.html', sessao=sessao, assento=assento)
 
 @app.route('/ver_carrinho')
 @login_required
 def ver_carrinho():
-    carrinho = Carrinho(usuario_id=current_user.id)
-    db.session.add(carrinho)
-    db.session.commit()
+    carrinho = obter_carrinho(current_user.id)  # Apenas lê o carrinho do usuário, sem criar linhas novas
 
     # Armazena o carrinho_id na sessão
-    session['carrinho_id'] = carrinho.id
+    if carrinho:
+        session['carrinho_id'] = carrinho.id
 
-    flash("Carrinho criado com sucesso!", "success")
-    carrinho = Carrinho.query.filter_by(usuario_id=current_user.id).first()  # Filtra o carrinho do usuário logado
-    return render_template('ver_carrinho.html', carrinho=carrinho)
+    itens = itens_do_carrinho(carrinho)
+    total = carrinho.total if carrinho else 0.0
+    chave = secrets.token_urlsafe(16)  # Chave do checkout: reenviar o formulário não gera outro pedido
+    return render_template('ver_carrinho.html', carrinho=carrinho, itens=itens, total=total, chave=chave)
+
+#finalizar a compra do carrinho
+@app.route('/finalizar_compra', methods=['POST'])
+@login_required
+def finalizar_compra_carrinho():
+    chave = request.headers.get('Idempotency-Key') or request.form.get('chave')
+    if not chave:
+        flash("Não foi possível identificar a compra. Tente novamente.", "danger")
+        return redirect(url_for('ver_carrinho'))
+
+    try:
+        pedido = finalizar_compra(current_user.id, chave[:64])
+    except CarrinhoVazio:
+        flash("Seu carrinho está vazio.", "warning")
+        return redirect(url_for('ver_carrinho'))
+    except AssentosIndisponiveis as e:
+        assentos = ', '.join(assento for _, assento in e.assentos)
+        flash(f"Alguns assentos não estão mais disponíveis{': ' + assentos if assentos else ''}. "
+              "Remova-os do carrinho e escolha outros.", "danger")
+        return redirect(url_for('ver_carrinho'))
+
+    flash(f"Compra finalizada! Pedido nº {pedido.id} - Total: R$ {pedido.total:.2f}", "success")
+    return redirect(url_for('ver_carrinho'))
 
 @app.route('/adicionar_alimento_carrinho', methods=['GET', 'POST'])
 @login_required
 def adicionar_alimento_carrinho():
-    carrinho = Carrinho.query.filter_by(usuario_id=current_user.id).first()
+    carrinho = obter_carrinho(current_user.id)
     if request.method == 'POST':
         # Verificando se o campo alimento_id existe no formulário
         if 'alimento_id' not in request.form:
             flash("O alimento não foi selecionado corretamente.", "danger")
             return redirect(url_for('adicionar_alimento_carrinho'))  # Redireciona se o campo não existir
 
-        carrinho_id = carrinho.id if carrinho else None
-        alimento_id = request.form['alimento_id']
-        nome = request.form['nome']
-        quantidade = int(request.form['quantidade'])
-        preco_unitario = float(request.form['preco_unitario'])
-        subtotal = quantidade * preco_unitario
-
-        compra_alimento = CompraAlimento(carrinho_id=carrinho_id, alimento_id=alimento_id, nome=nome, quantidade=quantidade, preco_unitario=preco_unitario, subtotal=subtotal)
+        alimento = Alimento.query.get_or_404(request.form['alimento_id'])
+        try:
+            quantidade = int(request.form.get('quantidade', ''))
+        except ValueError:
+            quantidade = 0
+        if quantidade < 1:  # Quantidade zero ou negativa deixaria o total do carrinho negativo
+            flash("Informe uma quantidade válida.", "danger")
+            return redirect(url_for('adicionar_alimento_carrinho'))
 
         try:
-            db.session.add(compra_alimento)
-            db.session.commit()
+            carrinho = obter_carrinho(current_user.id, criar=True)
+            adicionar_alimento_ao_carrinho(carrinho, alimento, quantidade)  # O total do carrinho é atualizado junto
             flash("Alimento adicionado ao carrinho com sucesso!", "success")
-            return redirect(url_for('ver_carrinho', carrinho_id=carrinho_id))
+            return redirect(url_for('ver_carrinho'))
         except Exception as e:
             db.session.rollback()
             flash(f"Erro ao adicionar alimento ao carrinho: {e}", "danger")
             return redirect(url_for('adicionar_alimento_carrinho'))
 
-    alimentos = Alimento.query.all()
+    alimentos = catalogo_alimentos()
     return render_template('listar_alimentos.html', alimentos=alimentos, carrinho=carrinho)
 
 
@@ -833,8 +1035,14 @@ def adicionar_item_carrinho():
     if request.method == 'POST':
         tipo_item = request.form['tipo_item']
         descricao = request.form['descricao']
-        quantidade = int(request.form['quantidade'])
-        preco_unitario = float(request.form['preco_unitario'])
+        try:
+            quantidade = int(request.form.get('quantidade', ''))
+            preco_unitario = float(request.form.get('preco_unitario', ''))
+        except ValueError:
+            quantidade = preco_unitario = -1
+        if quantidade < 1 or not preco_unitario >= 0:  # Rejeita também preço NaN
+            flash("Informe uma quantidade e um preço válidos.", "danger")
+            return redirect(url_for('adicionar_item_carrinho'))
         subtotal = quantidade * preco_unitario
 
         item_carrinho = ItemCarrinho(
@@ -864,7 +1072,7 @@ def adicionar_item_carrinho():
 def remover_item_carrinho():
     assento_a_remover = request.form['assento']  # Pegando o assento a ser removido do carrinho
 
-    carrinho = Carrinho.query.filter_by(usuario_id=current_user.id).first()  # Pegando o carrinho do usuário
+    carrinho = obter_carrinho(current_user.id)  # Pegando o carrinho do usuário
     if carrinho:
         item_a_remover = ItemCarrinho.query.filter_by(carrinho_id=carrinho.id, assento=assento_a_remover).first()
         if item_a_remover:
@@ -882,5 +1090,5 @@ def remover_item_carrinho():
 
 if __name__ == "__main__":
     with app.app_context():
-        db.create_all()
-    app.run(host='0.0.0.0', debug=True)
+        aplicar_migracoes()  # Cria as tabelas e índices que faltam no banco
+    app.run(host='0.0.0.0', debug=app.config['PERFIL'] == 'desenvolvimento')  # Produção: wsgi.py
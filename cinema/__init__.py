@@ -6,23 +6,88 @@ from flask_login import LoginManager
 # Inicializando o banco de dados
 db = SQLAlchemy()
 
-def create_app():
+def create_app(config=None):
+    from cinema.config import CHAVE_DESENVOLVIMENTO, configurar_banco, configurar_perfil
+
     app = Flask(__name__)
-    app.secret_key = '17052008'
+    app.secret_key = CHAVE_DESENVOLVIMENTO
     project_dir = os.path.dirname(os.path.abspath(__file__))
-    cinema_file = "sqlite:///{}".format(os.path.join(project_dir, "Cinema.db"))
-    
-    app.config["SQLALCHEMY_DATABASE_URI"] = cinema_file
-    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+    # Configurações extras (ex.: outro banco) sobrescrevem as variáveis de ambiente
+    if config:
+        app.config.update(config)
+
+    configurar_perfil(app)  # desenvolvimento ou producao (CINEMA_PERFIL)
+    configurar_banco(app, project_dir)  # URI, pool de conexões e ajustes do SQLite
 
     login_manager = LoginManager()
     login_manager.init_app(app)
 
     @login_manager.user_loader
     def load_user(user_id):
-        from cinema.models import Usuario
-        return Usuario.query.get(int(user_id))
+        from cinema.identidade import carregar_usuario
+        return carregar_usuario(int(user_id))  # Usa o cache de usuários em memória
         
     db.init_app(app)
+
+    from cinema.sessoes_web import configurar_sessoes
+    configurar_sessoes(app)  # Sessões no servidor (banco ou memória); o cookie leva só o id
+
+    from cinema.metricas import configurar_metricas
+    configurar_metricas(app)  # Server-Timing, /metrics e log de requisições lentas (CINEMA_METRICAS=1)
+
+    from cinema.cache import configurar_cache
+    configurar_cache(app)  # Cache do catálogo (filmes, salas, sessões e alimentos)
+
+    from cinema.respostas import fragmento
+    app.jinja_env.globals['fragmento'] = fragmento  # Cache de pedaços de template
+
+    from cinema.paginacao import url_pagina
+    app.jinja_env.globals['url_pagina'] = url_pagina  # Links de paginação e ordenação das listagens
+
+    from cinema.migracoes import registrar_comandos
+    registrar_comandos(app)  # flask migrar / flask planos-indices
+
+    from cinema.estaticos import configurar_estaticos
+    configurar_estaticos(app)  # Arquivos estáticos com hash no nome e cache de um ano
+
+    from cinema import imagens
+    imagens.registrar_comandos(app)  # imagem_poster() nos templates / flask gerar-miniaturas
+
+    from cinema import importacao
+    importacao.registrar_comandos(app)  # flask catalogo importar / flask catalogo exportar
+
+    from cinema import agenda
+    agenda.registrar_comandos(app)  # flask verificar-agenda / flask benchmark-agenda
+
+    from cinema import programacao
+    programacao.registrar_comandos(app)  # flask gerar-programacao
+
+    from cinema import pedidos
+    pedidos.registrar_comandos(app)  # flask benchmark-checkout
+    from cinema import reservas
+    reservas.registrar_comandos(app)  # flask benchmark-reservas
+
+    from cinema import busca
+    busca.registrar_comandos(app)  # flask reindexar-busca / flask benchmark-busca
+
+    from cinema import eventos
+    eventos.configurar_eventos(app)  # Canal dos eventos de assentos (memória ou arquivo compartilhado)
+    eventos.registrar_comandos(app)  # flask servir-eventos / flask benchmark-eventos
+
+    from cinema import analises
+    analises.registrar_comandos(app)  # flask analises recalcular
+
+    from cinema import carga
+    carga.registrar_comandos(app)  # flask carga gerar / medir / comparar
+
+    from cinema import sessoes_web
+    sessoes_web.registrar_comandos(app)  # flask varrer-sessoes / flask benchmark-sessoes
+
+    from cinema import servidor
+    servidor.registrar_comandos(app)  # flask benchmark-inicio (wsgi.py e gunicorn.conf.py ficam na raiz)
+
+    from cinema.api import api
+    app.register_blueprint(api)  # API JSON em /api/v1
     
     return app
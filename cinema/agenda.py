@@ -0,0 +1,246 @@
+import bisect
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from sqlalchemy import func
+from . import db
+from .models import Filme, Sessao
+
+LIMPEZA_MINUTOS = 15  # Intervalo para limpar a sala entre duas sessões
+
+
+def tempo_limpeza():
+    return timedelta(minutes=current_app.config.get('LIMPEZA_MINUTOS', LIMPEZA_MINUTOS))
+
+
+# Sessões de uma sala ordenadas pelo início. Cada sessão ocupa a sala do horário até o fim do filme mais a limpeza.
+class AgendaSala:
+    def __init__(self):
+        self.inicios = []
+        self.fins = []
+        self.ids = []
+        self.maior_ocupacao = timedelta(0)
+
+    def __len__(self):
+        return len(self.inicios)
+
+    # Primeira sessão que ocupa a sala em algum momento de [inicio, fim), ou None.
+    # A busca binária acha as sessões que começam antes do fim; só as que começaram depois de
+    # (inicio - maior ocupação) podem chegar até o novo intervalo, então a varredura para aí.
+    def conflito(self, inicio, fim, ignorar_id=None):
+        i = bisect.bisect_left(self.inicios, fim)
+        limite = inicio - self.maior_ocupacao
+        while i > 0 and self.inicios[i - 1] > limite:
+            i -= 1
+            if self.fins[i] > inicio and (ignorar_id is None or self.ids[i] != ignorar_id):
+                return self.ids[i]
+        return None
+
+    # Até quando as sessões que ocupam [inicio, fim) deixam a sala ocupada (None se estiver livre)
+    def ocupada_ate(self, inicio, fim):
+        i = bisect.bisect_left(self.inicios, fim)
+        limite = inicio - self.maior_ocupacao
+        ate = None
+        while i > 0 and self.inicios[i - 1] > limite:
+            i -= 1
+            if self.fins[i] > inicio and (ate is None or self.fins[i] > ate):
+                ate = self.fins[i]
+        return ate
+
+    def adicionar(self, id, inicio, fim):
+        i = bisect.bisect_right(self.inicios, inicio)
+        self.inicios.insert(i, inicio)
+        self.fins.insert(i, fim)
+        self.ids.insert(i, id)
+        self.maior_ocupacao = max(self.maior_ocupacao, fim - inicio)
+
+    # maior_ocupacao continua valendo como limite (só pode ficar maior que o necessário)
+    def remover(self, id, inicio):
+        i = bisect.bisect_left(self.inicios, inicio)
+        while i < len(self.inicios) and self.inicios[i] == inicio:
+            if self.ids[i] == id:
+                del self.inicios[i], self.fins[i], self.ids[i]
+                return True
+            i += 1
+        return False
+
+
+# Índice de intervalos de todas as salas
+class Agenda:
+    def __init__(self, limpeza, duracoes=None):
+        self.limpeza = limpeza
+        self.duracoes = duracoes or {}  # filme_id -> duração em minutos
+        self.salas = defaultdict(AgendaSala)
+
+    def fim(self, inicio, duracao):
+        return inicio + timedelta(minutes=duracao) + self.limpeza
+
+    def conflito(self, sala_id, inicio, duracao, ignorar_id=None):
+        sala = self.salas.get(sala_id)
+        if sala is None:
+            return None
+        return sala.conflito(inicio, self.fim(inicio, duracao), ignorar_id)
+
+    def ocupada_ate(self, sala_id, inicio, duracao):
+        sala = self.salas.get(sala_id)
+        if sala is None:
+            return None
+        return sala.ocupada_ate(inicio, self.fim(inicio, duracao))
+
+    def adicionar(self, sala_id, id, inicio, duracao):
+        self.salas[sala_id].adicionar(id, inicio, self.fim(inicio, duracao))
+
+    def remover(self, sala_id, id, inicio):
+        sala = self.salas.get(sala_id)
+        return sala is not None and sala.remover(id, inicio)
+
+    # Confere e, sem conflito, já coloca a sessão na agenda (validação de uma programação inteira numa passada)
+    def encaixar(self, sala_id, id, inicio, duracao):
+        outro = self.conflito(sala_id, inicio, duracao)
+        if outro is None:
+            self.adicionar(sala_id, id, inicio, duracao)
+        return outro
+
+
+def _consulta_sessoes():
+    return (db.select(Sessao.id, Sessao.sala_id, Sessao.horario, Filme.duracao)
+            .join(Filme, Filme.id == Sessao.filme_id)
+            .order_by(Sessao.sala_id, Sessao.horario))
+
+
+# Monta a agenda a partir do banco; o filtro por sala e horário usa o índice ix_sessao_sala_horario
+def carregar_agenda(sala_id=None, desde=None, ate=None):
+    consulta = _consulta_sessoes()
+    if sala_id is not None:
+        consulta = consulta.where(Sessao.sala_id == sala_id)
+    if desde is not None:
+        consulta = consulta.where(Sessao.horario > desde)
+    if ate is not None:
+        consulta = consulta.where(Sessao.horario < ate)
+
+    agenda = Agenda(tempo_limpeza(), dict(db.session.execute(db.select(Filme.id, Filme.duracao)).all()))
+    for id, sala, horario, duracao in db.session.execute(consulta.execution_options(yield_per=5000)):
+        agenda.adicionar(sala, id, horario, duracao)
+    return agenda
+
+
+# Sessão que impediria colocar o filme na sala nesse horário (None se estiver livre).
+# Só carrega as sessões da sala que poderiam alcançar o intervalo: as que começam até uma
+# duração máxima de filme antes dele.
+def conflito_sessao(sala_id, filme_id, horario, ignorar_id=None):
+    duracao = db.session.execute(db.select(Filme.duracao).where(Filme.id == filme_id)).scalar()
+    if duracao is None:
+        return None
+    maior = db.session.execute(db.select(func.max(Filme.duracao))).scalar() or 0
+    limpeza = tempo_limpeza()
+    agenda = Agenda(limpeza)
+    consulta = (_consulta_sessoes().where(Sessao.sala_id == sala_id)
+                .where(Sessao.horario > horario - timedelta(minutes=maior) - limpeza)
+                .where(Sessao.horario < horario + timedelta(minutes=duracao) + limpeza))
+    for id, sala, inicio, duracao_outra in db.session.execute(consulta):
+        agenda.adicionar(sala, id, inicio, duracao_outra)
+
+    outro = agenda.conflito(sala_id, horario, duracao, ignorar_id)
+    return db.session.get(Sessao, outro) if outro is not None else None
+
+
+# Validação usada pela importação em massa: agenda com todas as sessões do banco, e cada linha
+# aceita entra nela para ser comparada com as próximas. As linhas do lote ainda não gravado ficam
+# anotadas: se o INSERT do lote falhar, descartar() as tira da agenda (senão dariam conflito com as
+# linhas seguintes sem existirem no banco).
+class VerificadorImportacao:
+    def __init__(self, agenda):
+        self.agenda = agenda
+        self.pendentes = []  # (sala_id, id, horario) das linhas do lote atual
+
+    def __call__(self, registro, numero):
+        duracao = self.agenda.duracoes.get(registro['filme_id'])
+        id = f"linha {numero}"
+        outro = self.agenda.encaixar(registro['sala_id'], id, registro['horario'], duracao or 0)
+        if outro is not None:
+            return f"conflito de horário na sala {registro['sala_id']} com a sessão {outro}"
+        self.pendentes.append((registro['sala_id'], id, registro['horario']))
+        return None
+
+    # Chamar depois do commit do lote
+    def confirmar(self):
+        self.pendentes = []
+
+    # Chamar quando o lote for rejeitado
+    def descartar(self):
+        for sala_id, id, horario in self.pendentes:
+            self.agenda.remover(sala_id, id, horario)
+        self.pendentes = []
+
+
+def verificador_importacao():
+    return VerificadorImportacao(carregar_agenda())
+
+
+def _gerar_programacao(salas, dias, por_dia):
+    inicio = datetime(2025, 1, 1, 12, 0)
+    sessoes = []
+    for sala in range(salas):
+        for dia in range(dias):
+            horario = inicio + timedelta(days=dia)
+            for _ in range(por_dia):
+                duracao = random.randint(80, 170)
+                sessoes.append((sala, horario, duracao))
+                horario += timedelta(minutes=duracao + LIMPEZA_MINUTOS + random.choice((0, 15, 30)))
+    return sessoes
+
+
+def registrar_comandos(app):
+    @app.cli.command('verificar-agenda')
+    def verificar_agenda_comando():
+        """Procura sessões sobrepostas na mesma sala (filme + limpeza)."""
+        agenda = Agenda(tempo_limpeza())
+        conflitos = 0
+        for id, sala, horario, duracao in db.session.execute(_consulta_sessoes().execution_options(yield_per=5000)):
+            outro = agenda.encaixar(sala, id, horario, duracao)
+            if outro is not None:
+                conflitos += 1
+                click.echo(f"Sala {sala}: sessão {id} ({horario:%d/%m/%Y %H:%M}) sobrepõe a sessão {outro}")
+        click.echo(f"{conflitos} conflitos encontrados.")
+
+    @app.cli.command('benchmark-agenda')
+    @click.option('--salas', default=100, show_default=True)
+    @click.option('--dias', default=365, show_default=True)
+    @click.option('--por-dia', default=5, show_default=True, help='Sessões por sala por dia.')
+    @click.option('--consultas', default=20000, show_default=True)
+    def benchmark_agenda_comando(salas, dias, por_dia, consultas):
+        """Compara o índice de intervalos com a varredura linear da sala."""
+        random.seed(42)
+        sessoes = _gerar_programacao(salas, dias, por_dia)
+
+        antes = time.perf_counter()
+        agenda = Agenda(timedelta(minutes=LIMPEZA_MINUTOS))
+        for id, (sala, horario, duracao) in enumerate(sessoes):
+            agenda.adicionar(sala, id, horario, duracao)
+        montagem = time.perf_counter() - antes
+
+        por_sala = defaultdict(list)
+        for sala, horario, duracao in sessoes:
+            por_sala[sala].append((horario, agenda.fim(horario, duracao)))
+
+        testes = [(random.randrange(salas), random.choice(sessoes)[1] + timedelta(minutes=random.randint(-120, 120)),
+                   random.randint(80, 170)) for _ in range(consultas)]
+
+        antes = time.perf_counter()
+        com_indice = sum(agenda.conflito(sala, horario, duracao) is not None for sala, horario, duracao in testes)
+        tempo_indice = time.perf_counter() - antes
+
+        antes = time.perf_counter()
+        linear = 0
+        for sala, horario, duracao in testes:
+            fim = agenda.fim(horario, duracao)
+            linear += any(inicio < fim and horario < termino for inicio, termino in por_sala[sala])
+        tempo_linear = time.perf_counter() - antes
+
+        click.echo(f"{len(sessoes)} sessões em {salas} salas; índice montado em {montagem:.2f}s")
+        click.echo(f"Índice:  {tempo_indice / consultas * 1e6:8.1f} µs por verificação ({com_indice} conflitos)")
+        click.echo(f"Linear:  {tempo_linear / consultas * 1e6:8.1f} µs por verificação ({linear} conflitos)")
@@ -0,0 +1,344 @@
+import csv
+import io
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import and_, bindparam, delete, func, insert, select, true, update
+from . import db
+from .models import (Alimento, Cinema, Filme, ItemPedido, Pedido, ResumoAlimentoDia, ResumoCinemaDia,
+                     ResumoFilmeDia, ResumoSessao, Sala, Sessao)
+
+analises_cli = AppGroup('analises', help='Resumos de vendas usados nos relatórios.')
+
+# Colunas somadas quando o resumo já tem a linha; as demais (fora da chave) são substituídas
+SOMAS = {
+    ResumoSessao: ('ingressos', 'receita'),
+    ResumoFilmeDia: ('ingressos', 'receita'),
+    ResumoCinemaDia: ('pedidos', 'ingressos', 'receita_ingressos', 'receita_alimentos'),
+    ResumoAlimentoDia: ('quantidade', 'receita'),
+}
+
+_itens = ItemPedido.__table__
+_pedidos = Pedido.__table__
+_sessoes = Sessao.__table__
+_salas = Sala.__table__
+
+
+# O SQLite devolve date() como texto
+def _dia(valor):
+    return date.fromisoformat(valor) if isinstance(valor, str) else valor
+
+
+def _ingressos_por_sessao():
+    return _itens.join(_pedidos, _pedidos.c.id == _itens.c.pedido_id) \
+        .join(_sessoes, _sessoes.c.id == _itens.c.sessao_id) \
+        .join(_salas, _salas.c.id == _sessoes.c.sala_id)
+
+
+# Resumo de cada sessão com ingressos nos pedidos filtrados (filtro sobre item_pedido/pedido)
+def _agregar_sessoes(conexao, filtro):
+    consulta = (select(_sessoes.c.id, _sessoes.c.filme_id, _salas.c.cinema_id, _sessoes.c.horario, _salas.c.capacidade,
+                       func.sum(_itens.c.quantidade), func.sum(_itens.c.subtotal))
+                .select_from(_ingressos_por_sessao()).where(filtro)
+                .group_by(_sessoes.c.id, _sessoes.c.filme_id, _salas.c.cinema_id, _sessoes.c.horario, _salas.c.capacidade))
+    return [{'sessao_id': sessao_id, 'filme_id': filme_id, 'cinema_id': cinema_id, 'horario': horario,
+             'capacidade': capacidade, 'ingressos': ingressos, 'receita': receita}
+            for sessao_id, filme_id, cinema_id, horario, capacidade, ingressos, receita in conexao.execute(consulta)]
+
+
+# Resumos por dia dos pedidos filtrados (filtro sobre a tabela pedido). Cada resumo sai de um
+# GROUP BY no banco; em Python só se juntam as poucas linhas já agrupadas do resumo por cinema.
+def _agregar_dias(conexao, filtro):
+    dia = func.date(_pedidos.c.criado_em)
+    # Cinema de cada pedido: o dos seus ingressos (o menor, se houver mais de um)
+    cinema_do_pedido = (select(_itens.c.pedido_id, func.min(_salas.c.cinema_id).label('cinema_id'))
+                        .select_from(_ingressos_por_sessao()).where(filtro)
+                        .group_by(_itens.c.pedido_id).subquery())
+    cinema = func.coalesce(cinema_do_pedido.c.cinema_id, 0)
+    com_cinema = _pedidos.outerjoin(cinema_do_pedido, cinema_do_pedido.c.pedido_id == _pedidos.c.id)
+
+    filmes = [{'filme_id': filme_id, 'dia': _dia(d), 'ingressos': ingressos, 'receita': receita}
+              for filme_id, d, ingressos, receita in conexao.execute(
+                  select(_sessoes.c.filme_id, dia, func.sum(_itens.c.quantidade), func.sum(_itens.c.subtotal))
+                  .select_from(_ingressos_por_sessao()).where(filtro).group_by(_sessoes.c.filme_id, dia))]
+
+    alimentos = [{'cinema_id': cinema_id, 'dia': _dia(d), 'alimento_id': alimento_id, 'quantidade': quantidade,
+                  'receita': receita}
+                 for cinema_id, d, alimento_id, quantidade, receita in conexao.execute(
+                     select(cinema, dia, _itens.c.alimento_id, func.sum(_itens.c.quantidade), func.sum(_itens.c.subtotal))
+                     .select_from(com_cinema.join(_itens, _itens.c.pedido_id == _pedidos.c.id))
+                     .where(filtro, _itens.c.alimento_id.isnot(None))
+                     .group_by(cinema, dia, _itens.c.alimento_id))]
+
+    cinemas = defaultdict(lambda: {'pedidos': 0, 'ingressos': 0, 'receita_ingressos': 0.0, 'receita_alimentos': 0.0})
+    for cinema_id, d, pedidos in conexao.execute(
+            select(cinema, dia, func.count(_pedidos.c.id)).select_from(com_cinema).where(filtro).group_by(cinema, dia)):
+        cinemas[cinema_id, _dia(d)]['pedidos'] = pedidos
+    for cinema_id, d, ingressos, receita in conexao.execute(
+            select(_salas.c.cinema_id, dia, func.sum(_itens.c.quantidade), func.sum(_itens.c.subtotal))
+            .select_from(_ingressos_por_sessao()).where(filtro).group_by(_salas.c.cinema_id, dia)):
+        cinemas[cinema_id, _dia(d)].update(ingressos=ingressos, receita_ingressos=receita)
+    for linha in alimentos:
+        cinemas[linha['cinema_id'], linha['dia']]['receita_alimentos'] += linha['receita']
+
+    return {
+        ResumoFilmeDia: filmes,
+        ResumoCinemaDia: [dict(cinema_id=cinema_id, dia=d, **valores) for (cinema_id, d), valores in cinemas.items()],
+        ResumoAlimentoDia: alimentos,
+    }
+
+
+def _upsert(conexao, tabela):
+    dialeto = conexao.dialect.name
+    if dialeto == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as insert_dialeto
+    elif dialeto == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as insert_dialeto
+    elif dialeto in ('mysql', 'mariadb'):
+        from sqlalchemy.dialects.mysql import insert as insert_dialeto
+    else:
+        return None
+    insercao = insert_dialeto(tabela)
+    chaves = [coluna.name for coluna in tabela.primary_key]
+    somas = SOMAS[_MODELOS[tabela.name]]
+    outras = [coluna.name for coluna in tabela.columns if coluna.name not in chaves]
+    if dialeto in ('sqlite', 'postgresql'):
+        novos = insercao.excluded
+        return insercao.on_conflict_do_update(index_elements=chaves, set_={
+            c: tabela.c[c] + novos[c] if c in somas else novos[c] for c in outras})
+    novos = insercao.inserted
+    return insercao.on_duplicate_key_update({c: tabela.c[c] + novos[c] if c in somas else novos[c] for c in outras})
+
+
+_MODELOS = {modelo.__tablename__: modelo for modelo in SOMAS}
+_upserts = {}  # (dialeto, tabela) -> INSERT ... ON CONFLICT já montado
+
+
+# Soma as linhas no resumo: INSERT ... ON CONFLICT/ON DUPLICATE KEY quando o banco tem,
+# senão UPDATE e, se a linha não existir, INSERT
+def _somar(conexao, modelo, linhas):
+    if not linhas:
+        return
+    tabela = modelo.__table__
+    chave = (conexao.dialect.name, tabela.name)
+    if chave not in _upserts:
+        _upserts[chave] = _upsert(conexao, tabela)
+    if _upserts[chave] is not None:
+        conexao.execute(_upserts[chave], linhas)
+        return
+
+    chaves = [coluna.name for coluna in tabela.primary_key]
+    somas = SOMAS[modelo]
+    for linha in linhas:
+        onde = and_(*(tabela.c[c] == linha[c] for c in chaves))
+        valores = {c: tabela.c[c] + linha[c] if c in somas else linha[c] for c in linha if c not in chaves}
+        if not conexao.execute(update(tabela).where(onde).values(valores)).rowcount:
+            conexao.execute(insert(tabela).values(linha))
+
+
+_ITENS_DO_PEDIDO = (
+    select(_pedidos.c.criado_em, _itens.c.sessao_id, _itens.c.alimento_id, _itens.c.quantidade, _itens.c.subtotal,
+           _sessoes.c.filme_id, _sessoes.c.horario, _salas.c.cinema_id, _salas.c.capacidade)
+    .select_from(_itens.join(_pedidos, _pedidos.c.id == _itens.c.pedido_id)
+                 .outerjoin(_sessoes, _sessoes.c.id == _itens.c.sessao_id)
+                 .outerjoin(_salas, _salas.c.id == _sessoes.c.sala_id))
+    .where(_itens.c.pedido_id == bindparam('pedido_id')))
+
+
+# Soma um pedido recém-criado aos resumos. Chamada pelo checkout antes do commit, na mesma
+# conexão: se o pedido for desfeito, os resumos também são. Um pedido tem poucos itens, então
+# eles são lidos numa consulta só e agrupados aqui, com as mesmas regras do recálculo em SQL.
+def acumular_pedido(conexao, pedido_id):
+    itens = conexao.execute(_ITENS_DO_PEDIDO, {'pedido_id': pedido_id}).all()
+    if not itens:
+        return
+    dia = itens[0].criado_em.date()
+    ingressos = [item for item in itens if item.sessao_id is not None]
+    cinema_id = min((item.cinema_id for item in ingressos), default=0)
+
+    sessoes, filmes, cinemas, alimentos = {}, {}, {}, {}
+    cinemas[cinema_id] = {'cinema_id': cinema_id, 'dia': dia, 'pedidos': 1, 'ingressos': 0,
+                          'receita_ingressos': 0.0, 'receita_alimentos': 0.0}
+    for item in ingressos:
+        sessao = sessoes.setdefault(item.sessao_id, {
+            'sessao_id': item.sessao_id, 'filme_id': item.filme_id, 'cinema_id': item.cinema_id,
+            'horario': item.horario, 'capacidade': item.capacidade, 'ingressos': 0, 'receita': 0.0})
+        filme = filmes.setdefault(item.filme_id, {'filme_id': item.filme_id, 'dia': dia, 'ingressos': 0, 'receita': 0.0})
+        cinema = cinemas.setdefault(item.cinema_id, {'cinema_id': item.cinema_id, 'dia': dia, 'pedidos': 0, 'ingressos': 0,
+                                                     'receita_ingressos': 0.0, 'receita_alimentos': 0.0})
+        for resumo in (sessao, filme):
+            resumo['ingressos'] += item.quantidade
+            resumo['receita'] += item.subtotal
+        cinema['ingressos'] += item.quantidade
+        cinema['receita_ingressos'] += item.subtotal
+    for item in itens:
+        if item.alimento_id is not None:
+            alimento = alimentos.setdefault(item.alimento_id, {'cinema_id': cinema_id, 'dia': dia,
+                                                               'alimento_id': item.alimento_id, 'quantidade': 0,
+                                                               'receita': 0.0})
+            alimento['quantidade'] += item.quantidade
+            alimento['receita'] += item.subtotal
+            cinemas[cinema_id]['receita_alimentos'] += item.subtotal
+
+    _somar(conexao, ResumoSessao, list(sessoes.values()))
+    _somar(conexao, ResumoFilmeDia, list(filmes.values()))
+    _somar(conexao, ResumoCinemaDia, list(cinemas.values()))
+    _somar(conexao, ResumoAlimentoDia, list(alimentos.values()))
+
+
+def _periodo(desde, ate):
+    filtro = true()
+    if desde is not None:
+        filtro = and_(filtro, _pedidos.c.criado_em >= datetime.combine(desde, datetime.min.time()))
+    if ate is not None:
+        filtro = and_(filtro, _pedidos.c.criado_em < datetime.combine(ate + timedelta(days=1), datetime.min.time()))
+    return filtro
+
+
+# Recalcula os resumos a partir dos pedidos (todos, ou só os dias de desde até ate), para preencher
+# um banco antigo ou corrigir os resumos. Os dias do período são apagados e regravados; as sessões
+# com ingressos vendidos no período são recalculadas com todos os seus pedidos.
+def recalcular(conexao, desde=None, ate=None):
+    filtro = _periodo(desde, ate)
+    if desde is None and ate is None:
+        sessoes = true()
+        conexao.execute(delete(ResumoSessao.__table__))
+    else:
+        tocadas = select(_itens.c.sessao_id).select_from(_ingressos_por_sessao()).where(filtro).distinct()
+        sessoes = _itens.c.sessao_id.in_(tocadas)
+        conexao.execute(delete(ResumoSessao.__table__).where(ResumoSessao.__table__.c.sessao_id.in_(tocadas)))
+    linhas_sessoes = _agregar_sessoes(conexao, sessoes)
+    if linhas_sessoes:
+        conexao.execute(insert(ResumoSessao.__table__), linhas_sessoes)
+
+    totais = {ResumoSessao: len(linhas_sessoes)}
+    for modelo, linhas in _agregar_dias(conexao, filtro).items():
+        tabela = modelo.__table__
+        remover = delete(tabela)
+        if desde is not None:
+            remover = remover.where(tabela.c.dia >= desde)
+        if ate is not None:
+            remover = remover.where(tabela.c.dia <= ate)
+        conexao.execute(remover)
+        if linhas:
+            conexao.execute(insert(tabela), linhas)
+        totais[modelo] = len(linhas)
+    return totais
+
+
+# Consultas dos relatórios: leem só os resumos (e os nomes no catálogo), nunca as tabelas de vendas
+def receita_por_dia(desde, ate, cinema_id=None):
+    r = ResumoCinemaDia
+    consulta = (select(r.dia, func.sum(r.pedidos).label('pedidos'), func.sum(r.ingressos).label('ingressos'),
+                       func.sum(r.receita_ingressos).label('receita_ingressos'),
+                       func.sum(r.receita_alimentos).label('receita_alimentos'))
+                .where(r.dia >= desde, r.dia <= ate).group_by(r.dia).order_by(r.dia))
+    if cinema_id:
+        consulta = consulta.where(r.cinema_id == cinema_id)
+    return db.session.execute(consulta).mappings().all()
+
+
+def ranking_filmes(desde, ate, limite=20):
+    r = ResumoFilmeDia
+    receita = func.sum(r.receita).label('receita')
+    consulta = (select(r.filme_id, Filme.titulo, func.sum(r.ingressos).label('ingressos'), receita)
+                .outerjoin(Filme, Filme.id == r.filme_id)
+                .where(r.dia >= desde, r.dia <= ate)
+                .group_by(r.filme_id, Filme.titulo).order_by(receita.desc()).limit(limite))
+    return db.session.execute(consulta).mappings().all()
+
+
+# Sessões do período (pelo horário da sessão) com ingressos vendidos, das mais cheias para as mais vazias
+def ocupacao_sessoes(desde, ate, cinema_id=None, limite=50):
+    r = ResumoSessao
+    ocupacao = (r.ingressos * 1.0 / func.nullif(r.capacidade, 0)).label('ocupacao')
+    consulta = (select(r.sessao_id, r.horario, r.cinema_id, Filme.titulo, r.capacidade, r.ingressos, r.receita, ocupacao)
+                .outerjoin(Filme, Filme.id == r.filme_id)
+                .where(r.horario >= datetime.combine(desde, datetime.min.time()),
+                       r.horario < datetime.combine(ate + timedelta(days=1), datetime.min.time()))
+                .order_by(ocupacao.desc(), r.horario).limit(limite))
+    if cinema_id:
+        consulta = consulta.where(r.cinema_id == cinema_id)
+    return db.session.execute(consulta).mappings().all()
+
+
+# Alimentos mais vendidos em cada cinema: {nome do cinema: [linhas]}
+def alimentos_por_cinema(desde, ate, cinema_id=None, por_cinema=5):
+    r = ResumoAlimentoDia
+    quantidade = func.sum(r.quantidade).label('quantidade')
+    consulta = (select(r.cinema_id, Cinema.nome.label('cinema'), r.alimento_id, Alimento.nome, quantidade,
+                       func.sum(r.receita).label('receita'))
+                .outerjoin(Cinema, Cinema.id == r.cinema_id)
+                .outerjoin(Alimento, Alimento.id == r.alimento_id)
+                .where(r.dia >= desde, r.dia <= ate)
+                .group_by(r.cinema_id, Cinema.nome, r.alimento_id, Alimento.nome)
+                .order_by(r.cinema_id, quantidade.desc()))
+    if cinema_id:
+        consulta = consulta.where(r.cinema_id == cinema_id)
+    resultado = {}
+    for linha in db.session.execute(consulta).mappings():
+        linhas = resultado.setdefault(linha['cinema'] or 'Sem ingresso no pedido', [])
+        if len(linhas) < por_cinema:
+            linhas.append(linha)
+    return resultado
+
+
+def _alimentos_csv(desde, ate, cinema_id=None):
+    return [linha for linhas in alimentos_por_cinema(desde, ate, cinema_id, por_cinema=10 ** 9).values()
+            for linha in linhas]
+
+
+RELATORIOS = {
+    'receita': lambda desde, ate, cinema_id: receita_por_dia(desde, ate, cinema_id),
+    'filmes': lambda desde, ate, cinema_id: ranking_filmes(desde, ate, limite=None),
+    'sessoes': lambda desde, ate, cinema_id: ocupacao_sessoes(desde, ate, cinema_id, limite=None),
+    'alimentos': _alimentos_csv,
+}
+
+
+def _valor_csv(valor):
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    if isinstance(valor, float):
+        return f"{valor:.4f}".rstrip('0').rstrip('.')
+    return '' if valor is None else valor
+
+
+# Relatório em CSV; os resumos têm poucas linhas (por dia, filme ou sessão), então cabe na memória
+def relatorio_csv(nome, desde, ate, cinema_id=None):
+    saida = io.StringIO()
+    escritor = csv.writer(saida)
+    for numero, linha in enumerate(RELATORIOS[nome](desde, ate, cinema_id)):
+        if numero == 0:
+            escritor.writerow(linha.keys())
+        escritor.writerow([_valor_csv(v) for v in linha.values()])
+    return saida.getvalue()
+
+
+# Período padrão dos relatórios: os últimos 30 dias
+def ler_periodo(args):
+    def ler(nome):
+        try:
+            return date.fromisoformat(args.get(nome, ''))
+        except ValueError:
+            return None
+    ate = ler('ate') or date.today()
+    desde = ler('desde') or ate - timedelta(days=29)
+    return (desde, ate) if desde <= ate else (ate, desde)
+
+
+@analises_cli.command('recalcular')
+@click.option('--desde', type=click.DateTime(['%Y-%m-%d']), help='Primeiro dia (padrão: desde o primeiro pedido).')
+@click.option('--ate', type=click.DateTime(['%Y-%m-%d']), help='Último dia (padrão: até hoje).')
+def recalcular_comando(desde, ate):
+    """Recalcula os resumos de vendas a partir dos pedidos."""
+    with db.engine.begin() as conexao:
+        totais = recalcular(conexao, desde.date() if desde else None, ate.date() if ate else None)
+    for modelo, total in totais.items():
+        click.echo(f"{modelo.__tablename__}: {total} linhas")
+
+
+def registrar_comandos(app):
+    app.cli.add_command(analises_cli)
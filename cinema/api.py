@@ -0,0 +1,257 @@
+import json
+from datetime import date, datetime, timedelta
+from functools import wraps
+
+from flask import Blueprint, Response, current_app, make_response, request, session
+from flask_login import current_user
+from . import db
+from .assentos import ASSENTOS_POR_FILEIRA, indice_assento, mapa_da_sessao, rotulo_assento
+from .carrinho import adicionar_alimento_ao_carrinho, adicionar_sessao_ao_carrinho, obter_carrinho
+from .consultas import ler_data
+from .eventos import stream_sessao
+from .models import Alimento, Carrinho, CompraAlimento, CompraSessao, Filme, Sala, Sessao
+from .pedidos import AssentosIndisponiveis, CarrinhoVazio, finalizar_compra
+from .reservas import assentos_reservados, cancelar_reserva, reservar_assento
+from .respostas import pagina_em_cache
+
+try:
+    import orjson
+except ImportError:  # Sem o orjson, usa o módulo json da biblioteca padrão (mais lento, mesmo resultado)
+    orjson = None
+
+# API JSON para os quiosques e o app: /api/v1/...
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+def _padrao(valor):
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    raise TypeError(f"{type(valor).__name__} não é serializável")
+
+
+def serializar(dados):
+    if orjson is not None:
+        return orjson.dumps(dados)
+    return json.dumps(dados, separators=(',', ':'), ensure_ascii=False, default=_padrao).encode('utf-8')
+
+
+# Mantém só os campos pedidos em ?campos=id,titulo (em cada item, quando a resposta é uma lista)
+def _selecionar(dados, campos):
+    if isinstance(dados, list):
+        return [_selecionar(item, campos) for item in dados]
+    return {chave: valor for chave, valor in dados.items() if chave in campos}
+
+
+def json_simples(dados, status=200):
+    campos = request.args.get('campos')
+    if campos and status == 200:
+        dados = _selecionar(dados, set(campos.split(',')))
+    resposta = make_response(serializar(dados), status)
+    resposta.mimetype = 'application/json'
+    return resposta
+
+
+# Resposta JSON com ETag forte calculado do corpo: o cliente que repete a consulta com
+# If-None-Match recebe 304 sem corpo quando nada mudou. As rotas do catálogo usam json_simples
+# com pagina_em_cache, que guarda o corpo e o ETag até o grupo ser invalidado.
+def resposta_json(dados, status=200):
+    resposta = json_simples(dados, status)
+    if status == 200 and request.method == 'GET':
+        resposta.add_etag()
+        resposta.cache_control.private = True
+        resposta.cache_control.no_cache = True
+        return resposta.make_conditional(request)
+    return resposta
+
+
+def erro(mensagem, status):
+    return resposta_json({'erro': mensagem}, status)
+
+
+# Na API não há redirecionamento para o login: responde 401
+def login_api(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'usuario_id' not in session or not current_user.is_authenticated:
+            return erro('autenticação necessária', 401)
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+# Linhas da consulta como dicionários, lendo só as colunas selecionadas (sem objetos do ORM)
+def _linhas(consulta):
+    return [dict(linha) for linha in db.session.execute(consulta).mappings()]
+
+
+def _dados_json():
+    dados = request.get_json(silent=True)
+    return dados if isinstance(dados, dict) else request.form
+
+
+COLUNAS_FILME = (Filme.id, Filme.titulo, Filme.duracao, Filme.classificacao, Filme.genero, Filme.data_lancamento)
+
+
+@api.route('/filmes')
+@login_api
+@pagina_em_cache('filmes')
+def filmes():
+    return json_simples(_linhas(db.select(*COLUNAS_FILME).order_by(Filme.titulo, Filme.id)))
+
+
+@api.route('/filmes/<int:filme_id>')
+@login_api
+@pagina_em_cache('filmes')
+def filme(filme_id):
+    linhas = _linhas(db.select(*COLUNAS_FILME).where(Filme.id == filme_id))
+    return json_simples(linhas[0]) if linhas else erro('filme não encontrado', 404)
+
+
+# Sessões de um dia (?data=AAAA-MM-DD, hoje por padrão), com filtros opcionais de cinema e filme.
+# Usa o índice de horário e já traz título e sala no mesmo SELECT.
+@api.route('/sessoes')
+@login_api
+@pagina_em_cache('sessoes')
+def sessoes():
+    inicio = ler_data(request.args.get('data')) or datetime.combine(date.today(), datetime.min.time())
+    consulta = (db.select(Sessao.id, Sessao.horario, Sessao.preco, Sessao.filme_id, Filme.titulo,
+                          Sessao.sala_id, Sala.numero.label('sala'), Sala.cinema_id, Sala.capacidade)
+                .join(Filme, Filme.id == Sessao.filme_id)
+                .join(Sala, Sala.id == Sessao.sala_id)
+                .where(Sessao.horario >= inicio, Sessao.horario < inicio + timedelta(days=1))
+                .order_by(Sessao.horario, Sessao.id))
+    if request.args.get('cinema_id', type=int):
+        consulta = consulta.where(Sala.cinema_id == request.args.get('cinema_id', type=int))
+    if request.args.get('filme_id', type=int):
+        consulta = consulta.where(Sessao.filme_id == request.args.get('filme_id', type=int))
+    return json_simples(_linhas(consulta))
+
+
+# Mapa de assentos da sessão: vendidos vêm do mapa em memória, reservados das reservas ativas de outras pessoas
+@api.route('/sessoes/<int:sessao_id>/assentos')
+@login_api
+def assentos(sessao_id):
+    sessao = db.session.get(Sessao, sessao_id)
+    if sessao is None:
+        return erro('sessão não encontrada', 404)
+    mapa = mapa_da_sessao(sessao)
+    ocupados = [rotulo_assento(i) for i in range(mapa.capacidade) if mapa.ocupado(i)]
+    return resposta_json({
+        'sessao_id': sessao.id,
+        'capacidade': mapa.capacidade,
+        'por_fileira': ASSENTOS_POR_FILEIRA,
+        'livres': mapa.livres,
+        'ocupados': ocupados,
+        'reservados': sorted(assentos_reservados(sessao.id, exceto_usuario_id=current_user.id)),
+    })
+
+
+# Mudanças do mapa de assentos em tempo real (Server-Sent Events). Sem login, como o próprio mapa:
+# só informa quais assentos estão vendidos ou reservados. O cliente busca o mapa completo em
+# /sessoes/<id>/assentos ao conectar e aplica os eventos por cima.
+@api.route('/sessoes/<int:sessao_id>/eventos')
+def eventos_assentos(sessao_id):
+    if not current_app.config['EVENTOS_NO_APP']:
+        return erro('stream servido por flask servir-eventos', 404)  # Não prende uma thread do worker
+    resposta = Response(stream_sessao(sessao_id), mimetype='text/event-stream')
+    resposta.headers['Cache-Control'] = 'no-cache'
+    resposta.headers['X-Accel-Buffering'] = 'no'  # O nginx não deve segurar o stream em buffer
+    return resposta
+
+
+def _carrinho_json(usuario_id):
+    carrinho = db.session.execute(
+        db.select(Carrinho.id, Carrinho.total).where(Carrinho.usuario_id == usuario_id)).first()
+    if carrinho is None:
+        return {'id': None, 'total': 0.0, 'ingressos': [], 'alimentos': []}
+    ingressos = _linhas(
+        db.select(CompraSessao.id, CompraSessao.sessao_id, CompraSessao.assento, CompraSessao.quantidade,
+                  CompraSessao.subtotal, Sessao.horario, Filme.titulo)
+        .join(Sessao, Sessao.id == CompraSessao.sessao_id)
+        .join(Filme, Filme.id == Sessao.filme_id)
+        .where(CompraSessao.carrinho_id == carrinho.id).order_by(CompraSessao.id))
+    alimentos = _linhas(
+        db.select(CompraAlimento.id, CompraAlimento.alimento_id, Alimento.nome, CompraAlimento.quantidade,
+                  CompraAlimento.preco_unitario, CompraAlimento.subtotal)
+        .join(Alimento, Alimento.id == CompraAlimento.alimento_id)
+        .where(CompraAlimento.carrinho_id == carrinho.id).order_by(CompraAlimento.id))
+    return {'id': carrinho.id, 'total': carrinho.total, 'ingressos': ingressos, 'alimentos': alimentos}
+
+
+@api.route('/carrinho')
+@login_api
+def carrinho():
+    return resposta_json(_carrinho_json(current_user.id))
+
+
+# Reserva o assento e coloca o ingresso no carrinho: {"sessao_id": 1, "assento": "B3"}
+@api.route('/carrinho/assentos', methods=['POST'])
+@login_api
+def adicionar_assento():
+    dados = _dados_json()
+    sessao_id = str(dados.get('sessao_id', ''))
+    sessao = db.session.get(Sessao, int(sessao_id)) if sessao_id.isdigit() else None
+    if sessao is None:
+        return erro('sessão não encontrada', 404)
+    mapa = mapa_da_sessao(sessao)
+    indice = indice_assento(str(dados.get('assento', '')), mapa.capacidade)
+    if indice is None:
+        return erro('assento inválido para esta sala', 400)
+    if mapa.ocupado(indice):
+        return erro('assento já vendido', 409)
+
+    assento = rotulo_assento(indice)
+    if not reservar_assento(sessao.id, assento, current_user.id):
+        return erro('assento reservado por outra pessoa', 409)
+    adicionar_sessao_ao_carrinho(obter_carrinho(current_user.id, criar=True), sessao, assento=assento)
+    return resposta_json(_carrinho_json(current_user.id), 201)
+
+
+# Tira o ingresso do carrinho e libera a reserva do assento
+@api.route('/carrinho/assentos/<int:sessao_id>/<assento>', methods=['DELETE'])
+@login_api
+def remover_assento(sessao_id, assento):
+    carrinho = obter_carrinho(current_user.id)
+    compra = carrinho and CompraSessao.query.filter_by(carrinho_id=carrinho.id, sessao_id=sessao_id,
+                                                       assento=assento).first()
+    if not compra:
+        return erro('ingresso não está no carrinho', 404)
+    db.session.delete(compra)  # O total do carrinho é atualizado junto
+    db.session.commit()
+    cancelar_reserva(sessao_id, assento, current_user.id)
+    return resposta_json(_carrinho_json(current_user.id))
+
+
+# {"alimento_id": 1, "quantidade": 2}
+@api.route('/carrinho/alimentos', methods=['POST'])
+@login_api
+def adicionar_alimento():
+    dados = _dados_json()
+    try:
+        quantidade = int(dados.get('quantidade', 1))
+        alimento = db.session.get(Alimento, int(dados.get('alimento_id')))
+    except (TypeError, ValueError):
+        return erro('alimento_id e quantidade devem ser números', 400)
+    if alimento is None:
+        return erro('alimento não encontrado', 404)
+    if quantidade < 1:
+        return erro('quantidade inválida', 400)
+    adicionar_alimento_ao_carrinho(obter_carrinho(current_user.id, criar=True), alimento, quantidade)
+    return resposta_json(_carrinho_json(current_user.id), 201)
+
+
+# Checkout idempotente: a mesma chave (cabeçalho Idempotency-Key) devolve sempre o mesmo pedido
+@api.route('/carrinho/finalizar', methods=['POST'])
+@login_api
+def finalizar():
+    chave = request.headers.get('Idempotency-Key') or _dados_json().get('chave')
+    if not chave:
+        return erro('informe o cabeçalho Idempotency-Key', 400)
+    try:
+        pedido = finalizar_compra(current_user.id, str(chave)[:64])
+    except CarrinhoVazio:
+        return erro('carrinho vazio', 409)
+    except AssentosIndisponiveis as e:
+        resposta = {'erro': 'assentos indisponíveis',
+                    'assentos': [{'sessao_id': s, 'assento': a} for s, a in e.assentos]}
+        return resposta_json(resposta, 409)
+    return resposta_json({'id': pedido.id, 'total': pedido.total, 'criado_em': pedido.criado_em}, 201)
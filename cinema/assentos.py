@@ -0,0 +1,200 @@
+import threading
+from collections import OrderedDict
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+from . import db
+from .cache import cache_catalogo
+from .eventos import publicar_assentos
+from .models import AssentoComprado
+
+# Quantidade de assentos em cada fileira do mapa (A1..A10, B1..B10, ...)
+ASSENTOS_POR_FILEIRA = 10
+
+# Quantidade máxima de mapas de sessões mantidos em memória
+MAX_MAPAS = 512
+
+# As vendas feitas em outros workers chegam pelo backend de invalidação do cache (compartilhado entre
+# os processos em produção, ver configurar_cache). As sessões são divididas nesta quantidade de grupos,
+# para não criar uma versão por sessão; uma venda recarrega só os mapas do mesmo grupo.
+GRUPOS_MAPAS = 256
+
+
+# Nome da fileira a partir do seu índice: 0 -> A, 25 -> Z, 26 -> AA
+def rotulo_fileira(indice):
+    rotulo = ''
+    indice += 1
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        rotulo = chr(ord('A') + resto) + rotulo
+    return rotulo
+
+
+# Rótulo do assento a partir da sua posição no mapa (0 -> A1)
+def rotulo_assento(indice):
+    fileira, coluna = divmod(indice, ASSENTOS_POR_FILEIRA)
+    return f'{rotulo_fileira(fileira)}{coluna + 1}'
+
+
+# Posição do assento no mapa a partir do texto digitado ('B3' ou '13'); None se for inválido
+def indice_assento(assento, capacidade):
+    texto = (assento or '').strip().upper()
+    letras = texto.rstrip('0123456789')
+    numero = texto[len(letras):]
+    if not numero or (letras and not letras.isalpha()):
+        return None
+
+    if letras:
+        fileira = 0
+        for letra in letras:
+            fileira = fileira * 26 + (ord(letra) - ord('A') + 1)
+        coluna = int(numero)
+        if not 1 <= coluna <= ASSENTOS_POR_FILEIRA:
+            return None
+        indice = (fileira - 1) * ASSENTOS_POR_FILEIRA + coluna - 1
+    else:
+        indice = int(numero) - 1
+
+    if not 0 <= indice < capacidade:
+        return None
+    return indice
+
+
+# Mapa de ocupação de uma sessão: um bit por assento, dimensionado pela capacidade da sala
+class MapaAssentos:
+    def __init__(self, capacidade):
+        self.capacidade = capacidade
+        self.bits = bytearray((capacidade + 7) // 8)
+        self.ocupados = 0
+
+    def ocupado(self, indice):
+        return bool(self.bits[indice >> 3] & (1 << (indice & 7)))
+
+    def ocupar(self, indice):
+        if not self.ocupado(indice):
+            self.bits[indice >> 3] |= 1 << (indice & 7)
+            self.ocupados += 1
+
+    def liberar(self, indice):
+        if self.ocupado(indice):
+            self.bits[indice >> 3] &= ~(1 << (indice & 7)) & 0xFF
+            self.ocupados -= 1
+
+    @property
+    def livres(self):
+        return self.capacidade - self.ocupados
+
+    # Fileiras do mapa para o template: [(rotulo, [(assento, ocupado), ...]), ...]
+    def fileiras(self):
+        resultado = []
+        for inicio in range(0, self.capacidade, ASSENTOS_POR_FILEIRA):
+            fim = min(inicio + ASSENTOS_POR_FILEIRA, self.capacidade)
+            assentos = [(rotulo_assento(i), self.ocupado(i)) for i in range(inicio, fim)]
+            resultado.append((rotulo_fileira(inicio // ASSENTOS_POR_FILEIRA), assentos))
+        return resultado
+
+
+# Mapas em memória por sessão (LRU), protegidos por um lock entre threads
+_mapas = OrderedDict()  # sessao_id -> (versão do grupo, MapaAssentos)
+_lock = threading.Lock()
+
+
+def _grupo(sessao_id):
+    return f'assentos-{sessao_id % GRUPOS_MAPAS}'
+
+
+# Monta o mapa lendo só a coluna 'assento' da sessão, sem carregar objetos do ORM
+def _carregar_mapa(sessao_id, capacidade):
+    mapa = MapaAssentos(capacidade)
+    linhas = db.session.query(AssentoComprado.assento).filter(AssentoComprado.sessao_id == sessao_id)
+    for (assento,) in linhas:
+        indice = indice_assento(assento, capacidade)
+        if indice is not None:
+            mapa.ocupar(indice)
+    return mapa
+
+
+# Retorna o mapa de ocupação da sessão, carregando do banco na primeira vez e depois de uma venda
+# (em qualquer worker) numa sessão do mesmo grupo
+def mapa_da_sessao(sessao):
+    capacidade = sessao.sala.capacidade
+    versao = cache_catalogo.backend.versao(_grupo(sessao.id))  # Lida antes do banco: não esconde vendas
+    with _lock:
+        item = _mapas.get(sessao.id)
+        if item is not None and item[0] == versao and item[1].capacidade == capacidade:
+            _mapas.move_to_end(sessao.id)
+            return item[1]
+
+    mapa = _carregar_mapa(sessao.id, capacidade)
+    with _lock:
+        _mapas[sessao.id] = (versao, mapa)
+        _mapas.move_to_end(sessao.id)
+        while len(_mapas) > MAX_MAPAS:
+            _mapas.popitem(last=False)
+    return mapa
+
+
+# Verifica se o assento existe na sala e está livre na sessão
+def assento_livre(sessao, assento):
+    mapa = mapa_da_sessao(sessao)
+    indice = indice_assento(assento, mapa.capacidade)
+    return indice is not None and not mapa.ocupado(indice)
+
+
+# Remove o mapa da memória de todos os workers (ex.: quando a sessão ou a sala muda)
+def descartar_mapa(sessao_id):
+    cache_catalogo.backend.publicar(_grupo(sessao_id))
+    with _lock:
+        _mapas.pop(sessao_id, None)
+
+
+def _aplicar(sessao_id, assento, ocupar):
+    with _lock:
+        item = _mapas.get(sessao_id)
+        if item is None:
+            return
+        mapa = item[1]
+        indice = indice_assento(assento, mapa.capacidade)
+        if indice is None:
+            return
+        if ocupar:
+            mapa.ocupar(indice)
+        else:
+            mapa.liberar(indice)
+
+
+# Mantém os mapas sincronizados com a tabela AssentoComprado.
+# As mudanças são guardadas na sessão do banco e só aplicadas depois do commit.
+@event.listens_for(AssentoComprado, 'after_insert')
+def _assento_inserido(mapper, connection, alvo):
+    object_session(alvo).info.setdefault('assentos_pendentes', []).append((alvo.sessao_id, alvo.assento, True))
+
+
+@event.listens_for(AssentoComprado, 'after_delete')
+def _assento_removido(mapper, connection, alvo):
+    object_session(alvo).info.setdefault('assentos_pendentes', []).append((alvo.sessao_id, alvo.assento, False))
+
+
+# Para escritas em massa que não passam pelos eventos do modelo (ex.: checkout)
+def anotar_assentos(sessao_db, assentos, ocupar=True):
+    sessao_db.info.setdefault('assentos_pendentes', []).extend(
+        (sessao_id, assento, ocupar) for sessao_id, assento in assentos)
+
+
+# Depois do commit invalida os mapas dessas sessões nos outros workers e avisa quem está vendo o mapa
+# (ver cinema/eventos.py). Aqui o mapa em memória é corrigido na hora e volta a ser lido do banco no
+# próximo acesso, como nos outros processos.
+@event.listens_for(db.session, 'after_commit')
+def _confirmar_assentos(sessao_db):
+    mudancas = {}
+    for sessao_id, assento, ocupar in sessao_db.info.pop('assentos_pendentes', []):
+        _aplicar(sessao_id, assento, ocupar)
+        mudancas.setdefault(sessao_id, []).append({'assento': assento, 'estado': 'vendido' if ocupar else 'livre'})
+    for grupo in {_grupo(sessao_id) for sessao_id in mudancas}:
+        cache_catalogo.backend.publicar(grupo)
+    for sessao_id, lista in mudancas.items():
+        publicar_assentos(sessao_id, lista)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _descartar_assentos(sessao_db, transacao_anterior):
+    sessao_db.info.pop('assentos_pendentes', None)
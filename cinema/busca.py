@@ -0,0 +1,373 @@
+import bisect
+import heapq
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+
+import click
+from sqlalchemy import event, inspect, insert, select, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import object_session
+from . import db
+from .models import Alimento, Filme
+
+# Quantos resultados o autocompletar devolve e por quanto tempo (segundos) o índice em memória
+# vale antes de ser recarregado (pega alterações feitas por outros processos)
+LIMITE_PADRAO = 10
+BUSCA_TTL = 300
+
+# tipo -> (modelo, colunas pesquisadas, colunas devolvidas, tabela FTS5)
+TIPOS = {
+    'filmes': (Filme, ('titulo', 'genero'), ('id', 'titulo', 'genero'), 'busca_filme'),
+    'alimentos': (Alimento, ('nome',), ('id', 'nome', 'preco'), 'busca_alimento'),
+}
+TIPO_POR_MODELO = {modelo: tipo for tipo, (modelo, _, _, _) in TIPOS.items()}
+
+
+# Minúsculas, sem acentos e só letras/números: "Ação!" -> "acao"
+def normalizar(texto):
+    texto = unicodedata.normalize('NFKD', texto or '')
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+    return ' '.join(''.join(c if c.isalnum() else ' ' for c in texto).split())
+
+
+def _trigramas(palavra):
+    palavra = '  ' + palavra + ' '
+    return {palavra[i:i + 3] for i in range(len(palavra) - 2)}
+
+
+# Trigramas que toda palavra começando com 'prefixo' tem (sem o espaço final, que marcaria o fim da palavra)
+def _trigramas_prefixo(prefixo):
+    prefixo = '  ' + prefixo
+    return {prefixo[i:i + 3] for i in range(len(prefixo) - 2)}
+
+
+# Índice usado quando o banco não tem FTS5. Os trigramas indexam o vocabulário (palavras distintas),
+# que é pequeno; cada palavra aponta para os documentos que a contêm, já na ordem de exibição
+# (textos mais curtos primeiro). A busca junta essas listas em ordem e para nos primeiros resultados,
+# sem precisar ordenar todos os documentos encontrados.
+class IndiceTrigramas:
+    def __init__(self):
+        self.textos = {}                    # id -> texto normalizado
+        self.registros = {}                 # id -> dados devolvidos pela busca
+        self.documentos = {}                # palavra -> [(ordem, id)] ordenada
+        self.palavras = defaultdict(set)    # trigrama -> palavras do vocabulário
+        self.criado_em = time.monotonic()
+
+    def __len__(self):
+        return len(self.textos)
+
+    def adicionar(self, id, texto, registro):
+        self.remover(id)
+        texto = normalizar(texto)
+        self.textos[id] = texto
+        self.registros[id] = registro
+        ordem = (len(texto), id)
+        for palavra in set(texto.split()):
+            documentos = self.documentos.get(palavra)
+            if documentos is None:
+                documentos = self.documentos[palavra] = []
+                for grama in _trigramas(palavra):
+                    self.palavras[grama].add(palavra)
+            bisect.insort(documentos, (ordem, id))
+
+    def remover(self, id):
+        texto = self.textos.pop(id, None)
+        self.registros.pop(id, None)
+        if texto is None:
+            return
+        ordem = (len(texto), id)
+        for palavra in set(texto.split()):
+            documentos = self.documentos[palavra]
+            documentos.pop(bisect.bisect_left(documentos, (ordem, id)))
+            if not documentos:
+                del self.documentos[palavra]
+                for grama in _trigramas(palavra):
+                    self.palavras[grama].discard(palavra)
+                    if not self.palavras[grama]:
+                        del self.palavras[grama]
+
+    # Palavras do vocabulário que começam com o prefixo
+    def _completar(self, prefixo):
+        listas = sorted((self.palavras.get(grama, ()) for grama in _trigramas_prefixo(prefixo)), key=len)
+        if not listas[0]:
+            return []
+        return [p for p in set(listas[0]).intersection(*listas[1:]) if p.startswith(prefixo)]
+
+    # Documentos em que cada palavra da busca é o começo de alguma palavra do texto
+    def buscar(self, consulta, limite=LIMITE_PADRAO):
+        palavras = normalizar(consulta).split()
+        if not palavras:
+            return []
+        completadas = [self._completar(palavra) for palavra in palavras]
+        if not all(completadas):
+            return []
+
+        # Percorre, em ordem, os documentos da palavra da busca com menos ocorrências e confere as outras
+        tamanhos = [sum(len(self.documentos[p]) for p in lista) for lista in completadas]
+        guia = tamanhos.index(min(tamanhos))
+        outras = [set(lista) for i, lista in enumerate(completadas) if i != guia]
+
+        encontrados, vistos = [], set()
+        for _, id in heapq.merge(*(self.documentos[p] for p in completadas[guia])):
+            if id in vistos:
+                continue
+            vistos.add(id)
+            palavras_texto = self.textos[id].split()
+            if all(any(p in conjunto for p in palavras_texto) for conjunto in outras):
+                encontrados.append(self.registros[id])
+                if len(encontrados) >= limite:
+                    break
+        return encontrados
+
+
+_indices = {}  # tipo -> IndiceTrigramas
+_lock = threading.Lock()
+
+
+def _texto(tipo, valores):
+    return ' '.join(str(valores.get(coluna) or '') for coluna in TIPOS[tipo][1])
+
+
+def _registro(tipo, valores):
+    return {coluna: valores.get(coluna) for coluna in TIPOS[tipo][2]}
+
+
+def _construir_indice(tipo):
+    modelo, pesquisadas, devolvidas, _ = TIPOS[tipo]
+    colunas = [getattr(modelo, c) for c in dict.fromkeys(pesquisadas + devolvidas)]
+    indice = IndiceTrigramas()
+    for linha in db.session.execute(select(*colunas).execution_options(yield_per=5000)).mappings():
+        indice.adicionar(linha['id'], _texto(tipo, linha), _registro(tipo, linha))
+    return indice
+
+
+def indice_em_memoria(tipo):
+    with _lock:
+        indice = _indices.get(tipo)
+        if indice is not None and time.monotonic() - indice.criado_em < BUSCA_TTL:
+            return indice
+    indice = _construir_indice(tipo)
+    with _lock:
+        _indices[tipo] = indice
+    return indice
+
+
+_com_fts = {}  # URL do banco -> as tabelas FTS5 existem?
+
+
+def tem_fts(conexao):
+    url = str(conexao.engine.url)
+    if url not in _com_fts:
+        _com_fts[url] = conexao.dialect.name == 'sqlite' and inspect(conexao).has_table('busca_filme')
+    return _com_fts[url]
+
+
+# Cria e preenche as tabelas FTS5 (chamada pela migração). Sem FTS5 no SQLite, ou em outro banco,
+# não faz nada e a busca usa o índice de trigramas em memória.
+def criar_tabelas_fts(conexao):
+    if conexao.dialect.name != 'sqlite':
+        return False
+    for tipo, (modelo, pesquisadas, _, tabela) in TIPOS.items():
+        try:
+            conexao.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {tabela} USING fts5("
+                f"{', '.join(pesquisadas)}, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"))
+        except OperationalError:
+            return False  # SQLite compilado sem FTS5
+        _preencher_fts(conexao, tipo)
+    _com_fts.pop(str(conexao.engine.url), None)
+    return True
+
+
+def _preencher_fts(conexao, tipo):
+    modelo, pesquisadas, _, tabela = TIPOS[tipo]
+    conexao.execute(text(f"DELETE FROM {tabela}"))
+    colunas = ', '.join(f"COALESCE({c}, '')" for c in pesquisadas)
+    conexao.execute(text(f"INSERT INTO {tabela} (rowid, {', '.join(pesquisadas)}) "
+                         f"SELECT id, {colunas} FROM {modelo.__tablename__}"))
+
+
+def _busca_fts(tipo, consulta, limite):
+    modelo, pesquisadas, devolvidas, tabela = TIPOS[tipo]
+    palavras = normalizar(consulta).split()
+    if not palavras:
+        return []
+    # Cada palavra vira um prefixo ("acao"*); a primeira coluna (título/nome) pesa mais no bm25.
+    # Prefixos de uma ou duas letras casam com boa parte do catálogo: sem o bm25, que teria de pontuar
+    # todos, o SQLite para nos primeiros resultados.
+    expressao = ' '.join(f'"{palavra}"*' for palavra in palavras)
+    if min(len(palavra) for palavra in palavras) >= 3:
+        ordem = f"bm25({tabela}, {', '.join(['10.0'] + ['1.0'] * (len(pesquisadas) - 1))}), m.id"
+    else:
+        ordem = f"{tabela}.rowid"
+    colunas = ', '.join(f"m.{c}" for c in devolvidas)
+    linhas = db.session.execute(text(
+        f"SELECT {colunas} FROM {tabela} JOIN {modelo.__tablename__} AS m ON m.id = {tabela}.rowid "
+        f"WHERE {tabela} MATCH :expressao ORDER BY {ordem} LIMIT :limite"),
+        {'expressao': expressao, 'limite': limite}).mappings()
+    return [dict(linha) for linha in linhas]
+
+
+# Autocompletar: FTS5 quando o banco tem as tabelas, senão o índice de trigramas em memória
+def buscar(tipo, consulta, limite=LIMITE_PADRAO):
+    if tem_fts(db.session.connection()):
+        return _busca_fts(tipo, consulta, limite)
+    return indice_em_memoria(tipo).buscar(consulta, limite)
+
+
+# Refaz os índices (ex.: depois de uma importação em massa, que não passa pelos eventos do modelo)
+def reindexar(*tipos):
+    tipos = tipos or tuple(TIPOS)
+    conexao = db.session.connection()
+    if tem_fts(conexao):
+        for tipo in tipos:
+            _preencher_fts(conexao, tipo)
+        db.session.commit()
+    with _lock:
+        for tipo in tipos:
+            _indices.pop(tipo, None)
+
+
+# Mantém os índices atualizados. As tabelas FTS5 mudam na mesma transação da escrita;
+# o índice em memória só depois do commit.
+def _alterado(mapper, connection, alvo, removido=False):
+    tipo = TIPO_POR_MODELO[type(alvo)]
+    modelo, pesquisadas, devolvidas, tabela = TIPOS[tipo]
+    if tem_fts(connection):
+        connection.execute(text(f"DELETE FROM {tabela} WHERE rowid = :id"), {'id': alvo.id})
+        if not removido:
+            connection.execute(text(f"INSERT INTO {tabela} (rowid, {', '.join(pesquisadas)}) VALUES "
+                                    f"(:id, {', '.join(':' + c for c in pesquisadas)})"),
+                               {'id': alvo.id, **{c: getattr(alvo, c) or '' for c in pesquisadas}})
+    valores = None if removido else {c: getattr(alvo, c) for c in dict.fromkeys(pesquisadas + devolvidas)}
+    object_session(alvo).info.setdefault('busca_pendente', []).append((tipo, alvo.id, valores))
+
+
+def _inserido_ou_atualizado(mapper, connection, alvo):
+    _alterado(mapper, connection, alvo)
+
+
+def _apagado(mapper, connection, alvo):
+    _alterado(mapper, connection, alvo, removido=True)
+
+
+for _modelo in TIPO_POR_MODELO:
+    event.listen(_modelo, 'after_insert', _inserido_ou_atualizado)
+    event.listen(_modelo, 'after_update', _inserido_ou_atualizado)
+    event.listen(_modelo, 'after_delete', _apagado)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _aplicar_busca(sessao_db):
+    pendentes = sessao_db.info.pop('busca_pendente', [])
+    if not pendentes:
+        return
+    with _lock:
+        for tipo, id, valores in pendentes:
+            indice = _indices.get(tipo)
+            if indice is None:
+                continue
+            if valores is None:
+                indice.remover(id)
+            else:
+                indice.adicionar(id, _texto(tipo, valores), _registro(tipo, valores))
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _descartar_busca(sessao_db, transacao_anterior):
+    sessao_db.info.pop('busca_pendente', None)
+
+
+PALAVRAS = ('amor', 'guerra', 'noite', 'cidade', 'sombra', 'estrela', 'ação', 'missão', 'último', 'rei', 'mar',
+            'fogo', 'gelo', 'coração', 'segredo', 'viagem', 'tempo', 'perdido', 'caçador', 'dragão', 'sonho',
+            'vingança', 'futuro', 'planeta', 'herói', 'lenda', 'silêncio', 'tesouro', 'abismo', 'espelho')
+GENEROS = ('Ação', 'Comédia', 'Drama', 'Terror', 'Ficção', 'Animação', 'Romance', 'Suspense')
+SILABAS = ('ba', 'ca', 'da', 'fe', 'ga', 'li', 'mo', 'na', 'pe', 'ra', 'so', 'ta', 'vi', 'lu', 'ro', 'me', 'ni', 'co')
+
+
+# Vocabulário do benchmark: as palavras acima e alguns milhares de palavras inventadas
+def _vocabulario(aleatorio, tamanho=5000):
+    palavras = set(PALAVRAS)
+    while len(palavras) < tamanho:
+        palavras.add(''.join(aleatorio.choice(SILABAS) for _ in range(aleatorio.randint(2, 4))))
+    return sorted(palavras)
+
+
+def _percentis(tempos):
+    tempos = sorted(tempos)
+    return (statistics.median(tempos) * 1000, tempos[int(len(tempos) * 0.95)] * 1000,
+            tempos[int(len(tempos) * 0.99)] * 1000)
+
+
+# Benchmark: latência do autocompletar com FTS5, trigramas e LIKE '%...%' num SQLite temporário
+def medir_busca(filmes, consultas, saida=print):
+    from . import create_app
+
+    aleatorio = random.Random(7)
+    caminho = os.path.join(tempfile.mkdtemp(), 'busca.db')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{caminho}'})
+    try:
+        with app.app_context():
+            db.create_all()
+            vocabulario = _vocabulario(aleatorio)
+            db.session.execute(insert(Filme.__table__), [
+                {'titulo': ' '.join(aleatorio.sample(vocabulario, aleatorio.randint(2, 4))).capitalize(),
+                 'genero': aleatorio.choice(GENEROS), 'duracao': 120, 'classificacao': 'L'}
+                for i in range(filmes)])
+            db.session.commit()
+
+            buscas = []
+            for _ in range(consultas):
+                palavras = [normalizar(p) for p in aleatorio.sample(vocabulario, aleatorio.randint(1, 2))]
+                palavras[-1] = palavras[-1][:aleatorio.randint(1, len(palavras[-1]))]  # Ainda digitando
+                buscas.append(' '.join(palavras))
+
+            antes = time.perf_counter()
+            indice = indice_em_memoria('filmes')
+            saida(f"{filmes} filmes; índice de trigramas montado em {time.perf_counter() - antes:.2f}s")
+
+            def medir(nome, funcao):
+                tempos = []
+                for consulta in buscas:
+                    comeco = time.perf_counter()
+                    funcao(consulta)
+                    tempos.append(time.perf_counter() - comeco)
+                saida("{:10} p50 {:7.2f} ms   p95 {:7.2f} ms   p99 {:7.2f} ms".format(nome, *_percentis(tempos)))
+
+            medir('trigramas', lambda consulta: indice.buscar(consulta))
+            with db.engine.begin() as conexao:
+                criar_tabelas_fts(conexao)
+            if tem_fts(db.session.connection()):
+                medir('fts5', lambda consulta: _busca_fts('filmes', consulta, LIMITE_PADRAO))
+            medir('like', lambda consulta: db.session.execute(
+                select(Filme.id, Filme.titulo).where(Filme.titulo.like(f'%{consulta}%')).limit(LIMITE_PADRAO)).all())
+    finally:
+        with app.app_context():
+            db.engine.dispose()
+        with _lock:
+            _indices.clear()
+        _com_fts.clear()
+        for sufixo in ('', '-wal', '-shm'):
+            if os.path.exists(caminho + sufixo):
+                os.remove(caminho + sufixo)
+
+
+def registrar_comandos(app):
+    @app.cli.command('reindexar-busca')
+    def reindexar_comando():
+        """Refaz os índices de busca de filmes e alimentos."""
+        reindexar()
+        click.echo("Índices de busca refeitos.")
+
+    @app.cli.command('benchmark-busca')
+    @click.option('--filmes', default=100000, show_default=True)
+    @click.option('--consultas', default=2000, show_default=True)
+    def benchmark_busca_comando(filmes, consultas):
+        """Mede a latência do autocompletar (FTS5, trigramas e LIKE) em um banco SQLite temporário."""
+        medir_busca(filmes, consultas, saida=click.echo)
@@ -0,0 +1,159 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event
+from . import db
+
+# Valores padrão do cache do catálogo (podem ser trocados na configuração do app)
+CACHE_TTL = 300  # segundos
+CACHE_MAX_ITENS = 1000
+
+# Grupos do catálogo que cada modelo afeta quando é alterado
+GRUPOS_POR_MODELO = {
+    'Filme': ('filmes', 'sessoes'),
+    'Sala': ('salas', 'sessoes'),
+    'Cinema': ('salas', 'sessoes'),
+    'Sessao': ('sessoes',),
+    'Alimento': ('alimentos',),
+}
+
+
+# Backend de invalidação de um único processo: as versões ficam só na memória
+class BackendMemoria:
+    def __init__(self):
+        self._versoes = {}
+        self._lock = threading.Lock()
+
+    def versao(self, grupo):
+        return self._versoes.get(grupo, 0)
+
+    def publicar(self, grupo):
+        with self._lock:
+            self._versoes[grupo] = self._versoes.get(grupo, 0) + 1
+
+
+# Backend compartilhado entre processos na mesma máquina: um arquivo por grupo,
+# cuja data de modificação funciona como versão (substituto local de um Redis, por exemplo)
+class BackendArquivo:
+    def __init__(self, diretorio):
+        self.diretorio = diretorio
+        os.makedirs(diretorio, exist_ok=True)
+
+    def _caminho(self, grupo):
+        return os.path.join(self.diretorio, grupo + '.versao')
+
+    def versao(self, grupo):
+        try:
+            return os.stat(self._caminho(grupo)).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def publicar(self, grupo):
+        caminho = self._caminho(grupo)
+        anterior = self.versao(grupo)
+        temporario = f'{caminho}.{os.getpid()}.{threading.get_ident()}'
+        with open(temporario, 'w') as arquivo:
+            arquivo.write(str(time.time_ns()))
+        # Garante que a versão mude mesmo em sistemas de arquivos com mtime de baixa resolução
+        agora = time.time_ns()
+        os.utime(temporario, ns=(agora, max(agora, anterior + 1)))
+        os.replace(temporario, caminho)
+
+
+# Cache em memória com TTL e limite LRU. Cada entrada guarda a versão do seu grupo:
+# quando o grupo é invalidado (aqui ou em outro processo), a entrada deixa de valer.
+class CacheCatalogo:
+    def __init__(self, ttl=CACHE_TTL, max_itens=CACHE_MAX_ITENS, backend=None):
+        self.ttl = ttl
+        self.max_itens = max_itens
+        self.backend = backend or BackendMemoria()
+        self.acertos = 0
+        self.falhas = 0
+        self.invalidacoes = 0
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, grupo, chave, carregar):
+        versao = self.backend.versao(grupo)
+        agora = time.monotonic()
+        with self._lock:
+            item = self._itens.get((grupo, chave))
+            if item is not None and item[0] == versao and item[1] > agora:
+                self._itens.move_to_end((grupo, chave))
+                self.acertos += 1
+                return item[2]
+            self.falhas += 1
+
+        valor = carregar()
+        with self._lock:
+            self._itens[(grupo, chave)] = (versao, agora + self.ttl, valor)
+            self._itens.move_to_end((grupo, chave))
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+        return valor
+
+    def invalidar(self, *grupos):
+        for grupo in grupos:
+            self.backend.publicar(grupo)
+        with self._lock:
+            self.invalidacoes += len(grupos)
+            for chave in [c for c in self._itens if c[0] in grupos]:
+                del self._itens[chave]
+
+    def descartar(self, grupo, chave):
+        with self._lock:
+            self._itens.pop((grupo, chave), None)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+    def estatisticas(self):
+        with self._lock:
+            total = self.acertos + self.falhas
+            return {
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'taxa_acerto': round(self.acertos / total, 4) if total else 0.0,
+                'invalidacoes': self.invalidacoes,
+                'itens': len(self._itens),
+                'max_itens': self.max_itens,
+                'ttl': self.ttl,
+                'backend': type(self.backend).__name__,
+            }
+
+
+# Instância usada pelo app; reconfigurada em configurar_cache()
+cache_catalogo = CacheCatalogo()
+
+
+# Lê CATALOGO_CACHE_TTL, CATALOGO_CACHE_MAX e CATALOGO_CACHE_DIR (ou CINEMA_CACHE_DIR no ambiente).
+# Com um diretório configurado, vários workers compartilham as invalidações.
+def configurar_cache(app):
+    diretorio = app.config.get('CATALOGO_CACHE_DIR') or os.environ.get('CINEMA_CACHE_DIR')
+    cache_catalogo.ttl = app.config.get('CATALOGO_CACHE_TTL', CACHE_TTL)
+    cache_catalogo.max_itens = app.config.get('CATALOGO_CACHE_MAX', CACHE_MAX_ITENS)
+    cache_catalogo.backend = BackendArquivo(diretorio) if diretorio else BackendMemoria()
+    cache_catalogo.limpar()
+
+
+# Invalida os grupos do catálogo quando as rotas de administração gravam filmes, salas, sessões ou alimentos.
+# Os grupos alterados são anotados no flush e só invalidados depois do commit.
+@event.listens_for(db.session, 'after_flush')
+def _anotar_alteracoes(sessao_db, contexto):
+    grupos = sessao_db.info.setdefault('grupos_catalogo', set())
+    for objeto in list(sessao_db.new) + list(sessao_db.dirty) + list(sessao_db.deleted):
+        grupos.update(GRUPOS_POR_MODELO.get(type(objeto).__name__, ()))
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidar_alteracoes(sessao_db):
+    grupos = sessao_db.info.pop('grupos_catalogo', None)
+    if grupos:
+        cache_catalogo.invalidar(*grupos)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _descartar_alteracoes(sessao_db, transacao_anterior):
+    sessao_db.info.pop('grupos_catalogo', None)
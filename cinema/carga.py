@@ -0,0 +1,506 @@
+import contextvars
+import http.cookiejar
+import json
+import logging
+import platform
+import random
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from datetime import date, datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import func, insert, select
+from . import db
+from .agenda import LIMPEZA_MINUTOS
+from .analises import recalcular
+from .assentos import rotulo_assento
+from .busca import GENEROS, PALAVRAS, SILABAS, reindexar
+from .cache import cache_catalogo
+from .models import (AssentoComprado, Alimento, Carrinho, Cinema, CompraAlimento, Filme, ItemPedido, Pedido, Sala,
+                     Sessao, Usuario)
+from .senhas import gerar_hash
+
+# Tamanhos prontos do banco sintético; qualquer valor pode ser trocado pelas opções do comando
+ESCALAS = {
+    'pequena': {'usuarios': 500, 'cinemas': 3, 'salas': 4, 'filmes': 60, 'alimentos': 20,
+                'dias': 7, 'sessoes_por_dia': 4, 'pedidos': 2000, 'carrinhos': 100},
+    'media': {'usuarios': 20000, 'cinemas': 20, 'salas': 8, 'filmes': 500, 'alimentos': 40,
+              'dias': 14, 'sessoes_por_dia': 5, 'pedidos': 50000, 'carrinhos': 2000},
+    'grande': {'usuarios': 200000, 'cinemas': 100, 'salas': 10, 'filmes': 3000, 'alimentos': 60,
+               'dias': 30, 'sessoes_por_dia': 5, 'pedidos': 500000, 'carrinhos': 20000},
+}
+
+SENHA_CARGA = 'carga123'  # Mesma senha (e mesmo hash) para todos os usuários gerados
+HISTORICO_DIAS = 7  # A programação começa uma semana antes de hoje, para os relatórios terem vendas
+LOTE = 5000
+
+CIDADES = ('Centro', 'Norte', 'Sul', 'Leste', 'Oeste', 'Shopping', 'Praia', 'Aeroporto', 'Universidade', 'Estação')
+CLASSIFICACOES = ('L', '10', '12', '14', '16', '18')
+ALIMENTOS = (('Pipoca', 'Comida', 18.0), ('Refrigerante', 'Bebida', 9.0), ('Água', 'Bebida', 5.0),
+             ('Suco', 'Bebida', 10.0), ('Chocolate', 'Doce', 8.0), ('Nachos', 'Comida', 22.0),
+             ('Cachorro-quente', 'Comida', 16.0), ('Balas', 'Doce', 6.0), ('Sorvete', 'Doce', 12.0),
+             ('Café', 'Bebida', 7.0))
+TAMANHOS = (('Pequeno', 1.0), ('Médio', 1.3), ('Grande', 1.6), ('Combo', 2.2), ('Família', 3.0), ('Kids', 0.8))
+PRECOS_SESSAO = (20.0, 25.0, 30.0, 35.0)
+
+carga_cli = AppGroup('carga', help='Banco sintético e testes de carga.')
+
+
+def _proximo_id(modelo):
+    return db.session.scalar(select(func.coalesce(func.max(modelo.id), 0))) + 1
+
+
+# INSERT em massa em lotes, sem passar pelos eventos do ORM
+def _inserir(modelo, linhas):
+    for inicio in range(0, len(linhas), LOTE):
+        db.session.execute(insert(modelo.__table__), linhas[inicio:inicio + LOTE])
+    return len(linhas)
+
+
+def _titulo(aleatorio):
+    palavras = [aleatorio.choice(PALAVRAS) if aleatorio.random() < 0.6 else
+                ''.join(aleatorio.choice(SILABAS) for _ in range(aleatorio.randint(2, 4)))
+                for _ in range(aleatorio.randint(1, 4))]
+    return ' '.join(palavras).capitalize()
+
+
+def _programacao(aleatorio, salas, filmes, dias, sessoes_por_dia, inicio, proximo_id):
+    sessoes = []  # (id, sala_id, filme_id, horario, preco, capacidade)
+    for sala_id, capacidade in salas:
+        for dia in range(-HISTORICO_DIAS, dias):
+            horario = datetime.combine(inicio + timedelta(days=dia), datetime.min.time()) + timedelta(hours=13)
+            for _ in range(sessoes_por_dia):
+                filme_id, duracao = aleatorio.choice(filmes)
+                sessoes.append((proximo_id + len(sessoes), sala_id, filme_id, horario,
+                                aleatorio.choice(PRECOS_SESSAO), capacidade))
+                minutos = duracao + LIMPEZA_MINUTOS
+                horario += timedelta(minutes=minutos + (-minutos) % 15)  # Próxima sessão num horário "redondo"
+    return sessoes
+
+
+# Preenche o banco configurado com dados sintéticos: usuários, cinemas, salas, filmes, alimentos,
+# sessões, pedidos já pagos (com assentos vendidos) e carrinhos em aberto. Os ids continuam a partir
+# dos que já existem, então dá para rodar sobre um banco com dados.
+def gerar_dados(usuarios, cinemas, salas, filmes, alimentos, dias, sessoes_por_dia, pedidos, carrinhos,
+                semente=42, inicio=None, saida=print):
+    aleatorio = random.Random(semente)
+    inicio = inicio or date.today()
+    agora = datetime.now()
+    totais = {}
+
+    senha = gerar_hash(SENHA_CARGA)
+    primeiro_usuario = _proximo_id(Usuario)
+    ids_usuarios = range(primeiro_usuario, primeiro_usuario + usuarios)
+    totais['usuarios'] = _inserir(Usuario, [
+        {'id': i, 'nome': f'Cliente {i}', 'email': f'carga{i}@cinema.com', 'senha': senha, 'is_admin': False,
+         'data_nascimento': date(aleatorio.randint(1950, 2008), aleatorio.randint(1, 12), aleatorio.randint(1, 28))}
+        for i in ids_usuarios])
+
+    primeiro_cinema, primeira_sala = _proximo_id(Cinema), _proximo_id(Sala)
+    linhas_cinemas, lista_salas = [], []
+    for c in range(cinemas):
+        capacidades = [aleatorio.randrange(60, 261, 20) for _ in range(salas)]
+        cidade = CIDADES[c % len(CIDADES)]
+        linhas_cinemas.append({'id': primeiro_cinema + c, 'nome': f'Cinema {cidade} {c // len(CIDADES) + 1}',
+                               'local': cidade, 'capacidade': sum(capacidades)})
+        for numero, capacidade in enumerate(capacidades, 1):
+            lista_salas.append({'id': primeira_sala + len(lista_salas), 'numero': str(numero),
+                                'capacidade': capacidade, 'cinema_id': primeiro_cinema + c})
+    totais['cinemas'] = _inserir(Cinema, linhas_cinemas)
+    totais['salas'] = _inserir(Sala, lista_salas)
+
+    primeiro_filme = _proximo_id(Filme)
+    linhas_filmes = [{'id': primeiro_filme + f, 'titulo': _titulo(aleatorio), 'duracao': aleatorio.randint(80, 180),
+                      'classificacao': aleatorio.choice(CLASSIFICACOES), 'genero': aleatorio.choice(GENEROS),
+                      'data_lancamento': inicio - timedelta(days=aleatorio.randint(0, 730))} for f in range(filmes)]
+    totais['filmes'] = _inserir(Filme, linhas_filmes)
+
+    primeiro_alimento = _proximo_id(Alimento)
+    lista_alimentos = []
+    for a in range(alimentos):
+        nome, tipo, preco = ALIMENTOS[a % len(ALIMENTOS)]
+        tamanho, fator = TAMANHOS[a // len(ALIMENTOS) % len(TAMANHOS)]
+        lista_alimentos.append({'id': primeiro_alimento + a, 'nome': f'{nome} {tamanho}',
+                                'preco': round(preco * fator, 2), 'tipoDeAlimentos': tipo})
+    totais['alimentos'] = _inserir(Alimento, lista_alimentos)
+
+    sessoes = _programacao(aleatorio, [(s['id'], s['capacidade']) for s in lista_salas],
+                           [(f['id'], f['duracao']) for f in linhas_filmes], dias, sessoes_por_dia, inicio,
+                           _proximo_id(Sessao))
+    totais['sessoes'] = _inserir(Sessao, [{'id': id, 'sala_id': sala_id, 'filme_id': filme_id, 'horario': horario,
+                                           'preco': preco}
+                                          for id, sala_id, filme_id, horario, preco, _ in sessoes])
+    db.session.commit()
+    saida(f"Catálogo: {totais['cinemas']} cinemas, {totais['salas']} salas, {totais['filmes']} filmes, "
+          f"{totais['sessoes']} sessões, {totais['alimentos']} alimentos")
+
+    # Pedidos pagos: 1 a 4 assentos livres de uma sessão e, às vezes, alimentos
+    vendidos = {}
+    totais.update(pedidos=0, ingressos=0)
+    lote_pedidos, lote_itens, lote_assentos = [], [], []
+    pedido_id = _proximo_id(Pedido)
+    for _ in range(pedidos):
+        sessao_id, _, _, horario, preco, capacidade = aleatorio.choice(sessoes)
+        ocupados = vendidos.setdefault(sessao_id, set())
+        quantidade = min(aleatorio.randint(1, 4), capacidade - len(ocupados))
+        if quantidade <= 0:
+            continue
+        livres = set()
+        while len(livres) < quantidade:
+            indice = aleatorio.randrange(capacidade)
+            if indice not in ocupados:
+                livres.add(indice)
+        ocupados |= livres
+
+        total = 0.0
+        for indice in sorted(livres):
+            assento = rotulo_assento(indice)
+            lote_itens.append({'pedido_id': pedido_id, 'sessao_id': sessao_id, 'assento': assento, 'alimento_id': None,
+                               'quantidade': 1, 'preco_unitario': preco, 'subtotal': preco})
+            lote_assentos.append({'sessao_id': sessao_id, 'assento': assento, 'pedido_id': pedido_id})
+            total += preco
+        if aleatorio.random() < 0.5:
+            for alimento in aleatorio.sample(lista_alimentos, min(aleatorio.randint(1, 2), len(lista_alimentos))):
+                vezes = aleatorio.randint(1, 3)
+                lote_itens.append({'pedido_id': pedido_id, 'sessao_id': None, 'assento': None,
+                                   'alimento_id': alimento['id'], 'quantidade': vezes,
+                                   'preco_unitario': alimento['preco'], 'subtotal': alimento['preco'] * vezes})
+                total += alimento['preco'] * vezes
+
+        criado_em = min(horario - timedelta(minutes=aleatorio.randint(10, 3 * 24 * 60)), agora)
+        lote_pedidos.append({'id': pedido_id, 'usuario_id': aleatorio.choice(ids_usuarios),
+                             'chave': f'carga-{pedido_id}', 'total': round(total, 2), 'criado_em': criado_em})
+        pedido_id += 1
+        totais['ingressos'] += len(livres)
+
+        if len(lote_itens) >= LOTE:
+            totais['pedidos'] += _inserir(Pedido, lote_pedidos)
+            _inserir(ItemPedido, lote_itens)
+            _inserir(AssentoComprado, lote_assentos)
+            db.session.commit()
+            lote_pedidos, lote_itens, lote_assentos = [], [], []
+    totais['pedidos'] += _inserir(Pedido, lote_pedidos)
+    _inserir(ItemPedido, lote_itens)
+    _inserir(AssentoComprado, lote_assentos)
+
+    # Carrinhos em aberto só com alimentos, nos últimos usuários: os primeiros ficam livres para o teste de carga
+    primeiro_carrinho = _proximo_id(Carrinho)
+    linhas_carrinhos, linhas_compras = [], []
+    for n, usuario_id in enumerate(ids_usuarios[-min(carrinhos, usuarios):] if carrinhos else ()):
+        total = 0.0
+        for alimento in aleatorio.sample(lista_alimentos, min(aleatorio.randint(1, 3), len(lista_alimentos))):
+            vezes = aleatorio.randint(1, 2)
+            linhas_compras.append({'carrinho_id': primeiro_carrinho + n, 'alimento_id': alimento['id'],
+                                   'quantidade': vezes, 'preco_unitario': alimento['preco'],
+                                   'subtotal': alimento['preco'] * vezes})
+            total += alimento['preco'] * vezes
+        linhas_carrinhos.append({'id': primeiro_carrinho + n, 'usuario_id': usuario_id, 'criado_em': agora,
+                                 'total': round(total, 2)})
+    totais['carrinhos'] = _inserir(Carrinho, linhas_carrinhos)
+    _inserir(CompraAlimento, linhas_compras)
+    db.session.commit()
+    saida(f"Vendas: {totais['pedidos']} pedidos, {totais['ingressos']} ingressos; "
+          f"{totais['carrinhos']} carrinhos em aberto; {totais['usuarios']} usuários (senha '{SENHA_CARGA}')")
+
+    # Os INSERTs em massa não passam pelos eventos do ORM: relatórios, busca e cache são refeitos aqui
+    recalcular(db.session.connection())
+    db.session.commit()
+    reindexar()
+    cache_catalogo.invalidar('filmes', 'salas', 'sessoes', 'alimentos')
+    return totais
+
+
+# Cliente que chama o app direto, sem rede (mede só o Flask e o banco)
+class ClienteTeste:
+    def __init__(self, app):
+        self.cliente = app.test_client()
+
+    def requisitar(self, metodo, caminho, json=None, form=None, cabecalhos=None):
+        resposta = self.cliente.open(caminho, method=metodo, json=json, data=form, headers=cabecalhos)
+        return resposta.status_code, resposta.get_data()
+
+
+class _SemRedirecionar(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None  # O 302 volta como resposta, igual ao cliente de teste
+
+
+# Cliente HTTP de verdade, com cookies próprios (um por usuário virtual)
+class ClienteHttp:
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self.abridor = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _SemRedirecionar)
+
+    def requisitar(self, metodo, caminho, json=None, form=None, cabecalhos=None):
+        cabecalhos = dict(cabecalhos or {})
+        corpo = None
+        if json is not None:
+            corpo = _json_bytes(json)
+            cabecalhos['Content-Type'] = 'application/json'
+        elif form is not None:
+            corpo = urllib.parse.urlencode(form).encode()
+            cabecalhos['Content-Type'] = 'application/x-www-form-urlencoded'
+        pedido = urllib.request.Request(self.url + caminho, data=corpo, headers=cabecalhos, method=metodo)
+        try:
+            with self.abridor.open(pedido, timeout=30) as resposta:
+                return resposta.status, resposta.read()
+        except urllib.error.HTTPError as erro:
+            return erro.code, erro.read()
+
+
+def _json_bytes(dados):
+    return json.dumps(dados).encode()
+
+
+# Um cliente navegando: sessões do dia -> mapa de assentos -> escolhe um assento -> alimento -> carrinho
+class UsuarioVirtual:
+    def __init__(self, cliente, email, dias, alimentos, aleatorio, checkout=True):
+        self.cliente = cliente
+        self.email = email
+        self.dias = dias
+        self.alimentos = alimentos
+        self.aleatorio = aleatorio
+        self.checkout = checkout
+        self.amostras = []  # (etapa, segundos, status)
+        self.gravando = True
+
+    def _medir(self, etapa, metodo, caminho, **kwargs):
+        antes = time.perf_counter()
+        try:
+            status, corpo = self.cliente.requisitar(metodo, caminho, **kwargs)
+        except Exception:
+            status, corpo = 0, b''  # Falha de conexão ou timeout
+        if self.gravando:
+            self.amostras.append((etapa, time.perf_counter() - antes, status))
+        return status, corpo
+
+    def entrar(self):
+        status, _ = self.cliente.requisitar('POST', '/login', form={'email': self.email, 'senha': SENHA_CARGA})
+        return status == 302
+
+    def navegar(self):
+        dia = self.aleatorio.choice(self.dias).isoformat()
+        self._medir('listar_sessoes', 'GET', f'/sessoes?data={dia}')
+        status, corpo = self._medir('api_sessoes', 'GET', f'/api/v1/sessoes?data={dia}')
+        sessoes = json.loads(corpo) if status == 200 else []
+        if not sessoes:
+            return
+
+        sessao_id = self.aleatorio.choice(sessoes)['id']
+        status, corpo = self._medir('mapa_assentos', 'GET', f'/api/v1/sessoes/{sessao_id}/assentos')
+        if status == 200:
+            mapa = json.loads(corpo)
+            indisponiveis = set(mapa['ocupados']) | set(mapa['reservados'])
+            livres = [a for a in map(rotulo_assento, range(mapa['capacidade'])) if a not in indisponiveis]
+            if livres:
+                self._medir('escolher_assento', 'POST', '/api/v1/carrinho/assentos',
+                            json={'sessao_id': sessao_id, 'assento': self.aleatorio.choice(livres)})
+
+        if self.alimentos:
+            self._medir('adicionar_alimento', 'POST', '/api/v1/carrinho/alimentos',
+                        json={'alimento_id': self.aleatorio.choice(self.alimentos),
+                              'quantidade': self.aleatorio.randint(1, 3)})
+        self._medir('ver_carrinho', 'GET', '/ver_carrinho')
+        if self.checkout:
+            self._medir('finalizar', 'POST', '/api/v1/carrinho/finalizar',
+                        cabecalhos={'Idempotency-Key': uuid.uuid4().hex})
+
+
+def _percentil(ordenados, q):
+    return ordenados[min(len(ordenados) - 1, int(q * len(ordenados)))]
+
+
+def _resumir(amostras, duracao):
+    tempos = sorted(segundos for _, segundos, _ in amostras)
+    status = {}
+    for _, _, codigo in amostras:
+        status[str(codigo)] = status.get(str(codigo), 0) + 1
+    if not tempos:
+        return {'requisicoes': 0, 'status': status}
+    return {
+        'requisicoes': len(tempos),
+        'rps': round(len(tempos) / duracao, 1),
+        'media_ms': round(sum(tempos) / len(tempos) * 1000, 2),
+        'p50_ms': round(_percentil(tempos, 0.50) * 1000, 2),
+        'p95_ms': round(_percentil(tempos, 0.95) * 1000, 2),
+        'p99_ms': round(_percentil(tempos, 0.99) * 1000, 2),
+        'max_ms': round(tempos[-1] * 1000, 2),
+        'erros': sum(1 for _, _, codigo in amostras if codigo == 0 or codigo >= 500),
+        'status': status,
+    }
+
+
+def _versao():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True,
+                              timeout=5, cwd=current_app.root_path).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+# Roda o fluxo com `usuarios` clientes ao mesmo tempo, cada um repetindo `iteracoes` vezes.
+# criar_cliente() devolve um cliente novo (test client ou HTTP) para cada usuário virtual.
+def medir_carga(criar_cliente, usuarios, iteracoes, aquecimento=1, checkout=True, semente=42, saida=print):
+    emails = db.session.scalars(select(Usuario.email).where(Usuario.email.like('carga%@cinema.com'))
+                                .order_by(Usuario.id).limit(usuarios)).all()
+    alimentos = db.session.scalars(select(Alimento.id)).all()
+    db.session.remove()  # Cada requisição abre a própria sessão do banco
+    if len(emails) < usuarios:
+        raise click.ClickException(f"Só existem {len(emails)} usuários gerados; rode 'flask carga gerar' antes.")
+
+    dias = [date.today() + timedelta(days=d) for d in range(7)]
+    virtuais = [UsuarioVirtual(criar_cliente(), email, dias, alimentos, random.Random(semente + n), checkout)
+                for n, email in enumerate(emails)]
+    # Em sequência (o hash da senha é caro e não faz parte da medição) e fora do contexto do comando:
+    # o cliente de teste reaproveitaria o g do app e o current_user de um login vazaria para o próximo
+    for virtual in virtuais:
+        if not contextvars.Context().run(virtual.entrar):
+            raise click.ClickException(f"Não foi possível entrar como {virtual.email}.")
+
+    # O aquecimento (caches e mapas de assentos) fica fora da medição
+    barreira = threading.Barrier(len(virtuais) + 1)
+
+    def trabalhar(virtual):
+        virtual.gravando = False
+        for _ in range(aquecimento):
+            virtual.navegar()
+        barreira.wait()
+        virtual.gravando = True
+        for _ in range(iteracoes):
+            virtual.navegar()
+
+    threads = [threading.Thread(target=trabalhar, args=(virtual,)) for virtual in virtuais]
+    for thread in threads:
+        thread.start()
+    barreira.wait()
+    comeco = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    duracao = time.perf_counter() - comeco
+
+    amostras = [amostra for virtual in virtuais for amostra in virtual.amostras]
+    etapas = {}
+    for amostra in amostras:
+        etapas.setdefault(amostra[0], []).append(amostra)
+    resultado = {
+        'quando': datetime.now().isoformat(timespec='seconds'),
+        'versao': _versao(),
+        'banco': db.engine.dialect.name,
+        'python': platform.python_version(),
+        'usuarios': usuarios,
+        'iteracoes': iteracoes,
+        'checkout': checkout,
+        'duracao_s': round(duracao, 3),
+        'total': _resumir(amostras, duracao),
+        'etapas': {etapa: _resumir(lista, duracao) for etapa, lista in etapas.items()},
+    }
+    _imprimir(resultado, saida)
+    return resultado
+
+
+def _imprimir(resultado, saida):
+    saida(f"{'etapa':<20}{'req':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'erros':>7}")
+    for nome, dados in list(resultado['etapas'].items()) + [('total', resultado['total'])]:
+        if not dados['requisicoes']:
+            continue
+        saida(f"{nome:<20}{dados['requisicoes']:>8}{dados['rps']:>9.1f}{dados['p50_ms']:>9.2f}"
+              f"{dados['p95_ms']:>9.2f}{dados['p99_ms']:>9.2f}{dados['erros']:>7}")
+
+
+# Compara dois resultados salvos: p95 maior ou req/s menor que a tolerância (em %) é regressão
+def comparar(base, novo, tolerancia):
+    regressoes = []
+    for nome in sorted(set(base['etapas']) & set(novo['etapas'])) + ['total']:
+        antes = base['total'] if nome == 'total' else base['etapas'][nome]
+        depois = novo['total'] if nome == 'total' else novo['etapas'][nome]
+        if not antes.get('requisicoes') or not depois.get('requisicoes'):
+            continue
+        p95 = (depois['p95_ms'] - antes['p95_ms']) / antes['p95_ms'] * 100 if antes['p95_ms'] else 0.0
+        rps = (depois['rps'] - antes['rps']) / antes['rps'] * 100 if antes['rps'] else 0.0
+        regrediu = p95 > tolerancia or (nome == 'total' and rps < -tolerancia)
+        regressoes.append((nome, antes['p95_ms'], depois['p95_ms'], p95, antes['rps'], depois['rps'], rps, regrediu))
+    return regressoes
+
+
+@carga_cli.command('gerar')
+@click.option('--escala', type=click.Choice(sorted(ESCALAS)), default='pequena', show_default=True)
+@click.option('--usuarios', type=int)
+@click.option('--cinemas', type=int)
+@click.option('--salas', type=int, help='Salas por cinema.')
+@click.option('--filmes', type=int)
+@click.option('--alimentos', type=int)
+@click.option('--dias', type=int, help='Dias de programação a partir de hoje.')
+@click.option('--sessoes-por-dia', type=int, help='Sessões por sala por dia.')
+@click.option('--pedidos', type=int)
+@click.option('--carrinhos', type=int, help='Carrinhos em aberto.')
+@click.option('--semente', default=42, show_default=True)
+def gerar_comando(escala, semente, **valores):
+    """Preenche o banco configurado com dados sintéticos (use um banco só para testes)."""
+    opcoes = dict(ESCALAS[escala], **{nome: valor for nome, valor in valores.items() if valor is not None})
+    antes = time.perf_counter()
+    gerar_dados(semente=semente, saida=click.echo, **opcoes)
+    click.echo(f"Dados gerados em {time.perf_counter() - antes:.1f}s")
+
+
+@carga_cli.command('medir')
+@click.option('--usuarios', default=20, show_default=True, help='Usuários virtuais ao mesmo tempo.')
+@click.option('--iteracoes', default=10, show_default=True, help='Vezes que cada usuário repete o fluxo.')
+@click.option('--aquecimento', default=1, show_default=True, help='Iterações iniciais fora da medição.')
+@click.option('--servidor', type=click.Choice(['teste', 'wsgi']), default='teste', show_default=True,
+              help='teste: cliente de teste do Flask; wsgi: servidor HTTP do werkzeug neste processo.')
+@click.option('--url', help='Mede um servidor já rodando (ex.: gunicorn) que usa o mesmo banco.')
+@click.option('--checkout/--sem-checkout', default=True, show_default=True, help='Finaliza a compra no fim do fluxo.')
+@click.option('--saida', type=click.Path(dir_okay=False), help='Grava o resultado em JSON.')
+def medir_comando(usuarios, iteracoes, aquecimento, servidor, url, checkout, saida):
+    """Mede latência (p50/p95/p99) e requisições por segundo do fluxo de compra."""
+    app = current_app._get_current_object()
+    servidor_wsgi = None
+    if url:
+        criar_cliente = lambda: ClienteHttp(url)
+    elif servidor == 'wsgi':
+        from werkzeug.serving import make_server
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)  # Sem uma linha de log por requisição
+        servidor_wsgi = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=servidor_wsgi.serve_forever, daemon=True).start()
+        endereco = f'http://127.0.0.1:{servidor_wsgi.server_port}'
+        criar_cliente = lambda: ClienteHttp(endereco)
+    else:
+        criar_cliente = lambda: ClienteTeste(app)
+
+    try:
+        resultado = medir_carga(criar_cliente, usuarios, iteracoes, aquecimento, checkout, saida=click.echo)
+    finally:
+        if servidor_wsgi is not None:
+            servidor_wsgi.shutdown()
+    resultado['servidor'] = url or servidor
+    if saida:
+        with open(saida, 'w', encoding='utf-8') as arquivo:
+            json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+        click.echo(f"Resultado gravado em {saida}")
+
+
+@carga_cli.command('comparar')
+@click.argument('base', type=click.File(encoding='utf-8'))
+@click.argument('novo', type=click.File(encoding='utf-8'))
+@click.option('--tolerancia', default=10.0, show_default=True, help='Piora aceita, em %.')
+def comparar_comando(base, novo, tolerancia):
+    """Compara dois resultados de 'flask carga medir' e falha se houver regressão."""
+    linhas = comparar(json.load(base), json.load(novo), tolerancia)
+    click.echo(f"{'etapa':<20}{'p95 antes':>11}{'p95 agora':>11}{'Δ%':>8}{'req/s antes':>13}{'req/s agora':>13}{'Δ%':>8}")
+    for nome, p95_antes, p95_depois, p95, rps_antes, rps_depois, rps, regrediu in linhas:
+        click.echo(f"{nome:<20}{p95_antes:>11.2f}{p95_depois:>11.2f}{p95:>+8.1f}{rps_antes:>13.1f}"
+                   f"{rps_depois:>13.1f}{rps:>+8.1f}" + ('  REGRESSÃO' if regrediu else ''))
+    if any(linha[-1] for linha in linhas):
+        raise click.ClickException(f"Regressão acima de {tolerancia:.0f}%.")
+
+
+def registrar_comandos(app):
+    app.cli.add_command(carga_cli)
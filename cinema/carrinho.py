@@ -0,0 +1,106 @@
+from sqlalchemy import event, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from . import db
+from .models import Carrinho, CompraAlimento, CompraSessao, Sessao
+
+
+# Busca o carrinho do usuário (um único por usuário) pelo índice de usuario_id.
+# Com criar=True, cria o carrinho caso ainda não exista.
+def obter_carrinho(usuario_id, criar=False):
+    carrinho = Carrinho.query.filter_by(usuario_id=usuario_id).first()
+    if carrinho or not criar:
+        return carrinho
+
+    carrinho = Carrinho(usuario_id=usuario_id)
+    try:
+        db.session.add(carrinho)
+        db.session.commit()
+        return carrinho
+    except IntegrityError:
+        # Outra requisição criou o carrinho ao mesmo tempo: usa o que já existe
+        db.session.rollback()
+        return Carrinho.query.filter_by(usuario_id=usuario_id).first()
+
+
+# Adiciona alimentos ao carrinho usando o preço cadastrado do alimento
+def adicionar_alimento_ao_carrinho(carrinho, alimento, quantidade=1):
+    compra = CompraAlimento(carrinho_id=carrinho.id, alimento_id=alimento.id, quantidade=quantidade,
+                            preco_unitario=alimento.preco, subtotal=quantidade * alimento.preco)
+    db.session.add(compra)
+    db.session.commit()
+    return compra
+
+
+# Adiciona ingressos de uma sessão ao carrinho. Com assento, é um ingresso só para o assento
+# reservado (o mesmo assento não entra duas vezes no carrinho).
+def adicionar_sessao_ao_carrinho(carrinho, sessao, quantidade=1, assento=None):
+    if assento is not None:
+        existente = CompraSessao.query.filter_by(carrinho_id=carrinho.id, sessao_id=sessao.id, assento=assento).first()
+        if existente:
+            return existente
+        quantidade = 1
+    compra = CompraSessao(carrinho_id=carrinho.id, sessao_id=sessao.id, assento=assento, quantidade=quantidade,
+                          subtotal=quantidade * sessao.preco)
+    db.session.add(compra)
+    db.session.commit()
+    return compra
+
+
+# Itens do carrinho no formato usado pelo template ver_carrinho.html
+def itens_do_carrinho(carrinho):
+    if carrinho is None:
+        return []
+
+    itens = []
+    sessoes = CompraSessao.query.options(joinedload(CompraSessao.sessao).joinedload(Sessao.filme)) \
+        .filter_by(carrinho_id=carrinho.id).order_by(CompraSessao.id)
+    for compra in sessoes:
+        descricao = f"{compra.sessao.filme.titulo} - {compra.sessao.horario.strftime('%d/%m/%Y %H:%M')}"
+        if compra.assento:
+            descricao += f" - Assento {compra.assento}"
+        itens.append({
+            'tipo_item': 'Ingresso',
+            'descricao': descricao,
+            'preco_unitario': compra.sessao.preco,
+            'quantidade': compra.quantidade,
+            'subtotal': compra.subtotal,
+        })
+
+    alimentos = CompraAlimento.query.options(joinedload(CompraAlimento.alimento)) \
+        .filter_by(carrinho_id=carrinho.id).order_by(CompraAlimento.id)
+    for compra in alimentos:
+        itens.append({
+            'tipo_item': 'Alimento',
+            'descricao': compra.alimento.nome,
+            'preco_unitario': compra.preco_unitario,
+            'quantidade': compra.quantidade,
+            'subtotal': compra.subtotal,
+        })
+    return itens
+
+
+# Soma dos itens do carrinho calculada no banco (carrinho_id pode ser um valor ou a coluna carrinho.id)
+def total_em_sql(carrinho_id):
+    total_sessoes = select(func.coalesce(func.sum(CompraSessao.subtotal), 0.0)) \
+        .where(CompraSessao.carrinho_id == carrinho_id).scalar_subquery()
+    total_alimentos = select(func.coalesce(func.sum(CompraAlimento.subtotal), 0.0)) \
+        .where(CompraAlimento.carrinho_id == carrinho_id).scalar_subquery()
+    return total_sessoes + total_alimentos
+
+
+# Recalcula Carrinho.total com uma soma feita no próprio banco, sem carregar os itens
+def _atualizar_total(connection, carrinho_id):
+    connection.execute(update(Carrinho.__table__)
+                       .where(Carrinho.__table__.c.id == carrinho_id)
+                       .values(total=total_em_sql(carrinho_id)))
+
+
+# Mantém o total do carrinho atualizado sempre que um item entra, muda ou sai
+def _item_alterado(mapper, connection, alvo):
+    _atualizar_total(connection, alvo.carrinho_id)
+
+
+for _modelo in (CompraSessao, CompraAlimento):
+    for _evento in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_modelo, _evento, _item_alterado)
@@ -0,0 +1,107 @@
+import os
+import sqlite3
+import tempfile
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Valores padrão do pool de conexões (podem ser trocados por variáveis de ambiente)
+POOL_SIZE = 10
+MAX_OVERFLOW = 20
+POOL_RECYCLE = 280  # segundos; menor que o wait_timeout padrão do MySQL
+SQLITE_BUSY_TIMEOUT = 5000  # milissegundos
+
+# Chave das sessões usada em desenvolvimento; em produção CINEMA_SECRET_KEY é obrigatória
+CHAVE_DESENVOLVIMENTO = '17052008'
+
+
+def _env_int(nome, padrao):
+    valor = os.environ.get(nome)
+    return int(valor) if valor not in (None, '') else padrao
+
+
+def _env_bool(nome, padrao):
+    valor = os.environ.get(nome)
+    if valor in (None, ''):
+        return padrao
+    return valor.strip().lower() in ('1', 'true', 'sim', 'yes', 'on')
+
+
+# Perfis de execução: desenvolvimento (padrão, servidor do Flask com debug) ou producao (wsgi.py)
+PERFIS = ('desenvolvimento', 'producao')
+
+
+# Ajustes do perfil escolhido (PERFIL na configuração ou CINEMA_PERFIL). Vem antes do cache e dos eventos:
+# em produção há vários processos, então o cache do catálogo e os eventos de assentos passam a usar
+# os backends em arquivo, compartilhados entre os workers.
+def configurar_perfil(app):
+    perfil = app.config.setdefault('PERFIL', os.environ.get('CINEMA_PERFIL') or 'desenvolvimento')
+    if perfil not in PERFIS:
+        raise ValueError(f"Perfil desconhecido: {perfil} (use {' ou '.join(PERFIS)})")
+    if os.environ.get('CINEMA_SECRET_KEY'):
+        app.secret_key = os.environ['CINEMA_SECRET_KEY']
+    elif perfil == 'producao' and app.secret_key == CHAVE_DESENVOLVIMENTO:
+        # A chave do código é pública: com ela qualquer um assina sessões válidas
+        raise RuntimeError("Defina CINEMA_SECRET_KEY para usar o perfil producao")
+    if perfil != 'producao':
+        return
+
+    app.config.update(DEBUG=False, TESTING=False, TEMPLATES_AUTO_RELOAD=False, PROPAGATE_EXCEPTIONS=False)
+    app.config.setdefault('SESSION_COOKIE_SAMESITE', 'Lax')
+    app.config.setdefault('SESSION_COOKIE_SECURE', _env_bool('CINEMA_COOKIE_SEGURO', False))
+    compartilhado = os.environ.get('CINEMA_DIR_COMPARTILHADO') or os.path.join(tempfile.gettempdir(), 'cinema')
+    app.config.setdefault('CATALOGO_CACHE_DIR', os.environ.get('CINEMA_CACHE_DIR') or os.path.join(compartilhado, 'cache'))
+    app.config.setdefault('EVENTOS_DIR', os.environ.get('CINEMA_EVENTOS_DIR') or os.path.join(compartilhado, 'eventos'))
+    # Cada stream SSE aberto prende uma thread do worker WSGI: em produção a página conecta no
+    # `flask servir-eventos` (asyncio). ':8001' é o mesmo host da página nessa porta; atrás de um proxy
+    # que encaminha /api/v1/sessoes/<id>/eventos para ele, use CINEMA_EVENTOS_URL vazio.
+    app.config.setdefault('EVENTOS_URL', os.environ.get('CINEMA_EVENTOS_URL', ':8001'))
+    app.config.setdefault('EVENTOS_NO_APP', _env_bool('CINEMA_EVENTOS_NO_APP', False))
+
+
+# URI do banco: CINEMA_DATABASE_URI ou DATABASE_URL, senão o Cinema.db local
+def uri_do_banco(project_dir):
+    uri = os.environ.get('CINEMA_DATABASE_URI') or os.environ.get('DATABASE_URL')
+    if not uri:
+        return "sqlite:///{}".format(os.path.join(project_dir, "Cinema.db"))
+    # Usa o PyMySQL (já presente no requirements.txt) quando o driver não for informado
+    if uri.startswith('mysql://'):
+        uri = 'mysql+pymysql://' + uri[len('mysql://'):]
+    return uri
+
+
+# Opções do engine ajustadas para cada banco; busy_timeout em milissegundos (só SQLite)
+def opcoes_do_engine(uri, busy_timeout=SQLITE_BUSY_TIMEOUT):
+    if uri.startswith('sqlite'):
+        # O SQLite usa um arquivo local: o pool padrão já serve, só evitamos conexões presas à thread.
+        # O timeout do sqlite3 é o busy_timeout da conexão: vai junto do engine de cada app.
+        return {'connect_args': {'check_same_thread': False, 'timeout': busy_timeout / 1000}}
+
+    opcoes = {
+        'pool_size': _env_int('CINEMA_DB_POOL_SIZE', POOL_SIZE),
+        'max_overflow': _env_int('CINEMA_DB_MAX_OVERFLOW', MAX_OVERFLOW),
+        'pool_recycle': _env_int('CINEMA_DB_POOL_RECYCLE', POOL_RECYCLE),
+        'pool_pre_ping': _env_bool('CINEMA_DB_PRE_PING', True),
+    }
+    if uri.startswith('mysql'):
+        opcoes['connect_args'] = {'charset': 'utf8mb4'}
+    return opcoes
+
+
+# Preenche a configuração do banco no app, respeitando o que já foi definido
+def configurar_banco(app, project_dir):
+    app.config.setdefault("SQLALCHEMY_DATABASE_URI", uri_do_banco(project_dir))
+    app.config.setdefault("SQLITE_BUSY_TIMEOUT", _env_int('CINEMA_SQLITE_BUSY_TIMEOUT', SQLITE_BUSY_TIMEOUT))
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS",
+                          opcoes_do_engine(app.config["SQLALCHEMY_DATABASE_URI"], app.config["SQLITE_BUSY_TIMEOUT"]))
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+
+# No SQLite, liga o modo WAL (leitores não bloqueiam o escritor) em cada conexão nova
+@event.listens_for(Engine, "connect")
+def _configurar_sqlite(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode = WAL")
+    cursor.execute("PRAGMA synchronous = NORMAL")
+    cursor.close()
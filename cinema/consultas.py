@@ -0,0 +1,135 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from sqlalchemy import select
+from sqlalchemy.orm import contains_eager, joinedload
+from . import db
+from .cache import cache_catalogo
+from .models import Alimento, Filme, Sessao, Sala
+
+# Quantidade padrão de sessões por página nas listagens
+SESSOES_POR_PAGINA = 50
+
+
+# Converte o parâmetro 'data' (AAAA-MM-DD) da URL, ignorando valores inválidos
+def ler_data(valor):
+    if not valor:
+        return None
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d')
+    except ValueError:
+        return None
+
+
+# Monta a consulta de sessões já trazendo filme e sala no mesmo SELECT,
+# evitando uma consulta extra por linha quando o template acessa sessao.filme e sessao.sala
+def consulta_sessoes(inicio=None, fim=None, cinema_id=None):
+    consulta = (Sessao.query
+                .join(Sessao.sala)
+                .options(contains_eager(Sessao.sala), joinedload(Sessao.filme)))
+
+    if inicio is not None:
+        consulta = consulta.filter(Sessao.horario >= inicio)
+    if fim is not None:
+        consulta = consulta.filter(Sessao.horario < fim)
+    if cinema_id is not None:
+        consulta = consulta.filter(Sala.cinema_id == cinema_id)
+
+    return consulta.order_by(Sessao.horario, Sessao.id)
+
+
+# Lista uma página de sessões filtrando por janela de datas e cinema
+def listar_sessoes(data=None, dias=1, cinema_id=None, pagina=1, por_pagina=SESSOES_POR_PAGINA):
+    inicio = fim = None
+    if data is not None:
+        inicio = data
+        fim = data + timedelta(days=max(dias, 1))
+
+    consulta = consulta_sessoes(inicio, fim, cinema_id)
+    return consulta.paginate(page=pagina, per_page=por_pagina, error_out=False)
+
+
+# Consulta de sessões com os filtros da URL (data, dias, cinema e filme), para as listagens de administração
+def consulta_sessoes_filtrada(args):
+    data = ler_data(args.get('data'))
+    fim = data + timedelta(days=max(args.get('dias', 1, type=int), 1)) if data else None
+    consulta = consulta_sessoes(data, fim, args.get('cinema_id', type=int))
+    if args.get('filme_id', type=int):
+        consulta = consulta.filter(Sessao.filme_id == args.get('filme_id', type=int))
+    return consulta
+
+
+# Lê os filtros da listagem a partir dos argumentos da requisição
+def filtros_sessoes(args):
+    return {
+        'data': ler_data(args.get('data')),
+        'dias': args.get('dias', 1, type=int),
+        'cinema_id': args.get('cinema_id', type=int),
+        'pagina': args.get('pagina', 1, type=int),
+    }
+
+
+# Página de resultados guardada no cache, com a mesma interface usada pelos templates
+class PaginaCache:
+    def __init__(self, itens, pagina, por_pagina, total):
+        self.items = itens
+        self.page = pagina
+        self.per_page = por_pagina
+        self.total = total
+
+    @property
+    def pages(self):
+        return max((self.total + self.per_page - 1) // self.per_page, 1) if self.per_page else 1
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+    @property
+    def has_next(self):
+        return self.page < self.pages
+
+    @property
+    def prev_num(self):
+        return self.page - 1 if self.has_prev else None
+
+    @property
+    def next_num(self):
+        return self.page + 1 if self.has_next else None
+
+
+# Registros simples (sem ligação com a sessão do banco), seguros para guardar no cache
+def _registros(modelo):
+    linhas = db.session.execute(select(*modelo.__table__.columns).order_by(modelo.id)).mappings()
+    return [SimpleNamespace(**linha) for linha in linhas]
+
+
+def _registro_sessao(sessao):
+    return SimpleNamespace(
+        id=sessao.id, filme_id=sessao.filme_id, sala_id=sessao.sala_id,
+        horario=sessao.horario, preco=sessao.preco,
+        filme=SimpleNamespace(id=sessao.filme.id, titulo=sessao.filme.titulo, duracao=sessao.filme.duracao),
+        sala=SimpleNamespace(id=sessao.sala.id, numero=sessao.sala.numero, capacidade=sessao.sala.capacidade,
+                             cinema_id=sessao.sala.cinema_id))
+
+
+# Catálogo de filmes, salas e alimentos com cache (invalidado pelas rotas de administração)
+def catalogo_filmes():
+    return cache_catalogo.obter('filmes', 'todos', lambda: _registros(Filme))
+
+
+def catalogo_salas():
+    return cache_catalogo.obter('salas', 'todas', lambda: _registros(Sala))
+
+
+def catalogo_alimentos():
+    return cache_catalogo.obter('alimentos', 'todos', lambda: _registros(Alimento))
+
+
+# Listagem paginada de sessões com cache por combinação de filtros
+def catalogo_sessoes(data=None, dias=1, cinema_id=None, pagina=1, por_pagina=SESSOES_POR_PAGINA):
+    def carregar():
+        resultado = listar_sessoes(data, dias, cinema_id, pagina, por_pagina)
+        return PaginaCache([_registro_sessao(s) for s in resultado.items], resultado.page,
+                           resultado.per_page, resultado.total)
+
+    return cache_catalogo.obter('sessoes', (data, dias, cinema_id, pagina, por_pagina), carregar)
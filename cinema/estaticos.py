@@ -0,0 +1,146 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+
+import click
+from flask import abort, request, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # Sem o módulo brotli, só a versão gzip é oferecida
+    brotli = None
+
+# Um ano: como o nome muda junto com o conteúdo, o navegador pode guardar o arquivo para sempre
+MAX_AGE_IMUTAVEL = 31536000
+
+# Tipos que valem a pena comprimir (imagens JPEG/PNG já são comprimidas)
+TIPOS_COMPRIMIVEIS = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+_IMPRESSAO = re.compile(r'^(?P<base>.+)\.(?P<hash>[0-9a-f]{12})(?P<ext>\.[^./]+)$')
+
+
+# Manifesto dos arquivos estáticos: nome original -> nome com o hash do conteúdo.
+# É preenchido sob demanda e refeito quando o arquivo muda (ex.: pôsteres enviados depois do início).
+class ManifestoEstaticos:
+    def __init__(self, pasta):
+        self.pasta = pasta
+        self._arquivos = {}  # nome -> (mtime_ns, tamanho, hash, conteudo comprimido por codificação)
+        self._lock = threading.Lock()
+
+    def _caminho(self, nome):
+        caminho = os.path.normpath(os.path.join(self.pasta, nome))
+        if not caminho.startswith(os.path.abspath(self.pasta) + os.sep):
+            return None
+        return caminho
+
+    def entrada(self, nome):
+        caminho = self._caminho(nome)
+        if caminho is None:
+            return None
+        try:
+            info = os.stat(caminho)
+        except OSError:
+            return None
+
+        entrada = self._arquivos.get(nome)
+        if entrada and entrada[0] == info.st_mtime_ns and entrada[1] == info.st_size:
+            return entrada
+
+        with open(caminho, 'rb') as arquivo:
+            conteudo = arquivo.read()
+        resumo = hashlib.sha256(conteudo).hexdigest()[:12]
+
+        comprimidos = {}
+        tipo = mimetypes.guess_type(nome)[0] or ''
+        if tipo.startswith(TIPOS_COMPRIMIVEIS):
+            comprimidos['gzip'] = gzip.compress(conteudo, compresslevel=9, mtime=0)
+            if brotli is not None:
+                comprimidos['br'] = brotli.compress(conteudo)
+
+        entrada = (info.st_mtime_ns, info.st_size, resumo, comprimidos)
+        with self._lock:
+            self._arquivos[nome] = entrada
+        return entrada
+
+    # Nome com impressão digital usado nas URLs: css/inicio.css -> css/inicio.3f2a1b9c0d12.css
+    def nome_com_hash(self, nome):
+        entrada = self.entrada(nome)
+        if entrada is None:
+            return nome
+        base, ext = os.path.splitext(nome)
+        return f'{base}.{entrada[2]}{ext}'
+
+    # Lê todos os arquivos da pasta de uma vez (chamado na inicialização)
+    def carregar_tudo(self):
+        for raiz, _, arquivos in os.walk(self.pasta):
+            for arquivo in arquivos:
+                nome = os.path.relpath(os.path.join(raiz, arquivo), self.pasta).replace(os.sep, '/')
+                self.entrada(nome)
+        return len(self._arquivos)
+
+    def nomes(self):
+        return {nome: self.nome_com_hash(nome) for nome in sorted(self._arquivos)}
+
+
+def _codificacao_aceita(comprimidos):
+    aceitas = request.accept_encodings
+    for codificacao in ('br', 'gzip'):
+        if codificacao in comprimidos and aceitas[codificacao]:
+            return codificacao
+    return None
+
+
+def configurar_estaticos(app):
+    manifesto = ManifestoEstaticos(app.static_folder)
+    app.extensions['manifesto_estaticos'] = manifesto
+    if not app.config.get('ESTATICOS_COM_HASH', True):
+        return manifesto
+    manifesto.carregar_tudo()
+
+    # url_for('static', filename=...) passa a gerar o nome com o hash do conteúdo
+    @app.url_defaults
+    def _adicionar_hash(endpoint, valores):
+        if endpoint == 'static' and 'filename' in valores:
+            valores['filename'] = manifesto.nome_com_hash(valores['filename'])
+
+    # Substitui a rota static padrão: nomes com hash recebem cache de um ano e versão comprimida
+    def servir_estatico(filename):
+        encontrado = _IMPRESSAO.match(filename)
+        if not encontrado:
+            return app.send_static_file(filename)
+
+        nome = encontrado.group('base') + encontrado.group('ext')
+        entrada = manifesto.entrada(nome)
+        if entrada is None:
+            abort(404)
+        if entrada[2] != encontrado.group('hash'):
+            # Hash antigo: entrega o arquivo atual, mas sem permitir cache longo
+            return app.send_static_file(nome)
+
+        codificacao = _codificacao_aceita(entrada[3])
+        if codificacao:
+            resposta = app.response_class(entrada[3][codificacao],
+                                          mimetype=mimetypes.guess_type(nome)[0] or 'application/octet-stream')
+            resposta.headers['Content-Encoding'] = codificacao
+        else:
+            resposta = send_from_directory(app.static_folder, nome, max_age=MAX_AGE_IMUTAVEL, conditional=True)
+
+        resposta.headers['Vary'] = 'Accept-Encoding'
+        resposta.set_etag(entrada[2] + (f'-{codificacao}' if codificacao else ''))
+        resposta.cache_control.public = True
+        resposta.cache_control.max_age = MAX_AGE_IMUTAVEL
+        resposta.cache_control.immutable = True
+        return resposta.make_conditional(request)
+
+    app.view_functions['static'] = servir_estatico
+
+    @app.cli.command('manifesto-estaticos')
+    def manifesto_comando():
+        """Mostra os arquivos estáticos e seus nomes com hash."""
+        for nome, com_hash in manifesto.nomes().items():
+            click.echo(f"{nome} -> {com_hash}")
+
+    return manifesto
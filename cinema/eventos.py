@@ -0,0 +1,342 @@
+import asyncio
+import json
+import os
+import queue
+import re
+import threading
+import time
+
+import click
+
+# Intervalo (segundos) entre comentários enviados às conexões paradas, para o proxy não fechá-las
+PING_SEGUNDOS = 15
+# Com o canal em arquivo, de quanto em quanto tempo (segundos) cada processo lê os eventos novos
+LEITURA_SEGUNDOS = 0.1
+# Tamanho (bytes) a partir do qual o arquivo de eventos é trocado por um novo
+MAX_ARQUIVO = 1024 * 1024
+
+
+# Entrega os eventos de assentos aos assinantes deste processo. Cada assinante é uma função que
+# não pode bloquear (ex.: put numa fila); sessao_id=None recebe os eventos de todas as sessões.
+class Assinaturas:
+    def __init__(self):
+        self._assinantes = {}
+        self._lock = threading.Lock()
+
+    def assinar(self, sessao_id, entregar):
+        with self._lock:
+            self._assinantes.setdefault(sessao_id, set()).add(entregar)
+
+        def cancelar():
+            with self._lock:
+                assinantes = self._assinantes.get(sessao_id)
+                if assinantes is not None:
+                    assinantes.discard(entregar)
+                    if not assinantes:
+                        del self._assinantes[sessao_id]
+        return cancelar
+
+    def entregar(self, evento):
+        with self._lock:
+            assinantes = list(self._assinantes.get(evento['sessao_id'], ())) + list(self._assinantes.get(None, ()))
+        for entregar in assinantes:
+            entregar(evento)
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(assinantes) for assinantes in self._assinantes.values())
+
+
+# Canal de um único processo: o evento publicado vai direto para os assinantes
+class CanalMemoria:
+    def __init__(self, assinaturas):
+        self.assinaturas = assinaturas
+
+    def publicar(self, evento):
+        self.assinaturas.entregar(evento)
+
+    def iniciar(self):
+        pass
+
+
+# Canal compartilhado entre processos na mesma máquina (substituto local de um broker como o Redis):
+# cada evento é uma linha JSON acrescentada a um arquivo, e uma thread por processo lê as linhas novas
+# e entrega aos assinantes locais. Quando o arquivo passa de MAX_ARQUIVO, é renomeado para .1 e quem
+# está lendo termina o antigo antes de abrir o novo.
+class CanalArquivo:
+    def __init__(self, assinaturas, diretorio, intervalo=LEITURA_SEGUNDOS):
+        self.assinaturas = assinaturas
+        self.caminho = os.path.join(diretorio, 'assentos.eventos')
+        self.intervalo = intervalo
+        self._thread = None
+        self._lock = threading.Lock()
+        os.makedirs(diretorio, exist_ok=True)
+
+    def publicar(self, evento):
+        linha = json.dumps(evento, separators=(',', ':')).encode('utf-8') + b'\n'
+        arquivo = os.open(self.caminho, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(arquivo, linha)  # Uma única escrita em modo append: as linhas de processos diferentes não se misturam
+            tamanho = os.fstat(arquivo).st_size
+        finally:
+            os.close(arquivo)
+        if tamanho > MAX_ARQUIVO:
+            try:
+                os.replace(self.caminho, self.caminho + '.1')
+            except FileNotFoundError:
+                pass  # Outro processo trocou o arquivo ao mesmo tempo
+
+    # A leitura só começa quando o processo tem assinantes (um worker web comum só publica)
+    def iniciar(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._ler, name='eventos-assentos', daemon=True)
+                self._thread.start()
+
+    def _abrir(self, do_fim):
+        while True:
+            try:
+                arquivo = open(self.caminho, 'rb')
+            except FileNotFoundError:
+                open(self.caminho, 'ab').close()
+                continue
+            if do_fim:
+                arquivo.seek(0, os.SEEK_END)
+            return arquivo
+
+    def _ler(self):
+        arquivo = self._abrir(do_fim=True)  # Só interessam os eventos publicados daqui para frente
+        resto = b''
+        while True:
+            dados = arquivo.read()
+            if dados:
+                linhas = (resto + dados).split(b'\n')
+                resto = linhas.pop()
+                for linha in linhas:
+                    if linha:
+                        self.assinaturas.entregar(json.loads(linha))
+                continue
+            try:
+                trocado = os.stat(self.caminho).st_ino != os.fstat(arquivo.fileno()).st_ino
+            except FileNotFoundError:
+                trocado = True
+            if trocado:
+                arquivo.close()
+                arquivo = self._abrir(do_fim=False)
+                resto = b''
+                continue
+            time.sleep(self.intervalo)
+
+
+assinaturas = Assinaturas()
+# Instância usada pelo app; reconfigurada em configurar_eventos()
+canal = CanalMemoria(assinaturas)
+
+
+# Lê EVENTOS_DIR (ou CINEMA_EVENTOS_DIR no ambiente). Com um diretório configurado, os eventos
+# publicados por qualquer worker chegam a todos os processos que servem o stream.
+# EVENTOS_NO_APP liga o stream no próprio app (padrão fora de produção, ver configurar_perfil).
+def configurar_eventos(app):
+    global canal
+    app.config.setdefault('EVENTOS_NO_APP', True)
+    diretorio = app.config.get('EVENTOS_DIR') or os.environ.get('CINEMA_EVENTOS_DIR')
+    canal = CanalArquivo(assinaturas, diretorio) if diretorio else CanalMemoria(assinaturas)
+
+
+# Publica mudanças de assentos de uma sessão; cada mudança é {'assento': 'B3', 'estado': 'vendido' |
+# 'reservado' | 'livre'} (reservas levam também 'segundos' até expirarem). Chamar só depois do commit.
+def publicar_assentos(sessao_id, mudancas):
+    if mudancas:
+        canal.publicar({'sessao_id': sessao_id, 'mudancas': mudancas})
+
+
+def formatar_evento(evento):
+    dados = json.dumps(evento['mudancas'], separators=(',', ':'))
+    return f"event: assentos\ndata: {dados}\n\n".encode('utf-8')
+
+
+INICIO_STREAM = b"retry: 3000\n\n"  # O navegador reconecta em 3s se a conexão cair
+
+
+# Stream SSE de uma sessão para o servidor WSGI (uma thread por conexão aberta; para muitos
+# clientes, use `flask servir-eventos`)
+def stream_sessao(sessao_id):
+    fila = queue.SimpleQueue()
+    canal.iniciar()
+    cancelar = assinaturas.assinar(sessao_id, fila.put)
+
+    def gerar():
+        try:
+            yield INICIO_STREAM
+            while True:
+                try:
+                    yield formatar_evento(fila.get(timeout=PING_SEGUNDOS))
+                except queue.Empty:
+                    yield b": ping\n\n"
+        finally:
+            cancelar()
+    return gerar()
+
+
+CABECALHOS_SSE = (b"HTTP/1.1 200 OK\r\n"
+                  b"Content-Type: text/event-stream\r\n"
+                  b"Cache-Control: no-cache\r\n"
+                  b"Access-Control-Allow-Origin: *\r\n"
+                  b"Connection: keep-alive\r\n\r\n")
+CAMINHO_SSE = re.compile(rb'GET /api/v1/sessoes/(\d+)/eventos[ ?]')
+
+
+# Servidor de streams em asyncio: todas as conexões ficam numa única thread. Uma conexão parada
+# custa só o socket e uma tarefa esperando o cliente desconectar; o evento recebido do canal
+# (por uma assinatura só) é escrito direto no buffer de cada conexão da sessão.
+class ServidorEventos:
+    MAX_BUFFER = 256 * 1024  # Cliente que não lê o que recebe é desconectado
+
+    def __init__(self, ping=PING_SEGUNDOS):
+        self.ping = ping
+        self.conexoes = {}  # sessao_id -> set de escritores
+        self._tarefas = set()
+        self._loop = None
+        self._cancelar = None
+        self._ping = None
+
+    def _enviar(self, escritores, mensagem):
+        for escritor in list(escritores):
+            if escritor.transport.get_write_buffer_size() > self.MAX_BUFFER:
+                escritor.close()
+            else:
+                escritor.write(mensagem)
+
+    def _distribuir(self, evento):
+        self._enviar(self.conexoes.get(evento['sessao_id'], ()), formatar_evento(evento))
+
+    async def _pingar(self):
+        while True:
+            await asyncio.sleep(self.ping)
+            for escritores in list(self.conexoes.values()):
+                self._enviar(escritores, b": ping\n\n")
+
+    async def _atender(self, leitor, escritor):
+        tarefa = asyncio.current_task()
+        self._tarefas.add(tarefa)
+        sessao_id = None
+        try:
+            requisicao = await leitor.readline()
+            while (await leitor.readline()) not in (b'\r\n', b'\n', b''):
+                pass  # Cabeçalhos da requisição não são usados
+            encontrado = CAMINHO_SSE.match(requisicao)
+            if not encontrado:
+                escritor.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+                return
+
+            sessao_id = int(encontrado.group(1))
+            escritor.write(CABECALHOS_SSE + INICIO_STREAM)
+            self.conexoes.setdefault(sessao_id, set()).add(escritor)
+            while await leitor.read(1024):
+                pass  # O cliente não envia mais nada: a leitura só termina quando ele desconecta
+        except ConnectionError:
+            pass
+        finally:
+            if sessao_id is not None:
+                escritores = self.conexoes.get(sessao_id)
+                escritores.discard(escritor)
+                if not escritores:
+                    del self.conexoes[sessao_id]
+            escritor.close()
+            self._tarefas.discard(tarefa)
+
+    async def iniciar(self, host, porta):
+        self._loop = asyncio.get_running_loop()
+        canal.iniciar()
+        self._cancelar = assinaturas.assinar(
+            None, lambda evento: self._loop.call_soon_threadsafe(self._distribuir, evento))
+        self._ping = asyncio.create_task(self._pingar())
+        return await asyncio.start_server(self._atender, host, porta, backlog=4096)
+
+    # Fecha todas as conexões e espera as tarefas terminarem
+    async def parar(self):
+        if self._cancelar:
+            self._cancelar()
+        for escritores in list(self.conexoes.values()):
+            for escritor in list(escritores):
+                escritor.close()
+        if self._ping:
+            self._ping.cancel()
+        await asyncio.gather(self._ping, *self._tarefas, return_exceptions=True)
+
+    def __len__(self):
+        return sum(len(escritores) for escritores in self.conexoes.values())
+
+
+def _aumentar_limite_arquivos(quantidade):
+    try:
+        import resource
+    except ImportError:
+        return
+    atual, maximo = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if atual < quantidade:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(quantidade, maximo), maximo))
+
+
+# Benchmark: muitas conexões paradas num servidor asyncio local, e o tempo até todas receberem um evento
+async def _medir_fanout(conexoes, eventos, saida):
+    servidor = ServidorEventos()
+    tcp = await servidor.iniciar('127.0.0.1', 0)
+    porta = tcp.sockets[0].getsockname()[1]
+    try:
+        clientes = []
+        antes = time.perf_counter()
+        for inicio in range(0, conexoes, 500):
+            lote = [asyncio.open_connection('127.0.0.1', porta) for _ in range(inicio, min(inicio + 500, conexoes))]
+            clientes.extend(await asyncio.gather(*lote))
+        for leitor, escritor in clientes:
+            escritor.write(b"GET /api/v1/sessoes/1/eventos HTTP/1.1\r\nHost: teste\r\n\r\n")
+        await asyncio.gather(*(leitor.readuntil(INICIO_STREAM) for leitor, _ in clientes))
+        saida(f"{len(servidor)} conexões abertas em {time.perf_counter() - antes:.2f}s, numa única thread")
+
+        tempos = []
+        for numero in range(eventos):
+            antes = time.perf_counter()
+            await asyncio.to_thread(publicar_assentos, 1, [{'assento': f'A{numero + 1}', 'estado': 'vendido'}])
+            await asyncio.gather(*(leitor.readuntil(b"\n\n") for leitor, _ in clientes))
+            tempos.append(time.perf_counter() - antes)
+        tempos.sort()
+        saida(f"Evento entregue a todas as conexões: mediana {tempos[len(tempos) // 2] * 1000:.1f} ms, "
+              f"pior {tempos[-1] * 1000:.1f} ms ({eventos} eventos)")
+
+        for _, escritor in clientes:
+            escritor.close()
+    finally:
+        tcp.close()
+        await servidor.parar()
+        await tcp.wait_closed()
+
+
+def registrar_comandos(app):
+    @app.cli.command('servir-eventos')
+    @click.option('--host', default='0.0.0.0', show_default=True)
+    @click.option('--porta', default=8001, show_default=True)
+    def servir_eventos_comando(host, porta):
+        """Serve os streams de assentos (SSE) em asyncio, para muitas conexões ao mesmo tempo."""
+        if isinstance(canal, CanalMemoria):
+            click.echo("Aviso: sem EVENTOS_DIR/CINEMA_EVENTOS_DIR este processo não recebe os eventos dos workers web.")
+        _aumentar_limite_arquivos(65536)
+
+        async def servir():
+            servidor = ServidorEventos()
+            tcp = await servidor.iniciar(host, porta)
+            click.echo(f"Streams de assentos em http://{host}:{porta}/api/v1/sessoes/<id>/eventos")
+            async with tcp:
+                await tcp.serve_forever()
+        try:
+            asyncio.run(servir())
+        except KeyboardInterrupt:
+            pass
+
+    @app.cli.command('benchmark-eventos')
+    @click.option('--conexoes', default=2000, show_default=True)
+    @click.option('--eventos', default=20, show_default=True)
+    def benchmark_eventos_comando(conexoes, eventos):
+        """Mede a entrega de eventos de assentos a muitas conexões SSE paradas."""
+        _aumentar_limite_arquivos(2 * conexoes + 100)
+        asyncio.run(_medir_fanout(conexoes, eventos, click.echo))
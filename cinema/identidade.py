@@ -0,0 +1,129 @@
+import threading
+import time
+from collections import OrderedDict
+from flask import session
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import attributes, object_session
+from . import db
+from .cache import cache_catalogo
+from .models import Usuario
+from .sessoes_web import regenerar_sessao
+
+# Quantidade de usuários mantidos em memória e por quanto tempo (segundos)
+MAX_USUARIOS = 10000
+TTL_USUARIO = 300
+# Grupo publicado no backend de invalidação do cache (compartilhado entre os workers, ver configurar_cache)
+# quando a versão de algum usuário muda: cada processo descarta os usuários guardados antes disso
+GRUPO_USUARIOS = 'usuarios'
+
+
+# Dados do usuário logado que não mudam a cada requisição; é o objeto usado como current_user.
+# Não guarda o hash da senha: as confirmações de senha buscam só essa coluna (ver cinema/senhas.py).
+class UsuarioSessao(UserMixin):
+    def __init__(self, id, nome, email, data_nascimento, is_admin, versao):
+        self.id = id
+        self.nome = nome
+        self.email = email
+        self.data_nascimento = data_nascimento
+        self.is_admin = is_admin
+        self.versao = versao
+
+    def __repr__(self):
+        return f"UsuarioSessao({self.id}, '{self.email}', versao={self.versao})"
+
+
+_usuarios = OrderedDict()  # id -> (expira_em, geração do grupo, UsuarioSessao)
+_lock = threading.Lock()
+
+
+def _geracao():
+    return cache_catalogo.backend.versao(GRUPO_USUARIOS)
+
+
+def _guardar(usuario, geracao):
+    with _lock:
+        _usuarios[usuario.id] = (time.monotonic() + TTL_USUARIO, geracao, usuario)
+        _usuarios.move_to_end(usuario.id)
+        while len(_usuarios) > MAX_USUARIOS:
+            _usuarios.popitem(last=False)
+
+
+def esquecer_usuario(usuario_id):
+    with _lock:
+        _usuarios.pop(usuario_id, None)
+
+
+def _buscar_no_banco(usuario_id, geracao):
+    linha = db.session.execute(
+        db.select(Usuario.id, Usuario.nome, Usuario.email, Usuario.data_nascimento, Usuario.is_admin, Usuario.versao)
+        .where(Usuario.id == usuario_id)).first()
+    if linha is None:
+        return None
+    usuario = UsuarioSessao(*linha)
+    _guardar(usuario, geracao)
+    return usuario
+
+
+# Usado pelo user_loader do Flask-Login. Sem consulta ao banco quando o usuário está em memória e
+# nenhuma versão mudou desde que ele foi guardado: a troca de senha ou e-mail em qualquer worker publica
+# GRUPO_USUARIOS, e a comparação com a versão guardada na sessão derruba as sessões antigas.
+def carregar_usuario(usuario_id):
+    versao_sessao = session.get('usuario_versao')
+    if versao_sessao is None:
+        return None  # Sessão sem a versão não pode ser conferida: é preciso entrar de novo
+
+    geracao = _geracao()  # Lida antes da consulta: uma mudança durante ela não fica escondida
+    with _lock:
+        item = _usuarios.get(usuario_id)
+    if item is not None and item[0] > time.monotonic() and item[1] == geracao:
+        usuario = item[2]
+    else:
+        usuario = _buscar_no_banco(usuario_id, geracao)
+    if usuario is None or usuario.versao != versao_sessao:
+        return None  # Usuário apagado, ou a senha ou o e-mail mudaram depois deste login
+    return usuario
+
+
+# Grava na sessão os dados que as rotas e o cache precisam após o login
+def registrar_login(usuario):
+    regenerar_sessao()  # Sessão nova a cada login: um id obtido antes dele não vale depois
+    session['usuario_id'] = usuario.id
+    session['is_admin'] = bool(usuario.is_admin)
+    session['usuario_versao'] = usuario.versao
+    _guardar(UsuarioSessao(usuario.id, usuario.nome, usuario.email, usuario.data_nascimento,
+                           usuario.is_admin, usuario.versao), _geracao())
+
+
+def registrar_logout():
+    for chave in ('usuario_id', 'is_admin', 'usuario_versao', 'carrinho_id', 'reautenticacao'):
+        session.pop(chave, None)
+
+
+# Troca de senha ou e-mail incrementa a versão do usuário, invalidando as outras sessões dele
+@event.listens_for(Usuario, 'before_update')
+def _incrementar_versao(mapper, connection, alvo):
+    if attributes.get_history(alvo, 'senha').has_changes() or attributes.get_history(alvo, 'email').has_changes():
+        alvo.versao = (alvo.versao or 0) + 1
+
+
+# Depois do commit, remove da memória os usuários alterados ou apagados e avisa os outros workers pelo
+# backend de invalidação (nome, e-mail, admin e versão ficam em cache; alterações de usuário são raras)
+@event.listens_for(Usuario, 'after_update')
+@event.listens_for(Usuario, 'after_delete')
+def _anotar_usuario(mapper, connection, alvo):
+    object_session(alvo).info.setdefault('usuarios_alterados', set()).add(alvo.id)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _esquecer_alterados(sessao_db):
+    alterados = sessao_db.info.pop('usuarios_alterados', ())
+    if alterados:
+        cache_catalogo.backend.publicar(GRUPO_USUARIOS)
+    for usuario_id in alterados:
+        esquecer_usuario(usuario_id)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _descartar_alterados(sessao_db, transacao_anterior):
+    sessao_db.info.pop('usuarios_alterados', None)
@@ -0,0 +1,121 @@
+import hashlib
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+from flask import current_app, url_for
+from markupsafe import Markup, escape
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Sem o Pillow, as fotos são guardadas sem as versões redimensionadas
+    Image = None
+
+from .cache import cache_catalogo
+
+logger = logging.getLogger(__name__)
+
+# Pasta dos pôsteres enviados, relativa à pasta static
+PASTA_UPLOADS = 'img/uploads'
+
+# Larguras geradas para cada pôster: miniatura para os cards e versão de detalhe
+LARGURAS = {'miniatura': 320, 'detalhe': 800}
+QUALIDADE_JPEG = 82
+
+# Poucas threads: o redimensionamento usa CPU e não deve competir com as requisições
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='imagens')
+
+
+def _pasta(app):
+    return os.path.join(app.static_folder, *PASTA_UPLOADS.split('/'))
+
+
+_VARIANTE = re.compile(r'-\d+w\.jpg$')
+
+
+def _nome_variante(foto, largura):
+    base = os.path.splitext(foto)[0]
+    return f'{base}-{largura}w.jpg'
+
+
+# Salva o arquivo enviado com um nome baseado no conteúdo (o mesmo pôster não é gravado duas vezes)
+# e agenda a geração das versões redimensionadas fora da thread da requisição.
+def salvar_poster(app, arquivo):
+    conteudo = arquivo.read()
+    extensao = os.path.splitext(arquivo.filename or '')[1].lower() or '.jpg'
+    nome = hashlib.sha256(conteudo).hexdigest()[:20] + extensao
+
+    pasta = _pasta(app)
+    os.makedirs(pasta, exist_ok=True)
+    caminho = os.path.join(pasta, nome)
+    if not os.path.exists(caminho):
+        with open(caminho, 'wb') as destino:
+            destino.write(conteudo)
+
+    if Image is not None:
+        _executor.submit(gerar_variantes, pasta, nome)
+    return nome
+
+
+# Gera as versões redimensionadas e re-codificadas de um pôster já salvo
+def gerar_variantes(pasta, foto):
+    try:
+        with Image.open(os.path.join(pasta, foto)) as original:
+            original = ImageOps.exif_transpose(original).convert('RGB')
+            for largura in LARGURAS.values():
+                destino = os.path.join(pasta, _nome_variante(foto, largura))
+                if os.path.exists(destino):
+                    continue
+                imagem = original
+                if original.width > largura:
+                    altura = round(original.height * largura / original.width)
+                    imagem = original.resize((largura, altura), Image.LANCZOS)
+                temporario = destino + '.tmp'
+                imagem.save(temporario, 'JPEG', quality=QUALIDADE_JPEG, optimize=True, progressive=True)
+                os.replace(temporario, destino)
+    except Exception:
+        logger.exception("Erro ao gerar as versões do pôster %s", foto)
+        return
+
+    # As páginas de filmes em cache passam a usar as novas versões
+    cache_catalogo.invalidar('filmes')
+
+
+# Atributos src/srcset/sizes do <img> de um pôster, usando só as versões que já existem
+def imagem_poster(foto, tamanho='miniatura', sizes=None):
+    if not foto:
+        return Markup('')
+
+    pasta = _pasta(current_app)
+    largura_padrao = LARGURAS[tamanho]
+    candidatos = []
+    for largura in sorted(LARGURAS.values()):
+        nome = _nome_variante(foto, largura)
+        if os.path.exists(os.path.join(pasta, nome)):
+            candidatos.append((largura, url_for('static', filename=f'{PASTA_UPLOADS}/{nome}')))
+
+    original = url_for('static', filename=f'{PASTA_UPLOADS}/{foto}')
+    if not candidatos:
+        return Markup('src="{}"').format(original)
+
+    src = next((url for largura, url in candidatos if largura >= largura_padrao), candidatos[-1][1])
+    srcset = ', '.join(f'{escape(url)} {largura}w' for largura, url in candidatos)
+    return Markup('src="{}" srcset="{}" sizes="{}"').format(src, Markup(srcset), sizes or f'{largura_padrao}px')
+
+
+def registrar_comandos(app):
+    app.jinja_env.globals['imagem_poster'] = imagem_poster
+
+    @app.cli.command('gerar-miniaturas')
+    def gerar_miniaturas_comando():
+        """Gera as versões redimensionadas dos pôsteres que ainda não têm."""
+        if Image is None:
+            raise click.ClickException("Instale o Pillow para gerar as miniaturas.")
+        pasta = _pasta(app)
+        for foto in sorted(os.listdir(pasta)):
+            if _VARIANTE.search(foto) or foto.endswith('.tmp'):
+                continue
+            gerar_variantes(pasta, foto)
+            click.echo(f"Versões geradas para {foto}")
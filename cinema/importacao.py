@@ -0,0 +1,214 @@
+import csv
+import json
+import sys
+from datetime import date, datetime
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer, insert, select
+from sqlalchemy.exc import IntegrityError
+from . import db
+from .agenda import verificador_importacao
+from .busca import TIPO_POR_MODELO, reindexar
+from .cache import GRUPOS_POR_MODELO, cache_catalogo
+from .models import Alimento, Cinema, Filme, Sala, Sessao
+
+# Modelos aceitos pelos comandos e as chaves estrangeiras que precisam ser validadas
+MODELOS = {
+    'cinemas': (Cinema, {}),
+    'salas': (Sala, {'cinema_id': Cinema}),
+    'filmes': (Filme, {}),
+    'sessoes': (Sessao, {'filme_id': Filme, 'sala_id': Sala}),
+    'alimentos': (Alimento, {}),
+}
+
+TAMANHO_LOTE = 1000
+
+catalogo_cli = AppGroup('catalogo', help='Importação e exportação em massa do catálogo.')
+
+
+class LinhaInvalida(ValueError):
+    pass
+
+
+def _converter(coluna, valor):
+    if valor is None or valor == '':
+        return None
+    tipo = coluna.type
+    if isinstance(tipo, Boolean):
+        return valor if isinstance(valor, bool) else str(valor).strip().lower() in ('1', 'true', 'sim')
+    if isinstance(tipo, Integer):
+        return int(valor)
+    if isinstance(tipo, Float):
+        return float(valor)
+    if isinstance(tipo, DateTime):
+        return datetime.fromisoformat(str(valor).replace('T', ' '))
+    if isinstance(tipo, Date):
+        return date.fromisoformat(str(valor)[:10])
+    return str(valor)
+
+
+# Converte uma linha lida do arquivo para os tipos das colunas, ignorando colunas desconhecidas
+def _preparar(tabela, linha, ids_validos):
+    registro = {}
+    for coluna in tabela.columns:
+        if coluna.key not in linha:
+            continue
+        try:
+            registro[coluna.key] = _converter(coluna, linha[coluna.key])
+        except (TypeError, ValueError):
+            raise LinhaInvalida(f"valor inválido para '{coluna.key}': {linha[coluna.key]!r}")
+
+    for coluna in tabela.columns:
+        if not coluna.nullable and not coluna.primary_key and coluna.default is None \
+                and coluna.server_default is None and registro.get(coluna.key) is None:
+            raise LinhaInvalida(f"coluna obrigatória '{coluna.key}' vazia")
+
+    for campo, ids in ids_validos.items():
+        if registro.get(campo) not in ids:
+            raise LinhaInvalida(f"{campo}={registro.get(campo)} não existe")
+    return registro
+
+
+def _ler_linhas(arquivo, formato):
+    if formato == 'csv':
+        yield from csv.DictReader(arquivo)
+    else:
+        for texto in arquivo:
+            if texto.strip():
+                yield json.loads(texto)
+
+
+def _formato(caminho, formato):
+    if formato:
+        return formato
+    return 'jsonl' if caminho.endswith(('.jsonl', '.json')) else 'csv'
+
+
+# Importa linhas em lotes: um INSERT em massa e um commit por lote.
+# As chaves estrangeiras são conferidas contra conjuntos de IDs carregados uma única vez.
+def importar(modelo, linhas, tamanho_lote=TAMANHO_LOTE, progresso=None):
+    classe, estrangeiras = MODELOS[modelo]
+    tabela = classe.__table__
+    ids_validos = {campo: set(db.session.execute(select(referencia.id)).scalars())
+                   for campo, referencia in estrangeiras.items()}
+
+    # Sessões também precisam caber na agenda da sala (sem sobrepor as existentes nem as do próprio arquivo)
+    verificar_agenda = verificador_importacao() if classe is Sessao else None
+
+    importadas, erros, lote = 0, [], []
+
+    def gravar():
+        nonlocal importadas, lote
+        if not lote:
+            return
+        # Linhas de JSON Lines podem trazer colunas diferentes: um executemany para cada conjunto de colunas
+        grupos = {}
+        for registro in lote:
+            grupos.setdefault(tuple(registro), []).append(registro)
+        try:
+            for registros in grupos.values():
+                db.session.execute(insert(tabela), registros)
+            db.session.commit()
+            importadas += len(lote)
+            if verificar_agenda:
+                verificar_agenda.confirmar()
+        except IntegrityError as erro:
+            db.session.rollback()
+            if verificar_agenda:
+                verificar_agenda.descartar()  # As sessões do lote não existem: saem da agenda
+            erros.append((numero, f"lote de {len(lote)} linhas rejeitado: {erro.orig}"))
+        lote = []
+        if progresso:
+            progresso(importadas, len(erros))
+
+    numero = 0
+    for numero, linha in enumerate(linhas, start=1):
+        try:
+            registro = _preparar(tabela, linha, ids_validos)
+            conflito = verificar_agenda(registro, numero) if verificar_agenda else None
+            if conflito:
+                raise LinhaInvalida(conflito)
+            lote.append(registro)
+        except LinhaInvalida as erro:
+            erros.append((numero, str(erro)))
+            continue
+        if len(lote) >= tamanho_lote:
+            gravar()
+    gravar()
+
+    # Os INSERTs em massa não passam pelos eventos do ORM: invalida o cache do catálogo e refaz a busca aqui
+    cache_catalogo.invalidar(*GRUPOS_POR_MODELO.get(classe.__name__, ()))
+    if classe in TIPO_POR_MODELO:
+        reindexar(TIPO_POR_MODELO[classe])
+    return importadas, erros
+
+
+def _serializar(valor):
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    return valor
+
+
+# Exporta a tabela lendo com cursor no servidor (stream_results), sem carregar tudo na memória
+def exportar(modelo, saida, formato, tamanho_lote=TAMANHO_LOTE):
+    tabela = MODELOS[modelo][0].__table__
+    nomes = [coluna.key for coluna in tabela.columns]
+    consulta = select(tabela).order_by(tabela.c.id).execution_options(stream_results=True, yield_per=tamanho_lote)
+
+    escritor = None
+    if formato == 'csv':
+        escritor = csv.writer(saida)
+        escritor.writerow(nomes)
+
+    total = 0
+    with db.engine.connect() as conexao:
+        for parte in conexao.execute(consulta).partitions(tamanho_lote):
+            for linha in parte:
+                if escritor:
+                    escritor.writerow([_serializar(v) if v is not None else '' for v in linha])
+                else:
+                    saida.write(json.dumps({n: _serializar(v) for n, v in zip(nomes, linha)}, ensure_ascii=False))
+                    saida.write('\n')
+            total += len(parte)
+    return total
+
+
+@catalogo_cli.command('importar')
+@click.argument('modelo', type=click.Choice(sorted(MODELOS)))
+@click.argument('caminho', type=click.Path(exists=True, dir_okay=False))
+@click.option('--formato', type=click.Choice(['csv', 'jsonl']), help='Padrão: pela extensão do arquivo.')
+@click.option('--lote', default=TAMANHO_LOTE, show_default=True, help='Linhas por transação.')
+def importar_comando(modelo, caminho, formato, lote):
+    """Importa um arquivo CSV ou JSON Lines para o MODELO."""
+    def progresso(importadas, erros):
+        click.echo(f"\r{importadas} linhas importadas, {erros} rejeitadas", nl=False, err=True)
+
+    with open(caminho, newline='', encoding='utf-8') as arquivo:
+        importadas, erros = importar(modelo, _ler_linhas(arquivo, _formato(caminho, formato)), lote, progresso)
+
+    click.echo(err=True)
+    for numero, mensagem in erros[:20]:
+        click.echo(f"Linha {numero}: {mensagem}", err=True)
+    if len(erros) > 20:
+        click.echo(f"... e mais {len(erros) - 20} linhas rejeitadas", err=True)
+    click.echo(f"{importadas} linhas importadas em {modelo}, {len(erros)} rejeitadas.")
+
+
+@catalogo_cli.command('exportar')
+@click.argument('modelo', type=click.Choice(sorted(MODELOS)))
+@click.argument('caminho', required=False)
+@click.option('--formato', type=click.Choice(['csv', 'jsonl']), help='Padrão: pela extensão do arquivo (csv na saída padrão).')
+def exportar_comando(modelo, caminho, formato):
+    """Exporta o MODELO para CSV ou JSON Lines (arquivo ou saída padrão)."""
+    formato = _formato(caminho or '', formato)
+    if caminho:
+        with open(caminho, 'w', newline='', encoding='utf-8') as saida:
+            total = exportar(modelo, saida, formato)
+    else:
+        total = exportar(modelo, sys.stdout, formato)
+    click.echo(f"{total} linhas exportadas de {modelo}.", err=True)
+
+
+def registrar_comandos(app):
+    app.cli.add_command(catalogo_cli)
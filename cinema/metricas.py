@@ -0,0 +1,259 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter, deque
+
+from flask import before_render_template, g, has_request_context, request, session, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from cinema.config import _env_bool, _env_int
+
+logger = logging.getLogger(__name__)
+
+# Limites (em segundos) dos baldes do histograma de tempo por endpoint
+BALDES = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+JANELA = 1024  # requisições recentes por endpoint usadas nos quantis
+LENTO_MS = 500  # acima disso a requisição vai para o log de lentas, com a lista de consultas
+LIMIAR_REPETIDAS = 5  # a mesma consulta (com parâmetros diferentes) tantas vezes numa requisição indica N+1
+MAX_CONSULTAS_LOG = 20
+
+_ESPACOS = re.compile(r'\s+')
+
+
+def _normalizar(sql):
+    return _ESPACOS.sub(' ', sql).strip()
+
+
+# Medições de uma requisição; fica em g enquanto ela é atendida
+class _Perfil:
+    __slots__ = ('inicio', 'consultas', 'template', 'renderizando')
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.consultas = []  # (sql, parâmetros, segundos)
+        self.template = 0.0
+        self.renderizando = []  # inícios das renderizações em andamento (fragmentos ficam dentro da página)
+
+    def tempo_banco(self):
+        return sum(c[2] for c in self.consultas)
+
+    # Consultas idênticas (mesmo SQL e mesmos parâmetros) repetidas na mesma requisição
+    def duplicadas(self):
+        vistas = Counter((sql, repr(parametros)) for sql, parametros, _ in self.consultas)
+        return sum(n - 1 for n in vistas.values())
+
+    # Mesmo SQL executado muitas vezes com parâmetros diferentes: o padrão do N+1
+    def repetidas(self, limiar):
+        contagem = Counter(sql for sql, _, _ in self.consultas)
+        return {sql: n for sql, n in contagem.items() if n >= limiar}
+
+
+# Acumulado de um endpoint: histograma desde o início do processo e janela das requisições recentes
+class _Serie:
+    __slots__ = ('baldes', 'total', 'soma', 'consultas', 'banco', 'template', 'duplicadas',
+                 'repetidas', 'status', 'recentes')
+
+    def __init__(self, quantidade_baldes, janela):
+        self.baldes = [0] * quantidade_baldes
+        self.total = 0
+        self.soma = 0.0
+        self.consultas = 0
+        self.banco = 0.0
+        self.template = 0.0
+        self.duplicadas = 0
+        self.repetidas = 0
+        self.status = Counter()
+        self.recentes = deque(maxlen=janela)
+
+
+class RegistroMetricas:
+    def __init__(self, baldes=BALDES, janela=JANELA):
+        self.limites = tuple(baldes)
+        self.janela = janela
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, endpoint, status, duracao, consultas, banco, template, duplicadas, repetidas):
+        with self._lock:
+            serie = self._series.get(endpoint)
+            if serie is None:
+                serie = self._series[endpoint] = _Serie(len(self.limites), self.janela)
+            for i, limite in enumerate(self.limites):
+                if duracao <= limite:
+                    serie.baldes[i] += 1
+                    break
+            serie.total += 1
+            serie.soma += duracao
+            serie.consultas += consultas
+            serie.banco += banco
+            serie.template += template
+            serie.duplicadas += duplicadas
+            serie.repetidas += repetidas
+            serie.status[status] += 1
+            serie.recentes.append(duracao)
+
+    # Texto no formato de exposição do Prometheus (versão 0.0.4)
+    def exportar(self):
+        with self._lock:
+            series = {endpoint: (list(s.baldes), s.total, s.soma, s.consultas, s.banco, s.template,
+                                 s.duplicadas, s.repetidas, dict(s.status), sorted(s.recentes))
+                      for endpoint, s in sorted(self._series.items())}
+
+        linhas = ['# HELP cinema_requisicao_segundos Tempo total das requisições por endpoint.',
+                  '# TYPE cinema_requisicao_segundos histogram']
+        for endpoint, (baldes, total, soma, *_) in series.items():
+            acumulado = 0
+            for limite, quantidade in zip(self.limites, baldes):
+                acumulado += quantidade
+                linhas.append(f'cinema_requisicao_segundos_bucket{{endpoint="{endpoint}",le="{limite}"}} {acumulado}')
+            linhas.append(f'cinema_requisicao_segundos_bucket{{endpoint="{endpoint}",le="+Inf"}} {total}')
+            linhas.append(f'cinema_requisicao_segundos_sum{{endpoint="{endpoint}"}} {soma:.6f}')
+            linhas.append(f'cinema_requisicao_segundos_count{{endpoint="{endpoint}"}} {total}')
+
+        linhas += ['# HELP cinema_requisicao_recente_segundos Quantis das últimas requisições de cada endpoint.',
+                   '# TYPE cinema_requisicao_recente_segundos gauge']
+        for endpoint, valores in series.items():
+            recentes = valores[9]
+            for q in (0.5, 0.95, 0.99):
+                valor = recentes[min(len(recentes) - 1, int(q * len(recentes)))]
+                linhas.append(f'cinema_requisicao_recente_segundos{{endpoint="{endpoint}",quantile="{q}"}} {valor:.6f}')
+
+        linhas += ['# HELP cinema_requisicoes_total Requisições atendidas por endpoint e status.',
+                   '# TYPE cinema_requisicoes_total counter']
+        for endpoint, valores in series.items():
+            for status, quantidade in sorted(valores[8].items()):
+                linhas.append(f'cinema_requisicoes_total{{endpoint="{endpoint}",status="{status}"}} {quantidade}')
+
+        contadores = (
+            ('cinema_sql_consultas_total', 'counter', 'Consultas SQL executadas.', 3, '{}'),
+            ('cinema_sql_segundos_total', 'counter', 'Tempo gasto em consultas SQL.', 4, '{:.6f}'),
+            ('cinema_template_segundos_total', 'counter', 'Tempo gasto renderizando templates.', 5, '{:.6f}'),
+            ('cinema_sql_duplicadas_total', 'counter', 'Consultas idênticas repetidas na mesma requisição.', 6, '{}'),
+            ('cinema_sql_n_mais_um_total', 'counter', 'Requisições com consultas repetidas em excesso (N+1).', 7, '{}'),
+        )
+        for nome, tipo, ajuda, indice, formato in contadores:
+            linhas += [f'# HELP {nome} {ajuda}', f'# TYPE {nome} {tipo}']
+            for endpoint, valores in series.items():
+                linhas.append(f'{nome}{{endpoint="{endpoint}"}} ' + formato.format(valores[indice]))
+        return '\n'.join(linhas) + '\n'
+
+
+# Os eventos do engine são globais; só ficam ligados quando algum app ativa as métricas
+_ouvindo = {'engine': False}
+
+
+def _perfil_atual():
+    if not has_request_context():
+        return None
+    return g.get('_perfil')
+
+
+def _ouvir_engine():
+    if _ouvindo['engine']:
+        return
+    _ouvindo['engine'] = True
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        if _perfil_atual() is not None:
+            conn.info.setdefault('_perfil_inicios', []).append(time.perf_counter())
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def _depois(conn, cursor, statement, parameters, context, executemany):
+        perfil = _perfil_atual()
+        inicios = conn.info.get('_perfil_inicios')
+        if perfil is None or not inicios:
+            return
+        perfil.consultas.append((_normalizar(statement), parameters, time.perf_counter() - inicios.pop()))
+
+
+def _resumir(sql):
+    return sql if len(sql) <= 300 else sql[:297] + '...'
+
+
+def _registrar_lenta(perfil, duracao, repetidas, lenta):
+    titulo = 'Requisição lenta' if lenta else 'Consultas repetidas'
+    linhas = [f"{titulo}: {request.method} {request.full_path.rstrip('?')} ({request.endpoint}) "
+              f"{duracao * 1000:.1f} ms, {len(perfil.consultas)} consultas em {perfil.tempo_banco() * 1000:.1f} ms, "
+              f"templates {perfil.template * 1000:.1f} ms"]
+    for sql, n in repetidas.items():
+        linhas.append(f"  N+1: {n}x {_resumir(sql)}")
+    for sql, parametros, segundos in sorted(perfil.consultas, key=lambda c: -c[2])[:MAX_CONSULTAS_LOG]:
+        linhas.append(f"  {segundos * 1000:8.2f} ms  {_resumir(sql)}  {parametros!r:.120}")
+    if len(perfil.consultas) > MAX_CONSULTAS_LOG:
+        linhas.append(f"  ... mais {len(perfil.consultas) - MAX_CONSULTAS_LOG} consultas")
+    logger.warning('\n'.join(linhas))
+
+
+def _acesso_permitido(app):
+    if request.remote_addr in app.config['METRICAS_IPS']:
+        return True
+    return bool(session.get('is_admin'))  # Administradores logados também podem ver
+
+
+# Liga a instrumentação (CINEMA_METRICAS=1 ou METRICAS=True na configuração):
+# Server-Timing em cada resposta, /metrics no formato do Prometheus e log das requisições lentas
+def configurar_metricas(app):
+    app.config.setdefault('METRICAS', _env_bool('CINEMA_METRICAS', False))
+    if not app.config['METRICAS']:
+        return None
+    app.config.setdefault('METRICAS_LENTO_MS', _env_int('CINEMA_METRICAS_LENTO_MS', LENTO_MS))
+    app.config.setdefault('METRICAS_REPETIDAS', _env_int('CINEMA_METRICAS_REPETIDAS', LIMIAR_REPETIDAS))
+    app.config.setdefault('METRICAS_IPS', ('127.0.0.1', '::1'))
+
+    registro = RegistroMetricas()
+    app.extensions['metricas'] = registro
+    _ouvir_engine()
+
+    @app.before_request
+    def _iniciar_perfil():
+        g._perfil = _Perfil()
+
+    @before_render_template.connect_via(app)
+    def _antes_do_template(sender, template, context, **extra):
+        perfil = _perfil_atual()
+        if perfil is not None:
+            perfil.renderizando.append(time.perf_counter())
+
+    @template_rendered.connect_via(app)
+    def _depois_do_template(sender, template, context, **extra):
+        perfil = _perfil_atual()
+        if perfil is None or not perfil.renderizando:
+            return
+        inicio = perfil.renderizando.pop()
+        if not perfil.renderizando:  # Só a renderização de fora conta; os fragmentos já estão dentro dela
+            perfil.template += time.perf_counter() - inicio
+
+    @app.after_request
+    def _finalizar_perfil(resposta):
+        perfil = g.pop('_perfil', None)
+        if perfil is None:
+            return resposta
+        duracao = time.perf_counter() - perfil.inicio
+        banco = perfil.tempo_banco()
+        duplicadas = perfil.duplicadas()
+        repetidas = perfil.repetidas(app.config['METRICAS_REPETIDAS'])
+
+        resposta.headers.add('Server-Timing', ', '.join((
+            f'db;dur={banco * 1000:.2f};desc="{len(perfil.consultas)} consultas, {duplicadas} duplicadas"',
+            f'tpl;dur={perfil.template * 1000:.2f}',
+            f'total;dur={duracao * 1000:.2f}',
+        )))
+
+        endpoint = request.endpoint or 'sem_rota'
+        registro.registrar(endpoint, resposta.status_code, duracao, len(perfil.consultas), banco,
+                           perfil.template, duplicadas, 1 if repetidas else 0)
+        lenta = duracao * 1000 >= app.config['METRICAS_LENTO_MS']
+        if lenta or repetidas:
+            _registrar_lenta(perfil, duracao, repetidas, lenta)
+        return resposta
+
+    def metricas():
+        if not _acesso_permitido(app):
+            return app.response_class('Acesso negado\n', status=403, mimetype='text/plain')
+        return app.response_class(registro.exportar(), mimetype='text/plain; version=0.0.4')
+
+    app.add_url_rule('/metrics', 'metricas', metricas)
+    return registro
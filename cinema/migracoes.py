@@ -0,0 +1,329 @@
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy import Index, create_engine, inspect, text
+from . import db
+
+# Lista ordenada de migrações: (versão, descrição, função que recebe a conexão)
+MIGRACOES = []
+
+
+def migracao(versao, descricao):
+    def registrar(funcao):
+        MIGRACOES.append((versao, descricao, funcao))
+        MIGRACOES.sort(key=lambda m: m[0])
+        return funcao
+    return registrar
+
+
+# Cria no banco os índices declarados nos modelos que ainda não existem.
+# As UniqueConstraint viram índices únicos, que podem ser criados em tabelas já existentes.
+def sincronizar_indices(conexao, metadata=None):
+    metadata = metadata or db.metadata
+    inspetor = inspect(conexao)
+    criados = []
+
+    for tabela in metadata.sorted_tables:
+        if not inspetor.has_table(tabela.name):
+            continue
+        existentes = {i['name'] for i in inspetor.get_indexes(tabela.name)}
+        existentes |= {u['name'] for u in inspetor.get_unique_constraints(tabela.name)}
+        colunas = {c['name'] for c in inspetor.get_columns(tabela.name)}
+
+        indices = list(tabela.indexes)
+        for restricao in tabela.constraints:
+            if isinstance(restricao, db.UniqueConstraint) and restricao.name and len(restricao.columns) > 1:
+                indice = Index(restricao.name, *restricao.columns, unique=True, _table=tabela)
+                tabela.indexes.discard(indice)  # Só para criar no banco: não pode ficar no metadata do app
+                indices.append(indice)
+
+        for indice in indices:
+            # Índices de colunas que uma migração posterior ainda vai adicionar ficam para ela
+            if indice.name not in existentes and all(c.name in colunas for c in indice.columns):
+                indice.create(conexao)
+                criados.append(indice.name)
+    return criados
+
+
+@migracao(1, 'Cria as tabelas que ainda não existem')
+def _criar_tabelas(conexao):
+    db.metadata.create_all(conexao)
+
+
+@migracao(2, 'Remove carrinhos e assentos duplicados antes dos índices únicos')
+def _remover_duplicados(conexao):
+    # Junta os carrinhos de cada usuário no mais antigo, que é o que as rotas liam
+    duplicados = conexao.execute(text(
+        "SELECT usuario_id, MIN(id) FROM carrinho GROUP BY usuario_id HAVING COUNT(*) > 1")).fetchall()
+    for usuario_id, manter in duplicados:
+        parametros = {'usuario_id': usuario_id, 'manter': manter}
+        for tabela in ('compra_sessao', 'compra_alimento'):
+            conexao.execute(text(
+                f"UPDATE {tabela} SET carrinho_id = :manter WHERE carrinho_id IN "
+                "(SELECT id FROM (SELECT id FROM carrinho WHERE usuario_id = :usuario_id AND id <> :manter) AS t)"),
+                parametros)
+        conexao.execute(text("DELETE FROM carrinho WHERE usuario_id = :usuario_id AND id <> :manter"), parametros)
+
+    conexao.execute(text(
+        "UPDATE carrinho SET total = "
+        "COALESCE((SELECT SUM(subtotal) FROM compra_sessao WHERE compra_sessao.carrinho_id = carrinho.id), 0) + "
+        "COALESCE((SELECT SUM(subtotal) FROM compra_alimento WHERE compra_alimento.carrinho_id = carrinho.id), 0)"))
+
+    # Mantém a primeira compra de cada assento por sessão
+    conexao.execute(text(
+        "DELETE FROM assento_comprado WHERE id NOT IN "
+        "(SELECT id FROM (SELECT MIN(id) AS id FROM assento_comprado GROUP BY sessao_id, assento) AS t)"))
+
+
+@migracao(3, 'Cria índices de chaves estrangeiras, buscas por nome e sessões por filme/horário')
+def _criar_indices(conexao):
+    sincronizar_indices(conexao)
+
+
+@migracao(4, 'Adiciona a versão das credenciais do usuário')
+def _versao_usuario(conexao):
+    colunas = {coluna['name'] for coluna in inspect(conexao).get_columns('usuario')}
+    if 'versao' not in colunas:
+        conexao.execute(text("ALTER TABLE usuario ADD COLUMN versao INTEGER NOT NULL DEFAULT 1"))
+
+
+@migracao(5, 'Cria pedidos e guarda o assento de cada ingresso do carrinho')
+def _pedidos(conexao):
+    db.metadata.create_all(conexao)  # pedido e item_pedido
+    inspetor = inspect(conexao)
+    if 'assento' not in {coluna['name'] for coluna in inspetor.get_columns('compra_sessao')}:
+        conexao.execute(text("ALTER TABLE compra_sessao ADD COLUMN assento VARCHAR(10)"))
+    if 'pedido_id' not in {coluna['name'] for coluna in inspetor.get_columns('assento_comprado')}:
+        conexao.execute(text("ALTER TABLE assento_comprado ADD COLUMN pedido_id INTEGER REFERENCES pedido (id)"))
+    sincronizar_indices(conexao)
+
+
+@migracao(6, 'Cria o índice por nome usado na listagem de usuários')
+def _indice_nome_usuario(conexao):
+    sincronizar_indices(conexao)
+
+
+@migracao(7, 'Cria os índices FTS5 da busca de filmes e alimentos (só SQLite)')
+def _busca_fts(conexao):
+    from .busca import criar_tabelas_fts
+    criar_tabelas_fts(conexao)
+
+
+@migracao(8, 'Cria os resumos de vendas dos relatórios e os preenche com os pedidos existentes')
+def _resumos_vendas(conexao):
+    from .analises import recalcular
+    db.metadata.create_all(conexao)  # resumo_sessao, resumo_filme_dia, resumo_cinema_dia, resumo_alimento_dia
+    sincronizar_indices(conexao)
+    recalcular(conexao)
+
+
+@migracao(9, 'Cria a tabela das sessões dos usuários guardadas no servidor')
+def _sessoes_web(conexao):
+    db.metadata.create_all(conexao)  # sessao_web
+    sincronizar_indices(conexao)
+
+
+@migracao(10, 'Cria os índices COLLATE NOCASE das buscas por prefixo das listagens (só SQLite)')
+def _indices_prefixo(conexao):
+    from .paginacao import criar_indices_prefixo
+    criar_indices_prefixo(conexao)
+
+
+def _garantir_tabela_versao(conexao):
+    conexao.execute(text(
+        "CREATE TABLE IF NOT EXISTS versao_esquema ("
+        "versao INTEGER NOT NULL PRIMARY KEY, "
+        "descricao VARCHAR(200) NOT NULL, "
+        "aplicada_em DATETIME NOT NULL)"))
+
+
+def versao_atual(conexao):
+    _garantir_tabela_versao(conexao)
+    return conexao.execute(text("SELECT COALESCE(MAX(versao), 0) FROM versao_esquema")).scalar()
+
+
+# Versões registradas aqui que o banco ainda não tem
+def migracoes_pendentes(engine=None):
+    engine = engine or db.engine
+    with engine.begin() as conexao:
+        atual = versao_atual(conexao)
+    return [versao for versao, _, _ in MIGRACOES if versao > atual]
+
+
+# Aplica, em ordem e cada uma em sua própria transação, as migrações ainda não aplicadas
+def aplicar_migracoes(engine=None, saida=print):
+    engine = engine or db.engine
+    with engine.begin() as conexao:
+        atual = versao_atual(conexao)
+
+    aplicadas = []
+    for versao, descricao, funcao in MIGRACOES:
+        if versao <= atual:
+            continue
+        with engine.begin() as conexao:
+            funcao(conexao)
+            conexao.execute(text(
+                "INSERT INTO versao_esquema (versao, descricao, aplicada_em) VALUES (:versao, :descricao, :agora)"),
+                {'versao': versao, 'descricao': descricao, 'agora': datetime.utcnow()})
+        aplicadas.append(versao)
+        if saida:
+            saida(f"Migração {versao} aplicada: {descricao}")
+    return aplicadas
+
+
+# Consultas usadas pelas rotas mais acessadas, para comparar os planos antes e depois dos índices
+CONSULTAS_PLANO = {
+    'atualizar/deletar sessão (filme + horário)':
+        "SELECT sessao.id FROM sessao JOIN filme ON filme.id = sessao.filme_id "
+        "WHERE filme.titulo = :titulo AND sessao.horario = :horario",
+    'sessões do dia':
+        "SELECT id FROM sessao WHERE horario >= :inicio AND horario < :fim",
+    'sessões da sala no dia':
+        "SELECT id FROM sessao WHERE sala_id = :sala_id AND horario >= :inicio AND horario < :fim",
+    'assentos comprados da sessão':
+        "SELECT assento FROM assento_comprado WHERE sessao_id = :sessao_id",
+    'carrinho do usuário':
+        "SELECT id FROM carrinho WHERE usuario_id = :usuario_id",
+    'itens de alimento do carrinho':
+        "SELECT id FROM compra_alimento WHERE carrinho_id = :carrinho_id",
+    'sala pelo número':
+        "SELECT id FROM sala WHERE numero = :numero",
+    'alimento pelo nome':
+        "SELECT id FROM alimento WHERE nome = :nome",
+    'cinema pelo nome':
+        "SELECT id FROM cinema WHERE nome = :nome",
+    'busca de filmes por prefixo (listagem)':
+        "SELECT id FROM filme WHERE titulo LIKE :prefixo ESCAPE '\\'",
+}
+
+
+def _popular_banco_teste(conexao, linhas):
+    aleatorio = random.Random(42)
+    inicio = datetime(2025, 1, 1)
+    filmes = max(linhas // 100, 1)
+    salas = max(linhas // 1000, 1)
+    usuarios = max(linhas // 10, 1)
+
+    def em_lotes(sql, gerador, tamanho=50000):
+        lote = []
+        for linha in gerador:
+            lote.append(linha)
+            if len(lote) >= tamanho:
+                conexao.exec_driver_sql(sql, lote)
+                lote = []
+        if lote:
+            conexao.exec_driver_sql(sql, lote)
+
+    em_lotes("INSERT INTO cinema (id, nome, local, capacidade) VALUES (?, ?, ?, ?)",
+             ((i, f'Cinema {i}', 'Centro', 1000) for i in range(1, 101)))
+    em_lotes("INSERT INTO sala (id, numero, capacidade, cinema_id) VALUES (?, ?, ?, ?)",
+             ((i, str(i), 200, aleatorio.randint(1, 100)) for i in range(1, salas + 1)))
+    em_lotes("INSERT INTO filme (id, titulo, duracao, classificacao) VALUES (?, ?, ?, ?)",
+             ((i, f'Filme {i}', 120, 'L') for i in range(1, filmes + 1)))
+    em_lotes("INSERT INTO alimento (id, nome, preco) VALUES (?, ?, ?)",
+             ((i, f'Alimento {i}', 10.0) for i in range(1, 1001)))
+    em_lotes("INSERT INTO usuario (id, nome, email, senha) VALUES (?, ?, ?, ?)",
+             ((i, f'Usuário {i}', f'u{i}@cinema.com', '-') for i in range(1, usuarios + 1)))
+    em_lotes("INSERT INTO carrinho (id, usuario_id, total) VALUES (?, ?, ?)",
+             ((i, i, 0.0) for i in range(1, usuarios + 1)))
+    em_lotes("INSERT INTO sessao (id, filme_id, sala_id, horario, preco) VALUES (?, ?, ?, ?, ?)",
+             ((i, aleatorio.randint(1, filmes), aleatorio.randint(1, salas),
+               (inicio + timedelta(minutes=15 * i)).isoformat(' '), 25.0) for i in range(1, linhas + 1)))
+    em_lotes("INSERT INTO assento_comprado (id, sessao_id, assento) VALUES (?, ?, ?)",
+             ((i, aleatorio.randint(1, linhas), f'A{i}') for i in range(1, linhas + 1)))
+    em_lotes("INSERT INTO compra_alimento (id, carrinho_id, alimento_id, quantidade, preco_unitario, subtotal) "
+             "VALUES (?, ?, ?, ?, ?, ?)",
+             ((i, aleatorio.randint(1, usuarios), aleatorio.randint(1, 1000), 1, 10.0, 10.0)
+              for i in range(1, linhas + 1)))
+    return {'filmes': filmes, 'salas': salas, 'usuarios': usuarios}
+
+
+def _medir_consultas(conexao, parametros, repeticoes):
+    resultado = {}
+    for nome, sql in CONSULTAS_PLANO.items():
+        plano = conexao.execute(text("EXPLAIN QUERY PLAN " + sql), parametros).fetchall()
+        comeco = time.perf_counter()
+        for _ in range(repeticoes):
+            conexao.execute(text(sql), parametros).fetchall()
+        tempo_ms = (time.perf_counter() - comeco) * 1000 / repeticoes
+        resultado[nome] = (' | '.join(str(linha[-1]) for linha in plano), tempo_ms)
+    return resultado
+
+
+# Benchmark: popula um SQLite temporário sem índices, mede os planos, cria os índices e mede de novo
+def comparar_planos(linhas, repeticoes=5, saida=print):
+    from .paginacao import criar_indices_prefixo
+
+    caminho = os.path.join(tempfile.mkdtemp(), 'planos.db')
+    engine = create_engine(f'sqlite:///{caminho}')
+    try:
+        with engine.begin() as conexao:
+            db.metadata.create_all(conexao)
+            for tabela in db.metadata.sorted_tables:
+                for indice in tabela.indexes:
+                    indice.drop(conexao)
+            for nome in ('uq_assento_comprado_sessao', 'uq_reserva_assento_sessao'):
+                conexao.exec_driver_sql(f"DROP INDEX IF EXISTS {nome}")
+
+        # As tabelas foram criadas com as restrições únicas inline; recria sem elas para medir o "antes"
+        with engine.begin() as conexao:
+            conexao.exec_driver_sql("DROP TABLE assento_comprado")
+            conexao.exec_driver_sql(
+                "CREATE TABLE assento_comprado (id INTEGER PRIMARY KEY, sessao_id INTEGER NOT NULL, "
+                "assento VARCHAR(10) NOT NULL, pedido_id INTEGER)")
+            conexao.exec_driver_sql("DROP TABLE carrinho")
+            conexao.exec_driver_sql(
+                "CREATE TABLE carrinho (id INTEGER PRIMARY KEY, usuario_id INTEGER NOT NULL, "
+                "criado_em DATETIME, total FLOAT NOT NULL)")
+
+            saida(f"Populando {linhas} sessões, assentos e itens de carrinho...")
+            contagem = _popular_banco_teste(conexao, linhas)
+
+        parametros = {
+            'titulo': f"Filme {contagem['filmes'] // 2}", 'horario': '2025-03-01 12:00:00',
+            'inicio': '2025-03-01 00:00:00', 'fim': '2025-03-02 00:00:00',
+            'sala_id': contagem['salas'] // 2, 'sessao_id': linhas // 2,
+            'usuario_id': contagem['usuarios'] // 2, 'carrinho_id': contagem['usuarios'] // 2,
+            'numero': str(contagem['salas'] // 2), 'nome': 'Cinema 50',
+            'prefixo': f"filme {contagem['filmes'] // 2}%",
+        }
+
+        with engine.connect() as conexao:
+            antes = _medir_consultas(conexao, parametros, repeticoes)
+        with engine.begin() as conexao:
+            sincronizar_indices(conexao)
+            criar_indices_prefixo(conexao)
+            conexao.exec_driver_sql("ANALYZE")
+        with engine.connect() as conexao:
+            depois = _medir_consultas(conexao, parametros, repeticoes)
+
+        for nome in CONSULTAS_PLANO:
+            saida(f"\n{nome}")
+            saida(f"  antes:  {antes[nome][1]:9.3f} ms  {antes[nome][0]}")
+            saida(f"  depois: {depois[nome][1]:9.3f} ms  {depois[nome][0]}")
+        return antes, depois
+    finally:
+        engine.dispose()
+        for sufixo in ('', '-wal', '-shm'):
+            if os.path.exists(caminho + sufixo):
+                os.remove(caminho + sufixo)
+
+
+def registrar_comandos(app):
+    @app.cli.command('migrar')
+    def migrar_comando():
+        """Aplica as migrações pendentes do banco de dados."""
+        aplicadas = aplicar_migracoes()
+        if not aplicadas:
+            click.echo("O banco já está na versão mais recente.")
+
+    @app.cli.command('planos-indices')
+    @click.option('--linhas', default=1000000, show_default=True, help='Quantidade de sessões geradas.')
+    @click.option('--repeticoes', default=5, show_default=True, help='Execuções de cada consulta.')
+    def planos_indices_comando(linhas, repeticoes):
+        """Compara os planos de consulta antes e depois dos índices em um banco SQLite temporário."""
+        comparar_planos(linhas, repeticoes, saida=click.echo)
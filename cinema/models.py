@@ -7,11 +7,12 @@ from . import db
 # Tabela de Usuario
 class Usuario(db.Model, UserMixin):#User mixin adiciona os métodos necessários para o Flask-Login funcionar, como is_authenticated, is_active
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    nome= db.Column(db.String(100), nullable=False)
+    nome= db.Column(db.String(100), nullable=False, index=True)  # Ordenação da lista de usuários
     email = db.Column(db.String(100), unique=True, nullable=False)
     senha = db.Column(db.String(255), nullable=False)
     data_nascimento = db.Column(db.Date)
     is_admin = db.Column(db.Boolean, default=False)  
+    versao = db.Column(db.Integer, nullable=False, default=1, server_default='1')  # Muda quando a senha ou o e-mail mudam
 
     def __init__(self, nome, email, senha, data_nascimento, is_admin=False):
         self.nome = nome
@@ -36,25 +37,29 @@ class Filme(db.Model):
 # Tabela dos Cinemas
 class Cinema(db.Model):
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    nome = db.Column(db.String(100), nullable=False)
+    nome = db.Column(db.String(100), nullable=False, index=True)
     local = db.Column(db.String(255), nullable=False)
     capacidade = db.Column(db.Integer, nullable=False)
 
 # Tabela de Salas
 class Sala(db.Model):
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    numero = db.Column(db.String(10), nullable=False)
+    numero = db.Column(db.String(10), nullable=False, index=True)
     capacidade = db.Column(db.Integer, nullable=False)
-    cinema_id = db.Column(db.Integer, db.ForeignKey('cinema.id'), nullable=False)
+    cinema_id = db.Column(db.Integer, db.ForeignKey('cinema.id'), nullable=False, index=True)
 
     cinema = db.relationship('Cinema', backref=db.backref('salas', lazy=True))
 
 # Tabela de Sessões
 class Sessao(db.Model):
+    # Busca por filme + horário usada em atualizar_sessao e deletar_sessao
+    __table_args__ = (db.Index('ix_sessao_filme_horario', 'filme_id', 'horario'),
+                      db.Index('ix_sessao_sala_horario', 'sala_id', 'horario'))
+
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     filme_id = db.Column(db.Integer, db.ForeignKey('filme.id'), nullable=False)
     sala_id = db.Column(db.Integer, db.ForeignKey('sala.id'), nullable=False)
-    horario = db.Column(db.DateTime, nullable=False)
+    horario = db.Column(db.DateTime, nullable=False, index=True)
     preco = db.Column(db.Float, nullable=False)
 
     filme = db.relationship('Filme', backref=db.backref('sessoes', lazy=True))
@@ -64,24 +69,43 @@ class Sessao(db.Model):
 #Tabela de alimementos
 class Alimento(db.Model):
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    nome = db.Column(db.String(100), nullable=False)
+    nome = db.Column(db.String(100), nullable=False, index=True)
     preco = db.Column(db.Float, nullable=False) 
     tipoDeAlimentos = db.Column(db.String(50))
 
 #Tabela de ngócios
 # Tabela de Compra de Assentos
 class AssentoComprado(db.Model):
+    # Um assento só pode ser comprado uma vez por sessão
+    __table_args__ = (db.UniqueConstraint('sessao_id', 'assento', name='uq_assento_comprado_sessao'),)
+
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     sessao_id = db.Column(db.Integer, db.ForeignKey('sessao.id'), nullable=False)
     assento = db.Column(db.String(10), nullable=False)
+    pedido_id = db.Column(db.Integer, db.ForeignKey('pedido.id'), index=True)  # Pedido que comprou o assento
 
     sessao = db.relationship('Sessao', backref=db.backref('assentos_comprados', lazy=True))
 
+# Tabela de Reservas temporárias de assentos (expiram se a compra não for confirmada)
+class ReservaAssento(db.Model):
+    # Só pode existir uma reserva por assento em cada sessão
+    __table_args__ = (db.UniqueConstraint('sessao_id', 'assento', name='uq_reserva_assento_sessao'),)
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    sessao_id = db.Column(db.Integer, db.ForeignKey('sessao.id'), nullable=False)
+    assento = db.Column(db.String(10), nullable=False)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id'), nullable=False)
+    expira_em = db.Column(db.DateTime, nullable=False, index=True)
+
+    sessao = db.relationship('Sessao', backref=db.backref('reservas', lazy=True))
+    usuario = db.relationship('Usuario', backref=db.backref('reservas', lazy=True))
+
 # Tabela de Compra de Sessões
 class CompraSessao(db.Model):
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    carrinho_id = db.Column(db.Integer, db.ForeignKey('carrinho.id'), nullable=False)
-    sessao_id = db.Column(db.Integer, db.ForeignKey('sessao.id'), nullable=False)
+    carrinho_id = db.Column(db.Integer, db.ForeignKey('carrinho.id'), nullable=False, index=True)
+    sessao_id = db.Column(db.Integer, db.ForeignKey('sessao.id'), nullable=False, index=True)
+    assento = db.Column(db.String(10))  # Assento reservado para este ingresso
     quantidade = db.Column(db.Integer, nullable=False, default=1)
     subtotal = db.Column(db.Float, nullable=False)
 
@@ -92,8 +116,8 @@ class CompraSessao(db.Model):
 #Tabela de compra de alimentos
 class CompraAlimento(db.Model):
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    carrinho_id = db.Column(db.Integer, db.ForeignKey('carrinho.id'), nullable=False)
-    alimento_id = db.Column(db.Integer, db.ForeignKey('alimento.id'), nullable=False)
+    carrinho_id = db.Column(db.Integer, db.ForeignKey('carrinho.id'), nullable=False, index=True)
+    alimento_id = db.Column(db.Integer, db.ForeignKey('alimento.id'), nullable=False, index=True)
     quantidade = db.Column(db.Integer, nullable=False, default=1)
     preco_unitario = db.Column(db.Float, nullable=False)
     subtotal = db.Column(db.Float, nullable=False)
@@ -105,11 +129,86 @@ class CompraAlimento(db.Model):
 # Tabela de Carrinho
 class Carrinho(db.Model):
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id'), nullable=False)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id'), nullable=False, unique=True, index=True)  # Um carrinho por usuário
     criado_em = db.Column(db.DateTime, default=datetime.utcnow)
     total = db.Column(db.Float, nullable=False, default=0.0)
 
     usuario = db.relationship('Usuario', backref=db.backref('carrinhos', lazy=True))
 
 
+# Tabela de Pedidos (carrinho finalizado)
+class Pedido(db.Model):
+    # A chave enviada pelo cliente impede que uma nova tentativa do mesmo checkout gere outro pedido
+    __table_args__ = (db.UniqueConstraint('usuario_id', 'chave', name='uq_pedido_chave'),)
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id'), nullable=False, index=True)
+    chave = db.Column(db.String(64), nullable=False)
+    total = db.Column(db.Float, nullable=False)
+    criado_em = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # Recálculo dos relatórios por período
+
+    usuario = db.relationship('Usuario', backref=db.backref('pedidos', lazy=True))
+
+
+# Itens do pedido: ingressos (sessão e assento) ou alimentos
+class ItemPedido(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    pedido_id = db.Column(db.Integer, db.ForeignKey('pedido.id'), nullable=False, index=True)
+    sessao_id = db.Column(db.Integer, db.ForeignKey('sessao.id'), index=True)
+    assento = db.Column(db.String(10))
+    alimento_id = db.Column(db.Integer, db.ForeignKey('alimento.id'))
+    quantidade = db.Column(db.Integer, nullable=False, default=1)
+    preco_unitario = db.Column(db.Float, nullable=False)
+    subtotal = db.Column(db.Float, nullable=False)
+
+    pedido = db.relationship('Pedido', backref=db.backref('itens', lazy=True))
+
+
+# Resumos de vendas para os relatórios (ver cinema/analises.py). São somados a cada checkout,
+# na mesma transação do pedido, e podem ser recalculados a partir dos pedidos.
+# Ocupação e receita de cada sessão
+class ResumoSessao(db.Model):
+    sessao_id = db.Column(db.Integer, db.ForeignKey('sessao.id'), primary_key=True)
+    filme_id = db.Column(db.Integer, nullable=False, index=True)
+    cinema_id = db.Column(db.Integer, nullable=False, index=True)
+    horario = db.Column(db.DateTime, nullable=False, index=True)
+    capacidade = db.Column(db.Integer, nullable=False)
+    ingressos = db.Column(db.Integer, nullable=False, default=0)
+    receita = db.Column(db.Float, nullable=False, default=0.0)
+
+
+# Ingressos e receita por filme em cada dia de venda
+class ResumoFilmeDia(db.Model):
+    filme_id = db.Column(db.Integer, primary_key=True)
+    dia = db.Column(db.Date, primary_key=True, index=True)
+    ingressos = db.Column(db.Integer, nullable=False, default=0)
+    receita = db.Column(db.Float, nullable=False, default=0.0)
+
+
+# Vendas por cinema em cada dia. Os alimentos contam para o cinema dos ingressos do mesmo pedido;
+# pedidos só de alimentos ficam no cinema_id 0.
+class ResumoCinemaDia(db.Model):
+    cinema_id = db.Column(db.Integer, primary_key=True)
+    dia = db.Column(db.Date, primary_key=True, index=True)
+    pedidos = db.Column(db.Integer, nullable=False, default=0)
+    ingressos = db.Column(db.Integer, nullable=False, default=0)
+    receita_ingressos = db.Column(db.Float, nullable=False, default=0.0)
+    receita_alimentos = db.Column(db.Float, nullable=False, default=0.0)
+
+
+# Alimentos vendidos por cinema em cada dia (mesma regra de cinema do resumo acima)
+class ResumoAlimentoDia(db.Model):
+    cinema_id = db.Column(db.Integer, primary_key=True)
+    dia = db.Column(db.Date, primary_key=True, index=True)
+    alimento_id = db.Column(db.Integer, primary_key=True)
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+    receita = db.Column(db.Float, nullable=False, default=0.0)
+
+
+# Sessões dos usuários guardadas no servidor (ver cinema/sessoes_web.py); o cookie leva só um id aleatório
+class SessaoWeb(db.Model):
+    __tablename__ = 'sessao_web'
 
+    id = db.Column(db.String(64), primary_key=True)  # sha256 do id do cookie: quem lê o banco não consegue usá-lo
+    dados = db.Column(db.LargeBinary, nullable=False)
+    expira_em = db.Column(db.DateTime, nullable=False, index=True)  # Varredura das sessões vencidas
@@ -0,0 +1,135 @@
+import base64
+import json
+from datetime import date, datetime
+from flask import request, url_for
+from sqlalchemy import tuple_
+
+# Linhas por página nas listagens de administração
+POR_PAGINA = 50
+MAX_POR_PAGINA = 200
+
+
+# Uma página da listagem, com os cursores para a próxima e a anterior (None quando não há)
+class PaginaChave:
+    def __init__(self, itens, proxima, anterior, ordem, decrescente, por_pagina):
+        self.items = itens
+        self.proxima = proxima
+        self.anterior = anterior
+        self.ordem = ordem
+        self.decrescente = decrescente
+        self.por_pagina = por_pagina
+
+
+def _para_json(valor):
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    return valor
+
+
+def _de_json(coluna, valor):
+    tipo = coluna.type.python_type
+    if tipo is datetime:
+        return datetime.fromisoformat(valor)
+    if tipo is date:
+        return date.fromisoformat(valor)
+    return tipo(valor)
+
+
+# O cursor é o valor da coluna de ordenação e o id da última linha vista, em base64 para ir na URL
+def codificar_cursor(valores):
+    texto = json.dumps([_para_json(v) for v in valores], separators=(',', ':'))
+    return base64.urlsafe_b64encode(texto.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor, colunas):
+    try:
+        texto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        valores = json.loads(texto)
+        if len(valores) != len(colunas):
+            return None
+        return [_de_json(coluna, valor) for coluna, valor in zip(colunas, valores)]
+    except (ValueError, TypeError):
+        return None  # Cursor inválido: volta para a primeira página
+
+
+# Paginação por chave ("seek"): em vez de OFFSET, filtra as linhas depois (ou antes) da última vista,
+# na ordem (coluna, id). Com índice na coluna de ordenação, cada página custa o mesmo em qualquer
+# ponto da tabela, e não há COUNT(*) da tabela inteira.
+def paginar_por_chave(consulta, coluna, chave, apos=None, antes=None, por_pagina=POR_PAGINA,
+                      decrescente=False, nome_ordem=None):
+    colunas = [chave] if coluna is chave else [coluna, chave]
+    voltando = bool(antes)
+    cursor = antes if voltando else apos
+    crescente = decrescente if voltando else not decrescente
+
+    valores = decodificar_cursor(cursor, colunas) if cursor else None
+    if valores is not None:
+        esquerda = tuple_(*colunas) if len(colunas) > 1 else colunas[0]
+        direita = tuple_(*valores) if len(valores) > 1 else valores[0]
+        consulta = consulta.filter(esquerda > direita if crescente else esquerda < direita)
+
+    ordem = [c.asc() if crescente else c.desc() for c in colunas]
+    linhas = consulta.order_by(None).order_by(*ordem).limit(por_pagina + 1).all()
+    tem_mais = len(linhas) > por_pagina
+    linhas = linhas[:por_pagina]
+    if voltando:
+        linhas.reverse()
+
+    def cursor_de(linha):
+        return codificar_cursor([getattr(linha, c.key) for c in colunas])
+
+    proxima = anterior = None
+    if linhas:
+        if voltando:
+            proxima = cursor_de(linhas[-1])
+            anterior = cursor_de(linhas[0]) if tem_mais else None
+        else:
+            proxima = cursor_de(linhas[-1]) if tem_mais else None
+            anterior = cursor_de(linhas[0]) if valores is not None else None
+    return PaginaChave(linhas, proxima, anterior, nome_ordem or coluna.key, decrescente, por_pagina)
+
+
+# Lê ordem, direção, cursores e tamanho da página da URL. 'ordens' mapeia o nome aceito na URL
+# para a coluna (só colunas com índice, para que a ordenação não precise ler a tabela toda).
+def pagina_admin(consulta, ordens, padrao, chave, args=None):
+    args = request.args if args is None else args
+    nome = args.get('ordem', padrao)
+    if nome not in ordens:
+        nome = padrao
+    por_pagina = min(max(args.get('por_pagina', POR_PAGINA, type=int), 1), MAX_POR_PAGINA)
+    return paginar_por_chave(consulta, ordens[nome], chave, apos=args.get('apos'), antes=args.get('antes'),
+                             por_pagina=por_pagina, decrescente=args.get('direcao') == 'desc', nome_ordem=nome)
+
+
+# URL da mesma listagem trocando alguns parâmetros (None remove o parâmetro); usada nos templates
+def url_pagina(**mudancas):
+    args = request.args.to_dict()
+    args.update(mudancas)
+    return url_for(request.endpoint, **{k: v for k, v in args.items() if v not in (None, '')})
+
+
+# Colunas pesquisadas com filtro_prefixo. No SQLite o LIKE não diferencia maiúsculas de minúsculas e só
+# usa um índice criado com COLLATE NOCASE; os índices comuns (que o MySQL usa para o LIKE) ficam nos modelos.
+INDICES_PREFIXO = {
+    'ix_usuario_nome_nocase': ('usuario', 'nome'),
+    'ix_usuario_email_nocase': ('usuario', 'email'),
+    'ix_filme_titulo_nocase': ('filme', 'titulo'),
+    'ix_cinema_nome_nocase': ('cinema', 'nome'),
+    'ix_sala_numero_nocase': ('sala', 'numero'),
+    'ix_alimento_nome_nocase': ('alimento', 'nome'),
+}
+
+
+def criar_indices_prefixo(conexao):
+    if conexao.dialect.name != 'sqlite':
+        return False
+    for nome, (tabela, coluna) in INDICES_PREFIXO.items():
+        conexao.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {nome} ON {tabela} ({coluna} COLLATE NOCASE)")
+    return True
+
+
+# Filtro "começa com" para as buscas das listagens (% e _ digitados valem como texto).
+# Vira uma faixa do índice (ver INDICES_PREFIXO) em vez de ler a tabela inteira.
+def filtro_prefixo(coluna, texto):
+    texto = texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return coluna.like(texto + '%', escape='\\')
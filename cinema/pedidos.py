@@ -0,0 +1,225 @@
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy import and_, delete, exists, insert, literal, null, select, update
+from sqlalchemy.exc import IntegrityError
+from . import db
+from .analises import acumular_pedido
+from .assentos import anotar_assentos
+from .carrinho import total_em_sql
+from .models import (AssentoComprado, Carrinho, CompraAlimento, CompraSessao, ItemPedido, Pedido,
+                     ReservaAssento)
+
+
+class CarrinhoVazio(Exception):
+    pass
+
+
+class AssentosIndisponiveis(Exception):
+    """Algum assento do carrinho já foi vendido ou está reservado por outra pessoa."""
+
+    def __init__(self, assentos):
+        super().__init__(assentos)
+        self.assentos = assentos  # [(sessao_id, assento)]
+
+
+def _pedido_existente(usuario_id, chave):
+    return Pedido.query.filter_by(usuario_id=usuario_id, chave=chave).first()
+
+
+# Finaliza a compra do carrinho numa transação curta:
+#  1. trava o carrinho recalculando o total no banco (é a primeira escrita da transação);
+#  2. se a chave já gerou um pedido, devolve esse pedido (nova tentativa do mesmo checkout);
+#  3. confere no banco se algum assento foi vendido ou está reservado por outra pessoa;
+#  4. copia as linhas do carrinho para o pedido e os assentos para AssentoComprado com INSERT ... SELECT;
+#  5. apaga as reservas, esvazia o carrinho e soma o pedido aos resumos de vendas.
+# Nenhuma linha do carrinho é carregada como objeto. Deve ser chamada sem alterações pendentes na sessão
+# do banco: a transação de leitura em andamento (ex.: a do carregamento do usuário) é descartada.
+def finalizar_compra(usuario_id, chave):
+    if db.session.new or db.session.dirty or db.session.deleted:
+        raise RuntimeError("finalizar_compra chamada com alterações pendentes na sessão do banco")
+    db.session.rollback()  # Encerra a leitura em andamento sem gravar nada
+    db.session.begin()  # Transação nova: a trava do carrinho é a primeira instrução dela
+    agora = datetime.utcnow()
+    carrinho = Carrinho.__table__
+    sessoes = CompraSessao.__table__
+    alimentos = CompraAlimento.__table__
+    reservas = ReservaAssento.__table__
+    vendidos = AssentoComprado.__table__
+
+    travados = db.session.execute(update(carrinho).where(carrinho.c.usuario_id == usuario_id)
+                                  .values(total=total_em_sql(carrinho.c.id))).rowcount
+    pedido = _pedido_existente(usuario_id, chave)
+    if pedido:
+        db.session.rollback()
+        return pedido
+    if not travados:
+        db.session.rollback()
+        raise CarrinhoVazio()
+
+    carrinho_id, total = db.session.execute(
+        select(carrinho.c.id, carrinho.c.total).where(carrinho.c.usuario_id == usuario_id)).one()
+    tem_itens = db.session.execute(select(
+        exists().where(sessoes.c.carrinho_id == carrinho_id) | exists().where(alimentos.c.carrinho_id == carrinho_id)
+    )).scalar()
+    if not tem_itens:
+        db.session.rollback()
+        raise CarrinhoVazio()
+
+    mesmo_assento = and_(sessoes.c.sessao_id == vendidos.c.sessao_id, sessoes.c.assento == vendidos.c.assento)
+    reservado_por_outro = and_(reservas.c.sessao_id == sessoes.c.sessao_id, reservas.c.assento == sessoes.c.assento,
+                               reservas.c.usuario_id != usuario_id, reservas.c.expira_em > agora)
+    indisponiveis = db.session.execute(
+        select(sessoes.c.sessao_id, sessoes.c.assento).where(sessoes.c.carrinho_id == carrinho_id)
+        .where(exists().where(mesmo_assento) | exists().where(reservado_por_outro))).all()
+    if indisponiveis:
+        db.session.rollback()
+        raise AssentosIndisponiveis([tuple(linha) for linha in indisponiveis])
+
+    assentos = [tuple(linha) for linha in db.session.execute(
+        select(sessoes.c.sessao_id, sessoes.c.assento)
+        .where(sessoes.c.carrinho_id == carrinho_id, sessoes.c.assento.isnot(None)))]
+
+    pedido_id = db.session.execute(insert(Pedido.__table__).values(
+        usuario_id=usuario_id, chave=chave, total=total, criado_em=agora)).inserted_primary_key[0]
+
+    itens = ItemPedido.__table__
+    colunas = ['pedido_id', 'sessao_id', 'assento', 'alimento_id', 'quantidade', 'preco_unitario', 'subtotal']
+    db.session.execute(insert(itens).from_select(colunas, select(
+        literal(pedido_id), sessoes.c.sessao_id, sessoes.c.assento, null(), sessoes.c.quantidade,
+        sessoes.c.subtotal / sessoes.c.quantidade, sessoes.c.subtotal).where(sessoes.c.carrinho_id == carrinho_id)))
+    db.session.execute(insert(itens).from_select(colunas, select(
+        literal(pedido_id), null(), null(), alimentos.c.alimento_id, alimentos.c.quantidade,
+        alimentos.c.preco_unitario, alimentos.c.subtotal).where(alimentos.c.carrinho_id == carrinho_id)))
+    db.session.execute(insert(vendidos).from_select(['sessao_id', 'assento', 'pedido_id'], select(
+        sessoes.c.sessao_id, sessoes.c.assento, literal(pedido_id))
+        .where(sessoes.c.carrinho_id == carrinho_id, sessoes.c.assento.isnot(None))))
+
+    db.session.execute(delete(reservas).where(reservas.c.usuario_id == usuario_id).where(exists().where(and_(
+        sessoes.c.carrinho_id == carrinho_id, sessoes.c.sessao_id == reservas.c.sessao_id,
+        sessoes.c.assento == reservas.c.assento))))
+    db.session.execute(delete(sessoes).where(sessoes.c.carrinho_id == carrinho_id))
+    db.session.execute(delete(alimentos).where(alimentos.c.carrinho_id == carrinho_id))
+    db.session.execute(update(carrinho).where(carrinho.c.id == carrinho_id).values(total=0.0))
+    acumular_pedido(db.session.connection(), pedido_id)  # Resumos dos relatórios, na mesma transação
+
+    anotar_assentos(db.session, assentos)  # Os INSERTs em massa não passam pelos eventos do mapa de assentos
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Outro checkout gravou a mesma chave ou vendeu um dos assentos entre a conferência e o INSERT
+        db.session.rollback()
+        pedido = _pedido_existente(usuario_id, chave)
+        if pedido:
+            return pedido
+        raise AssentosIndisponiveis([])
+    return db.session.get(Pedido, pedido_id)
+
+
+def _popular_benchmark(usuarios, sessoes, capacidade, aleatorio):
+    from .assentos import rotulo_assento
+    from .models import Alimento, Cinema, Filme, Sala, Sessao, Usuario
+
+    db.session.add_all([Cinema(id=1, nome='Cinema', local='Centro', capacidade=1000),
+                        Sala(id=1, numero='1', capacidade=capacidade, cinema_id=1),
+                        Filme(id=1, titulo='Filme', duracao=120, classificacao='L'),
+                        Alimento(id=1, nome='Pipoca', preco=15.0)])
+    db.session.add_all([Sessao(id=i, filme_id=1, sala_id=1, preco=25.0,
+                               horario=datetime(2025, 1, 1) + timedelta(hours=3 * i)) for i in range(1, sessoes + 1)])
+    db.session.flush()
+    db.session.execute(insert(Usuario.__table__), [
+        {'id': i, 'nome': f'Usuário {i}', 'email': f'u{i}@cinema.com', 'senha': '-'} for i in range(1, usuarios + 1)])
+    db.session.execute(insert(Carrinho.__table__), [
+        {'id': i, 'usuario_id': i, 'total': 0.0} for i in range(1, usuarios + 1)])
+    linhas = []
+    for i in range(1, usuarios + 1):
+        sessao_id = aleatorio.randint(1, sessoes)
+        for indice in aleatorio.sample(range(capacidade), 2):
+            linhas.append({'carrinho_id': i, 'sessao_id': sessao_id, 'assento': rotulo_assento(indice),
+                           'quantidade': 1, 'subtotal': 25.0})
+    db.session.execute(insert(CompraSessao.__table__), linhas)
+    db.session.execute(insert(CompraAlimento.__table__), [
+        {'carrinho_id': i, 'alimento_id': 1, 'quantidade': 2, 'preco_unitario': 15.0, 'subtotal': 30.0}
+        for i in range(1, usuarios + 1)])
+    db.session.commit()
+
+
+# Benchmark: vários checkouts ao mesmo tempo em um SQLite temporário, cada um repetido com a mesma chave
+def medir_checkouts(usuarios, threads, sessoes=20, capacidade=100, saida=print):
+    from . import create_app
+
+    caminho = os.path.join(tempfile.mkdtemp(), 'checkout.db')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{caminho}'})
+    try:
+        with app.app_context():
+            db.create_all()
+            _popular_benchmark(usuarios, sessoes, capacidade, random.Random(42))
+
+        fila = list(range(1, usuarios + 1))
+        lock = threading.Lock()
+        resultado = {'pedidos': 0, 'repetidos': 0, 'indisponiveis': 0, 'erros': 0}
+
+        def trabalhar():
+            with app.app_context():
+                while True:
+                    with lock:
+                        if not fila:
+                            return
+                        usuario_id = fila.pop()
+                    chave = f'bench-{usuario_id}'
+                    try:
+                        pedido = finalizar_compra(usuario_id, chave)
+                        repetido = finalizar_compra(usuario_id, chave)  # Nova tentativa do mesmo checkout
+                        with lock:
+                            resultado['pedidos'] += 1
+                            resultado['repetidos'] += repetido.id == pedido.id
+                    except AssentosIndisponiveis:
+                        with lock:
+                            resultado['indisponiveis'] += 1
+                    except Exception as erro:
+                        db.session.rollback()
+                        with lock:
+                            resultado['erros'] += 1
+                        saida(f"Erro: {erro}")
+                    finally:
+                        db.session.remove()
+
+        comeco = time.perf_counter()
+        trabalhadores = [threading.Thread(target=trabalhar) for _ in range(threads)]
+        for trabalhador in trabalhadores:
+            trabalhador.start()
+        for trabalhador in trabalhadores:
+            trabalhador.join()
+        duracao = time.perf_counter() - comeco
+
+        with app.app_context():
+            pedidos = db.session.query(Pedido).count()
+            assentos = db.session.query(AssentoComprado).count()
+            ingressos = db.session.query(ItemPedido).filter(ItemPedido.assento.isnot(None)).count()
+
+        saida(f"{usuarios} checkouts com {threads} threads em {duracao:.2f}s ({usuarios / duracao:.0f} por segundo)")
+        saida(f"Pedidos: {resultado['pedidos']}, assentos indisponíveis: {resultado['indisponiveis']}, "
+              f"erros: {resultado['erros']}")
+        saida(f"Repetições com a mesma chave que devolveram o mesmo pedido: {resultado['repetidos']}")
+        saida(f"No banco: {pedidos} pedidos, {assentos} assentos vendidos, {ingressos} ingressos")
+        return resultado
+    finally:
+        with app.app_context():
+            db.engine.dispose()
+        for sufixo in ('', '-wal', '-shm'):
+            if os.path.exists(caminho + sufixo):
+                os.remove(caminho + sufixo)
+
+
+def registrar_comandos(app):
+    @app.cli.command('benchmark-checkout')
+    @click.option('--usuarios', default=500, show_default=True, help='Carrinhos finalizados.')
+    @click.option('--threads', default=8, show_default=True, help='Checkouts ao mesmo tempo.')
+    def benchmark_checkout_comando(usuarios, threads):
+        """Mede checkouts concorrentes em um banco SQLite temporário."""
+        medir_checkouts(usuarios, threads, saida=click.echo)
@@ -0,0 +1,150 @@
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+import click
+from sqlalchemy import insert
+from . import db
+from .agenda import carregar_agenda, tempo_limpeza
+from .cache import cache_catalogo
+from .consultas import catalogo_filmes, catalogo_salas
+from .models import Sessao
+
+ABERTURA = '13:00'
+FECHAMENTO = '23:30'
+PASSO_MINUTOS = 5          # Horários arredondados para múltiplos de 5 minutos
+ESCALONAMENTO_MINUTOS = 10  # Salas do mesmo cinema começam desencontradas para não lotar o saguão
+TAMANHO_LOTE = 1000
+
+
+def ler_hora(texto):
+    return datetime.strptime(texto, '%H:%M').time()
+
+
+def _arredondar(horario):
+    resto = (horario.minute % PASSO_MINUTOS) * 60 + horario.second
+    if resto == 0 and horario.microsecond == 0:
+        return horario
+    return horario.replace(second=0, microsecond=0) + timedelta(minutes=PASSO_MINUTOS - horario.minute % PASSO_MINUTOS)
+
+
+# Monta a programação da semana para cada cinema.
+# Sala a sala (das maiores para as menores) e do horário de abertura em diante, escolhe entre os filmes que
+# ainda cabem antes do fechamento aquele mais atrasado em relação à sua parte dos lugares (peso do filme /
+# soma dos pesos). Assim os filmes mais procurados ficam com mais sessões e com as salas maiores.
+# Sessões já existentes na agenda são respeitadas. Devolve uma lista de (filme_id, sala_id, horario).
+def planejar_semana(filmes, salas, inicio, agenda, abertura, fechamento, pesos=None, dias=7):
+    pesos = pesos or {}
+    filmes = [f for f in filmes if pesos.get(f.id, 1) > 0]
+    if not filmes:
+        return []
+    por_cinema = defaultdict(list)
+    for sala in salas:
+        por_cinema[sala.cinema_id].append(sala)
+
+    planejadas = []
+    for salas_cinema in por_cinema.values():
+        salas_cinema.sort(key=lambda s: -s.capacidade)
+        soma_pesos = sum(pesos.get(f.id, 1) for f in filmes)
+        parte = {f.id: pesos.get(f.id, 1) / soma_pesos for f in filmes}
+        lugares = defaultdict(int)  # Lugares já programados por filme neste cinema
+        total = 0
+
+        for dia in range(dias):
+            data = inicio + timedelta(days=dia)
+            abre = datetime.combine(data, abertura)
+            fecha = datetime.combine(data, fechamento)
+            if fecha <= abre:
+                fecha += timedelta(days=1)  # Fechamento depois da meia-noite
+
+            for posicao, sala in enumerate(salas_cinema):
+                horario = abre + timedelta(minutes=(posicao % 3) * ESCALONAMENTO_MINUTOS)
+                while horario < fecha:
+                    cabem = [f for f in filmes if horario + timedelta(minutes=f.duracao) <= fecha]
+                    if not cabem:
+                        break
+                    filme = max(cabem, key=lambda f: (parte[f.id] * (total + sala.capacidade) - lugares[f.id], -f.duracao))
+                    ocupada_ate = agenda.ocupada_ate(sala.id, horario, filme.duracao)
+                    if ocupada_ate is not None:
+                        horario = _arredondar(ocupada_ate)  # Sala ocupada por uma sessão já existente: pula para depois dela
+                        continue
+                    agenda.adicionar(sala.id, 'nova', horario, filme.duracao)
+                    planejadas.append((filme.id, sala.id, horario))
+                    lugares[filme.id] += sala.capacidade
+                    total += sala.capacidade
+                    horario = _arredondar(agenda.fim(horario, filme.duracao))
+    return planejadas
+
+
+# Planeja a semana com os dados do banco (e do cache do catálogo)
+def gerar_programacao(inicio, abertura=None, fechamento=None, pesos=None, cinema_id=None, dias=7):
+    abertura = abertura or ler_hora(ABERTURA)
+    fechamento = fechamento or ler_hora(FECHAMENTO)
+    salas = [s for s in catalogo_salas() if cinema_id is None or s.cinema_id == cinema_id]
+    filmes = catalogo_filmes()
+    if not salas or not filmes:
+        return []
+
+    comeco = datetime.combine(inicio, abertura)
+    maior = max(f.duracao for f in filmes)
+    agenda = carregar_agenda(desde=comeco - timedelta(minutes=maior) - tempo_limpeza(),
+                             ate=comeco + timedelta(days=dias + 1))
+    return planejar_semana(filmes, salas, inicio, agenda, abertura, fechamento, pesos, dias)
+
+
+# Grava a programação com INSERTs em massa, tudo numa transação só
+def gravar_programacao(planejadas, preco):
+    linhas = [{'filme_id': filme_id, 'sala_id': sala_id, 'horario': horario, 'preco': preco}
+              for filme_id, sala_id, horario in planejadas]
+    try:
+        for i in range(0, len(linhas), TAMANHO_LOTE):
+            db.session.execute(insert(Sessao.__table__), linhas[i:i + TAMANHO_LOTE])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    cache_catalogo.invalidar('sessoes')  # O INSERT em massa não passa pelos eventos do ORM
+    return len(linhas)
+
+
+# "3=2.5" -> {3: 2.5}
+def ler_pesos(valores):
+    pesos = {}
+    for valor in valores:
+        filme_id, _, peso = valor.partition('=')
+        pesos[int(filme_id)] = float(peso)
+    return pesos
+
+
+def proxima_segunda(hoje=None):
+    hoje = hoje or date.today()
+    return hoje + timedelta(days=7 - hoje.weekday())
+
+
+def registrar_comandos(app):
+    @app.cli.command('gerar-programacao')
+    @click.option('--inicio', help='Primeiro dia (AAAA-MM-DD). Padrão: próxima segunda-feira.')
+    @click.option('--dias', default=7, show_default=True)
+    @click.option('--abertura', default=ABERTURA, show_default=True)
+    @click.option('--fechamento', default=FECHAMENTO, show_default=True)
+    @click.option('--cinema', 'cinema_id', type=int, help='Só as salas deste cinema.')
+    @click.option('--peso', multiple=True, help='Procura do filme, ex.: --peso 3=2.5 (padrão 1; 0 tira o filme).')
+    @click.option('--preco', type=float, required=True, help='Preço do ingresso das sessões geradas.')
+    @click.option('--simular', is_flag=True, help='Só mostra o resumo, sem gravar.')
+    def gerar_programacao_comando(inicio, dias, abertura, fechamento, cinema_id, peso, preco, simular):
+        """Gera uma semana de sessões sem sobreposição para as salas."""
+        inicio = date.fromisoformat(inicio) if inicio else proxima_segunda()
+        antes = time.perf_counter()
+        planejadas = gerar_programacao(inicio, ler_hora(abertura), ler_hora(fechamento),
+                                       ler_pesos(peso), cinema_id, dias)
+        click.echo(f"{len(planejadas)} sessões planejadas em {time.perf_counter() - antes:.3f}s")
+
+        por_filme = defaultdict(int)
+        for filme_id, _, _ in planejadas:
+            por_filme[filme_id] += 1
+        titulos = {f.id: f.titulo for f in catalogo_filmes()}
+        for filme_id, quantidade in sorted(por_filme.items(), key=lambda item: -item[1]):
+            click.echo(f"  {titulos.get(filme_id, filme_id)}: {quantidade}")
+
+        if not simular:
+            click.echo(f"{gravar_programacao(planejadas, preco)} sessões gravadas.")
@@ -0,0 +1,218 @@
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from . import db
+from .eventos import publicar_assentos
+from .models import AssentoComprado, ReservaAssento
+
+# Tempo padrão (em minutos) que um assento fica reservado antes da compra
+RESERVA_TTL_MINUTOS = 10
+
+
+def _ttl():
+    return timedelta(minutes=current_app.config.get('RESERVA_TTL_MINUTOS', RESERVA_TTL_MINUTOS))
+
+
+def _publicar_reserva(sessao_id, assento, expira_em=None):
+    if expira_em is None:
+        publicar_assentos(sessao_id, [{'assento': assento, 'estado': 'livre'}])
+    else:
+        segundos = max(int((expira_em - datetime.utcnow()).total_seconds()), 0)
+        publicar_assentos(sessao_id, [{'assento': assento, 'estado': 'reservado', 'segundos': segundos}])
+
+
+# Apaga todas as reservas vencidas (pode ser chamada periodicamente)
+def liberar_reservas_expiradas():
+    vencidas = ReservaAssento.query.filter(ReservaAssento.expira_em <= datetime.utcnow())
+    liberadas = vencidas.with_entities(ReservaAssento.sessao_id, ReservaAssento.assento).all()
+    apagadas = vencidas.delete(synchronize_session=False)
+    db.session.commit()
+    for sessao_id, assento in liberadas:
+        _publicar_reserva(sessao_id, assento)
+    return apagadas
+
+
+# Assentos com reserva ativa na sessão, para exibir como indisponíveis no mapa
+def assentos_reservados(sessao_id, exceto_usuario_id=None):
+    consulta = db.session.query(ReservaAssento.assento).filter(
+        ReservaAssento.sessao_id == sessao_id,
+        ReservaAssento.expira_em > datetime.utcnow())
+    if exceto_usuario_id is not None:
+        consulta = consulta.filter(ReservaAssento.usuario_id != exceto_usuario_id)
+    return {assento for (assento,) in consulta}
+
+
+# Reserva o assento para o usuário. A garantia vem do índice único (sessao_id, assento):
+# o INSERT falha se outra pessoa já tiver a reserva, sem ler antes de escrever.
+# Retorna a reserva criada ou None se o assento já estiver reservado por outro usuário.
+def reservar_assento(sessao_id, assento, usuario_id):
+    agora = datetime.utcnow()
+    expira_em = agora + _ttl()
+
+    # Libera a reserva vencida deste assento, se houver, antes de tentar inserir
+    ReservaAssento.query.filter(
+        ReservaAssento.sessao_id == sessao_id,
+        ReservaAssento.assento == assento,
+        ReservaAssento.expira_em <= agora).delete(synchronize_session=False)
+
+    reserva = ReservaAssento(sessao_id=sessao_id, assento=assento, usuario_id=usuario_id, expira_em=expira_em)
+    try:
+        db.session.add(reserva)
+        db.session.flush()
+        # A reserva de quem acabou de comprar já foi apagada: não reserva assento vendido
+        vendido = db.session.query(AssentoComprado.id).filter_by(sessao_id=sessao_id, assento=assento).first()
+        if vendido:
+            db.session.rollback()
+            return None
+        db.session.commit()
+        _publicar_reserva(sessao_id, assento, expira_em)
+        return reserva
+    except IntegrityError:
+        db.session.rollback()
+
+    # O assento já tem reserva: se for do próprio usuário, apenas renova o prazo
+    renovadas = ReservaAssento.query.filter_by(sessao_id=sessao_id, assento=assento, usuario_id=usuario_id) \
+        .update({'expira_em': expira_em}, synchronize_session=False)
+    db.session.commit()
+    if renovadas:
+        _publicar_reserva(sessao_id, assento, expira_em)
+        return ReservaAssento.query.filter_by(sessao_id=sessao_id, assento=assento).first()
+    return None
+
+
+# Converte a reserva do usuário em compra na mesma transação.
+# Retorna o AssentoComprado ou None se a reserva venceu ou o assento já foi vendido.
+def confirmar_reserva(sessao_id, assento, usuario_id):
+    apagadas = ReservaAssento.query.filter(
+        ReservaAssento.sessao_id == sessao_id,
+        ReservaAssento.assento == assento,
+        ReservaAssento.usuario_id == usuario_id,
+        ReservaAssento.expira_em > datetime.utcnow()).delete(synchronize_session=False)
+    if not apagadas:
+        db.session.rollback()
+        return None
+
+    compra = AssentoComprado(sessao_id=sessao_id, assento=assento)
+    try:
+        db.session.add(compra)
+        db.session.commit()
+        return compra
+    except IntegrityError:
+        db.session.rollback()
+        return None
+
+
+# Desiste da reserva antes do prazo
+def cancelar_reserva(sessao_id, assento, usuario_id):
+    apagadas = ReservaAssento.query.filter_by(sessao_id=sessao_id, assento=assento, usuario_id=usuario_id) \
+        .delete(synchronize_session=False)
+    db.session.commit()
+    if apagadas:
+        _publicar_reserva(sessao_id, assento)
+    return bool(apagadas)
+
+
+# Benchmark: `concorrentes` usuários, cada um com o seu cliente logado, pedem o mesmo assento ao mesmo
+# tempo pela rota da API (POST /api/v1/carrinho/assentos), um assento por rodada, num SQLite temporário.
+# Só um INSERT pode vencer o índice único: a rota deve responder 201 a um e 409 aos outros, nunca 500.
+def medir_reservas(assentos, concorrentes, saida=print):
+    from . import create_app
+    from .assentos import rotulo_assento
+    from .models import Cinema, Filme, Sala, Sessao, Usuario
+
+    caminho = os.path.join(tempfile.mkdtemp(), 'reservas.db')
+    # Centenas de escritas na fila do SQLite: o busy_timeout precisa cobrir a rodada inteira
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{caminho}', 'SQLITE_BUSY_TIMEOUT': 60000,
+                      'SESSAO_ARMAZEM': 'memoria'})
+    try:
+        with app.app_context():
+            db.create_all()
+            db.session.add_all([Cinema(id=1, nome='Cinema', local='Centro', capacidade=1000),
+                                Sala(id=1, numero='1', capacidade=max(assentos, 1), cinema_id=1),
+                                Filme(id=1, titulo='Filme', duracao=120, classificacao='L'),
+                                Sessao(id=1, filme_id=1, sala_id=1, preco=25.0, horario=datetime(2025, 1, 1))])
+            db.session.flush()
+            db.session.execute(insert(Usuario.__table__), [
+                {'id': i, 'nome': f'Usuário {i}', 'email': f'u{i}@cinema.com', 'senha': '-'}
+                for i in range(1, concorrentes + 1)])
+            db.session.commit()
+
+        clientes = []
+        for usuario_id in range(1, concorrentes + 1):
+            cliente = app.test_client()
+            with cliente.session_transaction() as sessao:
+                sessao.update({'_user_id': str(usuario_id), '_fresh': True, 'usuario_id': usuario_id,
+                               'is_admin': False, 'usuario_versao': 1})
+            clientes.append(cliente)
+
+        resultado = {'disputas': assentos, 'pedidos': assentos * concorrentes, 'vencedores': 0, 'recusadas': 0,
+                     'erros': 0, 'status': {}, 'disputas_erradas': 0}
+        lock = threading.Lock()
+        largada = threading.Barrier(concorrentes)
+        vencedores = [0] * assentos
+
+        def disputar(cliente):
+            for indice in range(assentos):
+                largada.wait()  # Todos pedem o mesmo assento ao mesmo tempo
+                try:
+                    status = cliente.post('/api/v1/carrinho/assentos',
+                                          json={'sessao_id': 1, 'assento': rotulo_assento(indice)}).status_code
+                except Exception as erro:
+                    status = 'exceção'
+                    saida(f"Erro: {erro!r}")
+                with lock:
+                    resultado['status'][status] = resultado['status'].get(status, 0) + 1
+                    if status == 201:
+                        resultado['vencedores'] += 1
+                        vencedores[indice] += 1
+                    elif status == 409:
+                        resultado['recusadas'] += 1
+                    else:
+                        resultado['erros'] += 1
+
+        comeco = time.perf_counter()
+        trabalhadores = [threading.Thread(target=disputar, args=(cliente,)) for cliente in clientes]
+        for trabalhador in trabalhadores:
+            trabalhador.start()
+        for trabalhador in trabalhadores:
+            trabalhador.join()
+        duracao = time.perf_counter() - comeco
+
+        with app.app_context():
+            no_banco = db.session.query(ReservaAssento).count()
+        resultado['disputas_erradas'] = sum(1 for n in vencedores if n != 1)
+        resultado['por_segundo'] = resultado['pedidos'] / duracao
+
+        saida(f"{assentos} assentos, cada um disputado por {concorrentes} usuários ao mesmo tempo: "
+              f"{resultado['pedidos']} requisições em {duracao:.2f}s ({resultado['por_segundo']:.0f} por segundo)")
+        saida(f"Reservas feitas: {resultado['vencedores']}, recusadas (409): {resultado['recusadas']}, "
+              f"erros: {resultado['erros']}, no banco: {no_banco}")
+        if resultado['erros']:
+            saida(f"Respostas por status: {resultado['status']}")
+        if resultado['disputas_erradas']:
+            saida(f"ATENÇÃO: {resultado['disputas_erradas']} assentos sem exatamente um vencedor")
+        return resultado
+    finally:
+        with app.app_context():
+            db.engine.dispose()
+        for sufixo in ('', '-wal', '-shm'):
+            if os.path.exists(caminho + sufixo):
+                os.remove(caminho + sufixo)
+
+
+def registrar_comandos(app):
+    @app.cli.command('benchmark-reservas')
+    @click.option('--assentos', default=5, show_default=True, help='Assentos disputados, um por rodada.')
+    @click.option('--concorrentes', default=300, show_default=True, help='Usuários pedindo o mesmo assento.')
+    def benchmark_reservas_comando(assentos, concorrentes):
+        """Mede reservas concorrentes do mesmo assento pela API, em um banco SQLite temporário."""
+        resultado = medir_reservas(assentos, concorrentes, saida=click.echo)
+        if resultado['disputas_erradas'] or resultado['erros']:
+            raise click.ClickException('Reservas concorrentes inconsistentes')
@@ -0,0 +1,54 @@
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+from flask import make_response, render_template, request
+from markupsafe import Markup
+from .cache import cache_catalogo
+
+
+# Página já renderizada, guardada no cache do catálogo junto com seus cabeçalhos de validação
+class PaginaRenderizada:
+    def __init__(self, corpo, mimetype):
+        self.corpo = corpo
+        self.mimetype = mimetype
+        self.etag = hashlib.sha1(corpo).hexdigest()
+        self.modificada_em = datetime.now(timezone.utc).replace(microsecond=0)
+
+
+# Guarda a página inteira no cache, por rota + argumentos, na versão atual do grupo do catálogo.
+# Devolve ETag forte e Last-Modified e responde 304 quando o navegador já tem a versão atual.
+# Use apenas em páginas iguais para todos os usuários (sem mensagens flash nem dados do usuário).
+def pagina_em_cache(grupo):
+    def decorador(f):
+        @wraps(f)
+        def envolvida(*args, **kwargs):
+            chave = ('pagina', request.path, tuple(sorted(request.args.items(multi=True))))
+
+            def renderizar():
+                resposta = make_response(f(*args, **kwargs))
+                if resposta.status_code != 200:
+                    return resposta
+                return PaginaRenderizada(resposta.get_data(), resposta.mimetype)
+
+            pagina = cache_catalogo.obter(grupo, chave, renderizar)
+            if not isinstance(pagina, PaginaRenderizada):
+                cache_catalogo.descartar(grupo, chave)  # Redirecionamentos e erros não ficam no cache
+                return pagina
+
+            resposta = make_response(pagina.corpo)
+            resposta.mimetype = pagina.mimetype
+            resposta.set_etag(pagina.etag)
+            resposta.last_modified = pagina.modificada_em
+            resposta.cache_control.private = True
+            resposta.cache_control.no_cache = True  # O navegador sempre revalida com If-None-Match
+            return resposta.make_conditional(request)
+        return envolvida
+    return decorador
+
+
+# Renderiza um pedaço de template (ex.: uma linha da tabela de sessões) usando o cache do catálogo.
+# Disponível nos templates como {{ fragmento('sessoes', chave, '_linha_sessao.html', sessao=sessao) }}
+def fragmento(grupo, chave, nome_template, **contexto):
+    html = cache_catalogo.obter(grupo, ('fragmento', nome_template, chave),
+                                lambda: render_template(nome_template, **contexto))
+    return Markup(html)
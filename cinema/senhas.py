@@ -0,0 +1,142 @@
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, session
+from werkzeug.security import check_password_hash, generate_password_hash
+from . import db
+from .models import Usuario
+
+# Valores padrão (podem ser trocados na configuração do app)
+SENHA_THREADS = 4         # verificações de senha ao mesmo tempo
+SENHA_FILA = 32           # verificações aguardando uma thread livre
+SENHA_ESPERA = 5          # segundos esperando uma vaga antes de desistir
+REAUTENTICACAO_MINUTOS = 10
+
+
+class SenhasOcupadas(Exception):
+    """Muitas verificações de senha ao mesmo tempo; a requisição deve tentar de novo."""
+
+
+# Método de hash configurado (ex.: 'scrypt:32768:8:1' ou 'pbkdf2:sha256:600000'); None usa o padrão do werkzeug
+def _metodo():
+    return current_app.config.get('SENHA_METODO') or os.environ.get('CINEMA_SENHA_METODO')
+
+
+def _gerar(senha, metodo):
+    return generate_password_hash(senha, method=metodo) if metodo else generate_password_hash(senha)
+
+
+def gerar_hash(senha):
+    return _gerar(senha, _metodo())
+
+
+# O werkzeug grava o método já expandido ('scrypt' vira 'scrypt:32768:8:1', 'pbkdf2' vira
+# 'pbkdf2:sha256:1000000'): o prefixo esperado vem de um hash gerado uma vez com o método configurado
+_prefixos = {}
+
+
+def _prefixo(metodo):
+    prefixo = _prefixos.get(metodo)
+    if prefixo is None:
+        prefixo = _prefixos[metodo] = generate_password_hash('', method=metodo).split('$', 1)[0]
+    return prefixo
+
+
+# O hash foi gerado com parâmetros diferentes dos configurados agora?
+def precisa_rehash(senha_hash):
+    metodo = _metodo()
+    if not metodo or not senha_hash:
+        return False
+    return senha_hash.split('$', 1)[0] != _prefixo(metodo)
+
+
+_executor = None
+_vagas = None
+_lock = threading.Lock()
+
+
+def _pool():
+    global _executor, _vagas
+    with _lock:
+        if _executor is None:
+            threads = current_app.config.get('SENHA_THREADS', SENHA_THREADS)
+            fila = current_app.config.get('SENHA_FILA', SENHA_FILA)
+            _executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='senhas')
+            _vagas = threading.BoundedSemaphore(threads + fila)
+    return _executor, _vagas
+
+
+# Roda um cálculo de hash em um pool limitado de threads: no máximo SENHA_THREADS ao mesmo tempo,
+# e quando a fila enche a requisição desiste em vez de travar o worker.
+def _no_pool(funcao, *args):
+    executor, vagas = _pool()
+    if not vagas.acquire(timeout=current_app.config.get('SENHA_ESPERA', SENHA_ESPERA)):
+        raise SenhasOcupadas()
+    try:
+        return executor.submit(funcao, *args).result()
+    finally:
+        vagas.release()
+
+
+def verificar_senha(senha_hash, senha):
+    if not senha_hash:
+        return False
+    return _no_pool(check_password_hash, senha_hash, senha)
+
+
+# Login: confere a senha e, se os parâmetros de hash mudaram, gera o hash novo com a senha digitada.
+# O hash novo também é calculado no pool; se ele estiver cheio, fica para o próximo login.
+# O UPDATE direto não passa pelos eventos do modelo, então a versão do usuário não muda.
+def autenticar(usuario, senha):
+    if usuario is None or not verificar_senha(usuario.senha, senha):
+        return False
+    if precisa_rehash(usuario.senha):
+        try:
+            novo_hash = _no_pool(_gerar, senha, _metodo())
+        except SenhasOcupadas:
+            return True
+        db.session.execute(db.update(Usuario).where(Usuario.id == usuario.id).values(senha=novo_hash))
+        db.session.commit()
+    return True
+
+
+# Reautenticação recente: depois de uma confirmação de senha com o hash completo, guardamos por alguns
+# minutos um resumo HMAC da senha (com uma chave que só existe neste processo), ligado a um token na sessão.
+# As próximas confirmações do mesmo usuário comparam só o HMAC, sem repetir o hash lento.
+_chave_processo = secrets.token_bytes(32)
+_reautenticacoes = {}  # token -> (usuario_id, versao, resumo, expira_em)
+
+
+def _resumo(senha):
+    return hmac.new(_chave_processo, senha.encode('utf-8'), hashlib.sha256).digest()
+
+
+def _limpar_vencidas(agora):
+    for token in [t for t, r in _reautenticacoes.items() if r[3] <= agora]:
+        _reautenticacoes.pop(token, None)
+
+
+# Confirmação de senha usada pelas rotas de administração e de conta
+def confirmar_senha(usuario, senha):
+    agora = time.monotonic()
+    token = session.get('reautenticacao')
+    registro = _reautenticacoes.get(token) if token else None
+    if (registro and registro[0] == usuario.id and registro[1] == usuario.versao and registro[3] > agora
+            and hmac.compare_digest(registro[2], _resumo(senha))):
+        return True
+
+    senha_hash = db.session.execute(db.select(Usuario.senha).where(Usuario.id == usuario.id)).scalar()
+    if not verificar_senha(senha_hash, senha):
+        return False
+
+    minutos = current_app.config.get('REAUTENTICACAO_MINUTOS', REAUTENTICACAO_MINUTOS)
+    with _lock:
+        _limpar_vencidas(agora)
+        token = token if token in _reautenticacoes else secrets.token_urlsafe(16)
+        _reautenticacoes[token] = (usuario.id, usuario.versao, _resumo(senha), agora + minutos * 60)
+    session['reautenticacao'] = token
+    return True
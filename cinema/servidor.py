@@ -0,0 +1,193 @@
+import gc
+import json
+import os
+import resource
+import secrets
+import signal
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+import click
+from . import db
+
+# Requisições feitas por cada worker no benchmark antes de medir a memória (como um worker já em uso)
+CAMINHOS_AQUECIMENTO = ('/', '/login', '/cadastrar-se')
+
+
+# Carrega tudo que os workers vão usar antes do fork: templates compilados, manifesto dos estáticos
+# (já feito no create_app) e módulos importados. Depois congela os objetos no gc, para que as coletas
+# nos workers não escrevam nas páginas herdadas e a memória continue compartilhada (copy-on-write).
+def preaquecer(app):
+    for nome in app.jinja_env.list_templates():
+        app.jinja_env.get_template(nome)
+    gc.collect()
+    gc.freeze()
+    return app
+
+
+# O esquema do banco precisa estar na versão do código antes de atender (as sessões, por exemplo,
+# ficam na tabela sessao_web). Com migrar=True (CINEMA_MIGRAR=1) aplica as pendentes aqui: com o
+# preload do gunicorn isso roda uma vez só, no processo mestre, antes do fork.
+def verificar_esquema(app, migrar=False):
+    from .migracoes import aplicar_migracoes, migracoes_pendentes
+
+    with app.app_context():
+        pendentes = migracoes_pendentes()
+        if pendentes and migrar:
+            aplicar_migracoes()
+            pendentes = migracoes_pendentes()
+        db.engine.dispose()
+    if pendentes:
+        raise RuntimeError(f"Banco desatualizado: faltam as migrações {pendentes}. Rode `flask migrar` "
+                           "(ou inicie com CINEMA_MIGRAR=1)")
+    return app
+
+
+# Cada worker precisa das próprias conexões: as do pool herdado do processo pai são descartadas
+# sem fechar (o pai continua dono delas)
+def depois_do_fork(app):
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+# Modo com threads, sem gunicorn: um processo, uma thread por requisição. SIGTERM/SIGINT param de
+# aceitar conexões e esperam as requisições em andamento terminarem.
+def servir(app, host='0.0.0.0', porta=8000):
+    from werkzeug.serving import make_server
+
+    servidor = make_server(host, porta, app, threaded=True)
+    servidor.daemon_threads = False
+    servidor.block_on_close = True  # server_close() espera as threads das requisições
+
+    parar = threading.Event()
+    signal.signal(signal.SIGTERM, lambda sinal, quadro: parar.set())
+    signal.signal(signal.SIGINT, lambda sinal, quadro: parar.set())
+    threading.Thread(target=servidor.serve_forever, name='servidor', daemon=True).start()
+    print(f"Servindo em http://{host}:{servidor.server_port} (perfil {app.config['PERFIL']})", flush=True)
+    parar.wait()
+    servidor.shutdown()
+    servidor.server_close()
+
+
+# Memória do processo em kB. No Linux, o smaps_rollup separa o que é compartilhado com outros
+# processos (Pss divide as páginas compartilhadas entre eles) do que é só deste processo.
+def memoria_processo():
+    try:
+        with open('/proc/self/smaps_rollup') as arquivo:
+            campos = dict(linha.split(':', 1) for linha in arquivo if ':' in linha and not linha[0].isdigit())
+    except OSError:
+        return {'rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, 'pss': None, 'privada': None}
+    kb = {nome.strip(): int(valor.split()[0]) for nome, valor in campos.items()}
+    return {'rss': kb['Rss'], 'pss': kb['Pss'], 'privada': kb['Private_Clean'] + kb['Private_Dirty']}
+
+
+def _aquecer_worker(app):
+    cliente = app.test_client()
+    for caminho in CAMINHOS_AQUECIMENTO:
+        cliente.get(caminho)
+
+
+# Roda num processo novo, chamado pelo benchmark: mede o import do wsgi e, conforme o modo,
+# faz o papel de um worker ou do processo mestre que carrega o app e faz o fork dos workers
+def _processo_medido(modo, trabalhadores=0):
+    antes = time.perf_counter()
+    from wsgi import application
+    importacao = time.perf_counter() - antes
+
+    if modo == 'frio':
+        print(json.dumps({'importacao': importacao, **memoria_processo()}), flush=True)
+        return
+
+    if modo == 'trabalhador':  # Sem preload: cada worker carrega o app sozinho
+        _aquecer_worker(application)
+        print(json.dumps(memoria_processo()), flush=True)
+        sys.stdin.read()  # Fica vivo até o benchmark medir todos (o Pss depende de quem compartilha)
+        return
+
+    medidas, liberar = os.pipe(), os.pipe()
+    filhos = []
+    for _ in range(trabalhadores):
+        pid = os.fork()
+        if pid == 0:
+            os.close(medidas[0])
+            os.close(liberar[1])
+            depois_do_fork(application)
+            _aquecer_worker(application)
+            os.write(medidas[1], (json.dumps(memoria_processo()) + '\n').encode())
+            os.read(liberar[0], 1)  # Volta quando o mestre fecha o pipe
+            os._exit(0)
+        filhos.append(pid)
+    os.close(medidas[1])
+    os.close(liberar[0])
+    with os.fdopen(medidas[0]) as leitura:
+        resultado = [json.loads(leitura.readline()) for _ in filhos]
+    os.close(liberar[1])
+    for pid in filhos:
+        os.waitpid(pid, 0)
+    print(json.dumps({'mestre': memoria_processo(), 'trabalhadores': resultado}), flush=True)
+
+
+def _comando(modo, trabalhadores=0):
+    return [sys.executable, '-c', 'import sys; from cinema.servidor import _processo_medido; '
+            f'_processo_medido({modo!r}, {trabalhadores})']
+
+
+def _somar(medidas, campo):
+    valores = [m[campo] for m in medidas]
+    return None if None in valores else sum(valores)
+
+
+# Benchmark de inicialização: tempo de um processo novo até o app estar pronto, e memória de
+# `trabalhadores` workers com e sem preload (fork depois de carregar o app)
+def medir_inicio(raiz, trabalhadores=4, repeticoes=3, saida=print):
+    ambiente = dict(os.environ, CINEMA_PERFIL=os.environ.get('CINEMA_PERFIL') or 'producao')
+    ambiente.setdefault('CINEMA_SECRET_KEY', secrets.token_hex(32))  # Só para os processos medidos
+
+    tempos, importacoes, rss = [], [], []
+    for _ in range(repeticoes):
+        antes = time.perf_counter()
+        processo = subprocess.run(_comando('frio'), cwd=raiz, env=ambiente, capture_output=True, text=True, check=True)
+        tempos.append(time.perf_counter() - antes)
+        medida = json.loads(processo.stdout.splitlines()[-1])
+        importacoes.append(medida['importacao'])
+        rss.append(medida['rss'])
+    saida(f"Início a frio: {statistics.median(tempos) * 1000:.0f} ms até o app ficar pronto "
+          f"({statistics.median(importacoes) * 1000:.0f} ms no import do wsgi), {statistics.median(rss) / 1024:.1f} MB")
+
+    processos = [subprocess.Popen(_comando('trabalhador'), cwd=raiz, env=ambiente, stdin=subprocess.PIPE,
+                                  stdout=subprocess.PIPE, text=True) for _ in range(trabalhadores)]
+    try:
+        sem_preload = [json.loads(p.stdout.readline()) for p in processos]
+    finally:
+        for processo in processos:
+            processo.stdin.close()
+            processo.wait()
+
+    processo = subprocess.run(_comando('preload', trabalhadores), cwd=raiz, env=ambiente, capture_output=True,
+                              text=True, check=True)
+    com_preload = json.loads(processo.stdout.splitlines()[-1])
+
+    def mostrar(nome, medidas, extra=None):
+        partes = [f"{nome}: {len(medidas)} workers, Rss {statistics.mean(m['rss'] for m in medidas) / 1024:.1f} MB cada"]
+        if medidas[0]['pss'] is not None:
+            total = _somar(medidas, 'pss') + (extra['pss'] if extra else 0)
+            partes.append(f"privada {statistics.mean(m['privada'] for m in medidas) / 1024:.1f} MB cada, "
+                          f"Pss total {total / 1024:.1f} MB")
+        saida(', '.join(partes))
+
+    mostrar('Sem preload', sem_preload)
+    mostrar('Com preload', com_preload['trabalhadores'], com_preload['mestre'])
+    return {'inicio_s': statistics.median(tempos), 'importacao_s': statistics.median(importacoes),
+            'sem_preload': sem_preload, 'com_preload': com_preload}
+
+
+def registrar_comandos(app):
+    @app.cli.command('benchmark-inicio')
+    @click.option('--trabalhadores', default=4, show_default=True, help='Workers simulados.')
+    @click.option('--repeticoes', default=3, show_default=True, help='Inícios a frio medidos.')
+    def benchmark_inicio_comando(trabalhadores, repeticoes):
+        """Mede o tempo de início do wsgi.py e a memória por worker, com e sem preload."""
+        medir_inicio(os.path.dirname(app.root_path), trabalhadores, repeticoes, saida=click.echo)
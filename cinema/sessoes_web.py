@@ -0,0 +1,327 @@
+import hashlib
+import marshal
+import os
+import re
+import secrets
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import click
+from flask import session
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from sqlalchemy import bindparam, delete, insert, select, update
+from werkzeug.datastructures import CallbackDict
+from . import db
+from .config import _env_int
+from .models import SessaoWeb
+
+# Onde ficam as sessões: banco (tabela sessao_web, compartilhada entre processos), memoria (um processo só)
+# ou cookie (a sessão assinada padrão do Flask)
+ARMAZENS = ('banco', 'memoria', 'cookie')
+
+MAX_SESSOES_MEMORIA = 100000
+VARREDURA_SEGUNDOS = 300  # Intervalo mínimo entre duas varreduras das sessões vencidas
+RENOVAR_APOS = 0.1  # Fração da validade: só grava uma nova expiração depois que 10% dela já passou
+
+_ID_VALIDO = re.compile(r'[A-Za-z0-9_-]{43}')
+
+
+# Formato compacto dos dados: marshal (binário, rápido, só tipos básicos) com um byte de formato.
+# Tipos que o marshal não aceita (ex.: Markup numa mensagem flash) vão no JSON com marcação de tipos
+# que o Flask usa no cookie da sessão. Nada de pickle: quem conseguisse escrever na tabela sessao_web
+# poderia executar código ao ter a sessão lida.
+_json = TaggedJSONSerializer()
+
+
+def serializar(dados):
+    try:
+        return b'm' + marshal.dumps(dados)
+    except ValueError:
+        return b'j' + _json.dumps(dados).encode('utf-8')
+
+
+def desserializar(bruto):
+    try:
+        if bruto[:1] == b'm':
+            return marshal.loads(bruto[1:])
+        if bruto[:1] == b'j':
+            return _json.loads(bruto[1:].decode('utf-8'))
+    except (ValueError, EOFError, TypeError):
+        pass  # Ex.: gravado por outra versão do Python; a sessão recomeça vazia
+    return None  # Formatos desconhecidos (inclusive o pickle das versões antigas) também
+
+
+def _chave(sid):
+    return hashlib.sha256(sid.encode()).hexdigest()
+
+
+class SessaoServidor(CallbackDict, SessionMixin):
+    def __init__(self, dados=None, sid=None, expira_em=None):
+        def ao_mudar(sessao):
+            sessao.modified = True
+            sessao.accessed = True
+
+        super().__init__(dados, ao_mudar)
+        self.sid = sid
+        self.expira_em = expira_em
+        self.sid_antigo = None
+        self.modified = False
+        self.accessed = False
+
+    def __getitem__(self, chave):
+        self.accessed = True
+        return super().__getitem__(chave)
+
+    def get(self, chave, padrao=None):
+        self.accessed = True
+        return super().get(chave, padrao)
+
+    def setdefault(self, chave, padrao=None):
+        self.accessed = True
+        return super().setdefault(chave, padrao)
+
+    # Troca o id mantendo os dados (no login: um id conhecido antes dele não serve depois)
+    def regenerar(self):
+        if self.sid is not None:
+            self.sid_antigo = self.sid
+        self.sid = None
+        self.modified = True
+
+
+class _Armazem:
+    def __init__(self):
+        self._proxima_varredura = time.monotonic() + VARREDURA_SEGUNDOS
+        self._lock_varredura = threading.Lock()
+
+    # Chamado ao gravar: no máximo uma varredura por intervalo em cada processo
+    def talvez_varrer(self):
+        if time.monotonic() < self._proxima_varredura or not self._lock_varredura.acquire(blocking=False):
+            return
+        try:
+            self._proxima_varredura = time.monotonic() + VARREDURA_SEGUNDOS
+            self.varrer()
+        finally:
+            self._lock_varredura.release()
+
+
+# Sessões em memória com limite LRU. Só serve com um processo (ex.: python wsgi.py ou o servidor do Flask)
+class ArmazemMemoria(_Armazem):
+    def __init__(self, max_itens=MAX_SESSOES_MEMORIA):
+        super().__init__()
+        self.max_itens = max_itens
+        self._itens = OrderedDict()  # chave -> (expira_em, dados serializados)
+        self._lock = threading.Lock()
+
+    def carregar(self, chave):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            if item[0] <= datetime.utcnow():
+                del self._itens[chave]
+                return None
+            self._itens.move_to_end(chave)
+        return desserializar(item[1]), item[0]
+
+    def gravar(self, chave, bruto, expira_em, nova):
+        with self._lock:
+            self._itens[chave] = (expira_em, bruto)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def renovar(self, chave, expira_em):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is not None:
+                self._itens[chave] = (expira_em, item[1])
+
+    def apagar(self, chave):
+        with self._lock:
+            self._itens.pop(chave, None)
+
+    def varrer(self):
+        agora = datetime.utcnow()
+        with self._lock:
+            vencidas = [chave for chave, (expira_em, _) in self._itens.items() if expira_em <= agora]
+            for chave in vencidas:
+                del self._itens[chave]
+        return len(vencidas)
+
+
+# Sessões na tabela sessao_web: uma busca pela chave primária por requisição, e escrita só quando
+# a sessão muda ou a expiração precisa ser renovada. Usa conexões próprias, fora da transação da rota.
+class ArmazemBanco(_Armazem):
+    _tabela = SessaoWeb.__table__
+    _buscar = select(_tabela.c.dados, _tabela.c.expira_em).where(
+        _tabela.c.id == bindparam('chave'), _tabela.c.expira_em > bindparam('agora'))
+    _inserir = insert(_tabela).values(id=bindparam('chave'), dados=bindparam('dados'), expira_em=bindparam('expira_em'))
+    _atualizar = update(_tabela).where(_tabela.c.id == bindparam('chave')).values(
+        dados=bindparam('dados'), expira_em=bindparam('expira_em'))
+    _renovar = update(_tabela).where(_tabela.c.id == bindparam('chave')).values(expira_em=bindparam('expira_em'))
+    _apagar = delete(_tabela).where(_tabela.c.id == bindparam('chave'))
+
+    def carregar(self, chave):
+        with db.engine.connect() as conexao:
+            linha = conexao.execute(self._buscar, {'chave': chave, 'agora': datetime.utcnow()}).first()
+        if linha is None:
+            return None
+        return desserializar(linha.dados), linha.expira_em
+
+    def gravar(self, chave, bruto, expira_em, nova):
+        parametros = {'chave': chave, 'dados': bruto, 'expira_em': expira_em}
+        with db.engine.begin() as conexao:
+            # A linha pode ter sido varrida entre a leitura e a gravação: nesse caso, insere de novo
+            if nova or conexao.execute(self._atualizar, parametros).rowcount == 0:
+                conexao.execute(self._inserir, parametros)
+
+    def renovar(self, chave, expira_em):
+        with db.engine.begin() as conexao:
+            conexao.execute(self._renovar, {'chave': chave, 'expira_em': expira_em})
+
+    def apagar(self, chave):
+        with db.engine.begin() as conexao:
+            conexao.execute(self._apagar, {'chave': chave})
+
+    def varrer(self):
+        with db.engine.begin() as conexao:
+            return conexao.execute(delete(self._tabela).where(self._tabela.c.expira_em <= datetime.utcnow())).rowcount
+
+
+# Sessão no servidor: o cookie leva só um id aleatório de 256 bits, sem dados e sem assinatura
+class InterfaceSessaoServidor(SessionInterface):
+    def __init__(self, armazem):
+        self.armazem = armazem
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid and _ID_VALIDO.fullmatch(sid):
+            encontrada = self.armazem.carregar(_chave(sid))
+            if encontrada is not None and encontrada[0] is not None:
+                return SessaoServidor(encontrada[0], sid, encontrada[1])
+        return SessaoServidor()
+
+    def save_session(self, app, sessao, resposta):
+        nome = self.get_cookie_name(app)
+        dominio = self.get_cookie_domain(app)
+        caminho = self.get_cookie_path(app)
+        if sessao.accessed:
+            resposta.vary.add('Cookie')
+        if sessao.sid_antigo is not None:
+            self.armazem.apagar(_chave(sessao.sid_antigo))
+
+        if not sessao:
+            if sessao.sid is not None or sessao.sid_antigo is not None:  # Logout: apaga no servidor e no navegador
+                if sessao.sid is not None:
+                    self.armazem.apagar(_chave(sessao.sid))
+                resposta.delete_cookie(nome, domain=dominio, path=caminho, secure=self.get_cookie_secure(app),
+                                       samesite=self.get_cookie_samesite(app), httponly=self.get_cookie_httponly(app))
+            return
+
+        agora = datetime.utcnow()
+        validade = app.permanent_session_lifetime
+        expira_em = agora + validade
+        if sessao.sid is None:
+            sessao.sid = secrets.token_urlsafe(32)
+            self.armazem.gravar(_chave(sessao.sid), serializar(dict(sessao)), expira_em, nova=True)
+        elif sessao.modified:
+            self.armazem.gravar(_chave(sessao.sid), serializar(dict(sessao)), expira_em, nova=False)
+        elif sessao.expira_em is not None and sessao.expira_em - agora < validade * (1 - RENOVAR_APOS):
+            self.armazem.renovar(_chave(sessao.sid), expira_em)
+        else:
+            return  # Nada mudou: nem escrita no servidor nem Set-Cookie
+        self.armazem.talvez_varrer()
+
+        resposta.set_cookie(nome, sessao.sid, expires=self.get_expiration_time(app, sessao),
+                            httponly=self.get_cookie_httponly(app), domain=dominio, path=caminho,
+                            secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app))
+
+
+# Troca o id da sessão depois do login (contra fixação de sessão). Na sessão em cookie não há id para trocar.
+def regenerar_sessao():
+    if isinstance(session._get_current_object(), SessaoServidor):
+        session.regenerar()
+
+
+def configurar_sessoes(app):
+    tipo = app.config.setdefault('SESSAO_ARMAZEM', os.environ.get('CINEMA_SESSOES') or 'banco')
+    if tipo not in ARMAZENS:
+        raise ValueError(f"Armazém de sessões desconhecido: {tipo} (use {', '.join(ARMAZENS)})")
+    if tipo == 'cookie':
+        return None
+    if tipo == 'memoria':
+        armazem = ArmazemMemoria(app.config.get('SESSAO_MAX_MEMORIA',
+                                                _env_int('CINEMA_SESSOES_MAX', MAX_SESSOES_MEMORIA)))
+    else:
+        armazem = ArmazemBanco()
+    app.session_interface = InterfaceSessaoServidor(armazem)
+    return armazem
+
+
+# Benchmark: custo da sessão por requisição e tamanho do cookie em cada armazém, num SQLite temporário.
+# Cada requisição lê o usuário e o carrinho; uma em cada `escritas` também grava (como um flash).
+def medir_sessoes(requisicoes, escritas=5, saida=print):
+    from . import create_app
+
+    resultados = {}
+    for tipo in ARMAZENS:
+        caminho = os.path.join(tempfile.mkdtemp(), 'sessoes.db')
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{caminho}', 'SESSAO_ARMAZEM': tipo})
+
+        @app.route('/entrar')
+        def entrar():
+            session.update(usuario_id=12345, is_admin=False, usuario_versao=3, carrinho_id=6789,
+                           _user_id='12345', _fresh=True, _id=secrets.token_hex(64))
+            return ''
+
+        @app.route('/pagina/<int:n>')
+        def pagina(n):
+            lido = (session.get('usuario_id'), session.get('carrinho_id'), session.get('is_admin'))
+            if n % escritas == 0:
+                session['_flashes'] = [('success', f'Item {n} adicionado ao carrinho com sucesso!')]
+            elif '_flashes' in session:
+                session.pop('_flashes')
+            return str(lido)
+
+        try:
+            with app.app_context():
+                db.create_all()
+            cliente = app.test_client()
+            cliente.get('/entrar')
+            cookie = cliente.get_cookie(app.config['SESSION_COOKIE_NAME'])
+            antes = time.perf_counter()
+            for n in range(1, requisicoes + 1):
+                cliente.get(f'/pagina/{n}')
+            resultados[tipo] = ((time.perf_counter() - antes) / requisicoes, len(cookie.value))
+        finally:
+            with app.app_context():
+                db.engine.dispose()
+            for sufixo in ('', '-wal', '-shm'):
+                if os.path.exists(caminho + sufixo):
+                    os.remove(caminho + sufixo)
+
+    for tipo, (segundos, tamanho) in resultados.items():
+        saida(f"{tipo:<8} {segundos * 1e6:8.0f} µs por requisição, cookie de {tamanho} bytes")
+    return resultados
+
+
+def registrar_comandos(app):
+    @app.cli.command('varrer-sessoes')
+    def varrer_sessoes_comando():
+        """Apaga as sessões vencidas guardadas no servidor."""
+        interface = app.session_interface
+        if not isinstance(interface, InterfaceSessaoServidor):
+            click.echo("As sessões estão em cookie; nada a varrer.")
+            return
+        click.echo(f"{interface.armazem.varrer()} sessões vencidas apagadas.")
+
+    @app.cli.command('benchmark-sessoes')
+    @click.option('--requisicoes', default=2000, show_default=True)
+    @click.option('--escritas', default=5, show_default=True, help='Uma requisição em N altera a sessão.')
+    def benchmark_sessoes_comando(requisicoes, escritas):
+        """Compara sessões em cookie, em memória e no banco (tempo por requisição e tamanho do cookie)."""
+        medir_sessoes(requisicoes, escritas, saida=click.echo)
@@ -0,0 +1,29 @@
+# Configuração do gunicorn para produção: gunicorn -c gunicorn.conf.py
+import multiprocessing
+import os
+
+wsgi_app = 'wsgi:application'
+bind = os.environ.get('CINEMA_BIND', '0.0.0.0:8000')
+
+# Processos x threads: o SQLite aguenta bem poucos escritores, então poucos processos com algumas threads
+workers = int(os.environ.get('CINEMA_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('CINEMA_THREADS', 4))
+worker_class = 'gthread'
+
+# Carrega o app (e os templates) no mestre antes do fork: os workers compartilham essa memória
+preload_app = True
+
+timeout = 60
+graceful_timeout = 30  # Tempo para terminar as requisições em andamento num restart ou TERM
+keepalive = 5
+max_requests = 5000  # Recicla os workers aos poucos (vazamentos de memória não se acumulam)
+max_requests_jitter = 500
+
+accesslog = os.environ.get('CINEMA_ACCESS_LOG')  # '-' para a saída padrão
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    from cinema.servidor import depois_do_fork
+    from wsgi import application
+    depois_do_fork(application)
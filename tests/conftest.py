@@ -0,0 +1,57 @@
+import os
+import tempfile
+from datetime import datetime
+
+import pytest
+
+# O app.py cria o app ao ser importado: o banco dos testes precisa estar no ambiente antes disso
+_diretorio = tempfile.mkdtemp(prefix='cinema-testes-')
+os.environ['CINEMA_DATABASE_URI'] = 'sqlite:///' + os.path.join(_diretorio, 'testes.db')
+os.environ['CINEMA_SESSOES'] = 'memoria'
+os.environ.pop('CINEMA_PERFIL', None)
+
+
+@pytest.fixture
+def app():
+    from app import app as aplicacao
+    from cinema import db
+    from cinema.cache import cache_catalogo
+    from cinema.models import Cinema, Filme, Sala, Usuario
+
+    with aplicacao.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add_all([Cinema(id=1, nome='Cinema', local='Centro', capacidade=1000),
+                            Sala(id=1, numero='1', capacidade=100, cinema_id=1),
+                            Filme(id=1, titulo='Filme', duracao=120, classificacao='L')])
+        db.session.add(Usuario('Cliente', 'cliente@cinema.com', '-', datetime(2000, 1, 1).date()))
+        db.session.commit()
+    cache_catalogo.limpar()
+    yield aplicacao
+    with aplicacao.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+# Cliente de teste já logado como o usuário 1
+@pytest.fixture
+def cliente(app):
+    cliente = app.test_client()
+    with cliente.session_transaction() as sessao:
+        sessao['_user_id'] = '1'
+        sessao['_fresh'] = True
+        sessao['usuario_id'] = 1
+        sessao['is_admin'] = False
+        sessao['usuario_versao'] = 1
+    return cliente
+
+
+# Invalidações compartilhadas em arquivo, como no perfil producao (um diretório para todos os workers)
+@pytest.fixture
+def backend_compartilhado(tmp_path):
+    from cinema.cache import BackendArquivo, cache_catalogo
+
+    anterior = cache_catalogo.backend
+    cache_catalogo.backend = BackendArquivo(str(tmp_path))
+    yield str(tmp_path)
+    cache_catalogo.backend = anterior
@@ -0,0 +1,47 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+
+from cinema import db
+from cinema.assentos import _grupo
+from cinema.cache import BackendArquivo
+from cinema.models import AssentoComprado, Sessao
+
+
+@pytest.fixture
+def sessao_id(app):
+    with app.app_context():
+        db.session.add(Sessao(id=7, filme_id=1, sala_id=1, preco=25.0, horario=datetime(2025, 1, 1, 20)))
+        db.session.commit()
+    return 7
+
+
+def _ocupados(cliente, sessao_id):
+    resposta = cliente.get(f'/api/v1/sessoes/{sessao_id}/assentos')
+    assert resposta.status_code == 200
+    return resposta.get_json()['ocupados']
+
+
+# Venda feita em outro worker: o INSERT não passa por este processo, só a versão publicada no diretório
+def test_venda_em_outro_worker_aparece_no_mapa(app, cliente, backend_compartilhado, sessao_id):
+    assert _ocupados(cliente, sessao_id) == []  # Mapa fica em memória neste processo
+
+    with app.app_context():
+        db.session.execute(text("INSERT INTO assento_comprado (sessao_id, assento) VALUES (7, 'A3')"))
+        db.session.commit()
+    assert _ocupados(cliente, sessao_id) == []  # Sem aviso, o mapa em memória ainda vale
+    BackendArquivo(backend_compartilhado).publicar(_grupo(sessao_id))
+
+    assert _ocupados(cliente, sessao_id) == ['A3']
+
+
+def test_venda_neste_worker_publica_a_versao(app, cliente, backend_compartilhado, sessao_id):
+    _ocupados(cliente, sessao_id)
+    antes = BackendArquivo(backend_compartilhado).versao(_grupo(sessao_id))
+    with app.app_context():
+        db.session.add(AssentoComprado(sessao_id=sessao_id, assento='B1'))
+        db.session.commit()
+
+    assert BackendArquivo(backend_compartilhado).versao(_grupo(sessao_id)) != antes
+    assert _ocupados(cliente, sessao_id) == ['B1']
@@ -0,0 +1,35 @@
+import pytest
+
+from cinema import db
+from cinema.models import Alimento, Carrinho, CompraAlimento
+
+
+@pytest.fixture
+def pipoca(app):
+    with app.app_context():
+        db.session.add(Alimento(id=1, nome='Pipoca', preco=15.0))
+        db.session.commit()
+    return 1
+
+
+def _carrinho(app):
+    with app.app_context():
+        carrinho = db.session.query(Carrinho).filter_by(usuario_id=1).first()
+        itens = db.session.query(CompraAlimento).count()
+        return (carrinho.total if carrinho else 0.0), itens
+
+
+@pytest.mark.parametrize('quantidade', ['0', '-3', 'abc', ''])
+def test_quantidade_invalida_nao_entra_no_carrinho(app, cliente, pipoca, quantidade):
+    resposta = cliente.post('/adicionar_alimento_carrinho', data={'alimento_id': pipoca, 'quantidade': quantidade})
+
+    assert resposta.status_code == 302
+    assert resposta.headers['Location'].endswith('/adicionar_alimento_carrinho')
+    assert _carrinho(app) == (0.0, 0)
+
+
+def test_quantidade_valida_atualiza_total(app, cliente, pipoca):
+    resposta = cliente.post('/adicionar_alimento_carrinho', data={'alimento_id': pipoca, 'quantidade': '2'})
+
+    assert resposta.status_code == 302
+    assert _carrinho(app) == (30.0, 1)
@@ -0,0 +1,39 @@
+import pytest
+
+from cinema import create_app
+
+BANCO = {'SQLALCHEMY_DATABASE_URI': 'sqlite://'}
+
+
+def test_producao_exige_chave_secreta(monkeypatch):
+    monkeypatch.setenv('CINEMA_PERFIL', 'producao')
+    monkeypatch.delenv('CINEMA_SECRET_KEY', raising=False)
+    with pytest.raises(RuntimeError, match='CINEMA_SECRET_KEY'):
+        create_app(BANCO)
+
+    monkeypatch.setenv('CINEMA_SECRET_KEY', 'chave-de-teste')
+    assert create_app(BANCO).secret_key == 'chave-de-teste'
+
+
+def test_esquema_desatualizado_impede_inicio(tmp_path):
+    from cinema.migracoes import migracoes_pendentes
+    from cinema.servidor import verificar_esquema
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'vazio.db'}"})
+    with pytest.raises(RuntimeError, match='flask migrar'):
+        verificar_esquema(app)
+    verificar_esquema(app, migrar=True)
+    with app.app_context():
+        assert migracoes_pendentes() == []
+
+
+# O busy_timeout é de cada engine: criar outro app não muda o das conexões do primeiro
+def test_busy_timeout_por_app(tmp_path):
+    from cinema import db
+
+    lento = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'lento.db'}", 'SQLITE_BUSY_TIMEOUT': 60000})
+    rapido = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'rapido.db'}", 'SQLITE_BUSY_TIMEOUT': 250})
+    for app, esperado in ((lento, 60000), (rapido, 250)):
+        with app.app_context():
+            assert db.session.execute(db.text('PRAGMA busy_timeout')).scalar() == esperado
+            assert db.session.execute(db.text('PRAGMA journal_mode')).scalar() == 'wal'
@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, insert
+
+from cinema import db
+from cinema.cache import cache_catalogo
+from cinema.models import Filme, Sala, Sessao
+
+
+# Cada sessão com filme e sala próprios: um carregamento preguiçoso apareceria como uma consulta por linha
+def _criar_sessoes(app, quantidade):
+    with app.app_context():
+        inicio = db.session.query(db.func.max(Filme.id)).scalar() + 1
+        ids = range(inicio, inicio + quantidade)
+        db.session.execute(insert(Filme.__table__), [
+            {'id': i, 'titulo': f'Filme {i}', 'duracao': 120, 'classificacao': 'L'} for i in ids])
+        db.session.execute(insert(Sala.__table__), [
+            {'id': i, 'numero': str(i), 'capacidade': 100, 'cinema_id': 1} for i in ids])
+        db.session.execute(insert(Sessao.__table__), [
+            {'filme_id': i, 'sala_id': i, 'preco': 25.0, 'horario': datetime(2025, 1, 1) + timedelta(hours=3 * i)}
+            for i in ids])
+        db.session.commit()
+
+
+# Quantidade de comandos SQL executados para renderizar a página, sem usar o cache do catálogo
+def _consultas_na_pagina(app, cliente, caminho):
+    cache_catalogo.limpar()
+    comandos = []
+
+    def contar(conn, cursor, statement, parameters, context, executemany):
+        comandos.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', contar)
+    try:
+        resposta = cliente.get(caminho)
+    finally:
+        event.remove(engine, 'before_cursor_execute', contar)
+    assert resposta.status_code == 200
+    return comandos
+
+
+# A listagem traz filme e sala no mesmo SELECT: o número de consultas não depende de quantas sessões há
+def test_listar_sessoes_nao_faz_consulta_por_linha(app, cliente):
+    _criar_sessoes(app, 1)
+    _consultas_na_pagina(app, cliente, '/sessoes')  # Aquece o cache de usuários e as conexões
+    com_uma = _consultas_na_pagina(app, cliente, '/sessoes')
+
+    _criar_sessoes(app, 29)
+    com_varias = _consultas_na_pagina(app, cliente, '/sessoes')
+
+    assert cliente.get('/sessoes').data.count(b'<tr') == 31  # Cabeçalho e as 30 sessões
+    assert len(com_varias) == len(com_uma), com_varias
@@ -0,0 +1,59 @@
+from sqlalchemy import event, text
+
+from cinema import db
+from cinema.cache import BackendArquivo, cache_catalogo
+from cinema.identidade import GRUPO_USUARIOS
+
+
+def _consultas_de_usuario(app, cliente, caminho):
+    comandos = []
+
+    def contar(conn, cursor, statement, parameters, context, executemany):
+        comandos.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', contar)
+    try:
+        resposta = cliente.get(caminho)
+    finally:
+        event.remove(engine, 'before_cursor_execute', contar)
+    return resposta, [c for c in comandos if 'FROM usuario' in c]
+
+
+def test_usuario_em_cache_nao_consulta_o_banco(app, cliente, backend_compartilhado):
+    cliente.get('/sessoes')
+    resposta, consultas = _consultas_de_usuario(app, cliente, '/sessoes')
+    assert resposta.status_code == 200
+    assert consultas == []
+
+
+def test_troca_de_senha_em_outro_worker_derruba_a_sessao(app, cliente, backend_compartilhado):
+    assert cliente.get('/sessoes').status_code == 200  # Usuário fica no cache deste processo
+
+    # Outro worker trocou a senha: grava a versão nova e publica no diretório compartilhado
+    with app.app_context():
+        db.session.execute(text("UPDATE usuario SET versao = versao + 1 WHERE id = 1"))
+        db.session.commit()
+    BackendArquivo(backend_compartilhado).publicar(GRUPO_USUARIOS)
+
+    resposta = cliente.get('/sessoes')
+    assert resposta.status_code == 302
+    assert '/login' in resposta.headers['Location']
+
+
+def test_alteracao_pelo_orm_publica_a_invalidacao(app, cliente, backend_compartilhado):
+    from cinema.models import Usuario
+
+    antes = cache_catalogo.backend.versao(GRUPO_USUARIOS)
+    with app.app_context():
+        db.session.get(Usuario, 1).senha = 'outro-hash'
+        db.session.commit()
+    assert BackendArquivo(backend_compartilhado).versao(GRUPO_USUARIOS) != antes
+    assert cliente.get('/sessoes').status_code == 302
+
+
+def test_sessao_sem_versao_nao_vale(app, cliente):
+    with cliente.session_transaction() as sessao:
+        del sessao['usuario_versao']
+    assert cliente.get('/sessoes').status_code == 302
@@ -0,0 +1,32 @@
+from cinema import db
+from cinema.importacao import importar
+from cinema.models import Sala, Sessao
+
+
+def _linha(id, horario, sala_id=1):
+    return {'id': id, 'filme_id': 1, 'sala_id': sala_id, 'horario': horario, 'preco': 25}
+
+
+# Um lote rejeitado pelo banco não pode deixar as suas sessões na agenda usada para as linhas seguintes
+def test_lote_rejeitado_sai_da_agenda(app):
+    with app.app_context():
+        db.session.add(Sala(id=2, numero='2', capacidade=100, cinema_id=1))
+        db.session.commit()
+        linhas = [
+            _linha(1, '2025-01-01 14:00'),
+            _linha(1, '2025-01-01 14:00', sala_id=2),  # Mesmo id: o INSERT do primeiro lote falha
+            _linha(3, '2025-01-01 14:00'),  # Mesmo horário da sessão rejeitada, agora livre
+        ]
+        importadas, erros = importar('sessoes', linhas, tamanho_lote=2)
+
+        assert importadas == 1
+        assert len(erros) == 1 and 'rejeitado' in erros[0][1]
+        assert [(s.id, s.sala_id) for s in db.session.query(Sessao)] == [(3, 1)]
+
+
+def test_conflito_dentro_do_arquivo(app):
+    with app.app_context():
+        importadas, erros = importar('sessoes', [_linha(1, '2025-01-01 14:00'), _linha(2, '2025-01-01 15:00')])
+
+        assert importadas == 1
+        assert 'conflito de horário' in erros[0][1]
@@ -0,0 +1,34 @@
+from sqlalchemy import or_
+
+from cinema import db
+from cinema.models import Filme, Usuario
+from cinema.paginacao import criar_indices_prefixo, filtro_prefixo
+
+
+def _plano(consulta):
+    sql = consulta.compile(db.engine)
+    cursor = db.session.connection().connection.cursor()
+    linhas = cursor.execute('EXPLAIN QUERY PLAN ' + str(sql), [sql.params[k] for k in sql.positiontup]).fetchall()
+    return ' | '.join(linha[-1] for linha in linhas)
+
+
+# No SQLite o LIKE só vira busca no índice com COLLATE NOCASE (criado pela migração 10)
+def test_filtro_prefixo_usa_indice_nocase(app):
+    with app.app_context():
+        with db.engine.begin() as conexao:
+            criar_indices_prefixo(conexao)
+
+        assert 'SEARCH filme USING COVERING INDEX ix_filme_titulo_nocase' in \
+            _plano(db.select(Filme.id).where(filtro_prefixo(Filme.titulo, 'Mat_%')))
+        plano = _plano(db.select(Usuario.id).where(
+            or_(filtro_prefixo(Usuario.nome, 'ana'), filtro_prefixo(Usuario.email, 'ana'))))
+        assert 'ix_usuario_nome_nocase' in plano and 'ix_usuario_email_nocase' in plano
+
+
+def test_filtro_prefixo_trata_curingas_como_texto(app):
+    with app.app_context():
+        db.session.add_all([Filme(titulo='50% de desconto', duracao=90, classificacao='L'),
+                            Filme(titulo='500 dias', duracao=90, classificacao='L')])
+        db.session.commit()
+        titulos = db.session.execute(db.select(Filme.titulo).where(filtro_prefixo(Filme.titulo, '50%'))).scalars()
+        assert list(titulos) == ['50% de desconto']
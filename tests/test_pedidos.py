@@ -0,0 +1,34 @@
+import pytest
+
+from cinema import db
+from cinema.models import Alimento, Pedido
+from cinema.pedidos import finalizar_compra
+
+
+@pytest.fixture
+def carrinho_com_pipoca(app, cliente):
+    with app.app_context():
+        db.session.add(Alimento(id=1, nome='Pipoca', preco=15.0))
+        db.session.commit()
+    cliente.post('/adicionar_alimento_carrinho', data={'alimento_id': 1, 'quantidade': '2'})
+
+
+def test_checkout_pela_rota(app, cliente, carrinho_com_pipoca):
+    resposta = cliente.post('/finalizar_compra', data={'chave': 'compra-1'})
+    assert resposta.status_code == 302
+    cliente.post('/finalizar_compra', data={'chave': 'compra-1'})  # Reenvio do formulário
+
+    with app.app_context():
+        pedidos = db.session.query(Pedido).all()
+        assert [(p.chave, p.total) for p in pedidos] == [('compra-1', 30.0)]
+
+
+# Alterações pendentes de quem chamou não podem ser gravadas (nem descartadas) em silêncio pelo checkout
+def test_checkout_recusa_alteracoes_pendentes(app, cliente, carrinho_com_pipoca):
+    with app.app_context():
+        db.session.add(Alimento(id=2, nome='Refrigerante', preco=8.0))
+        with pytest.raises(RuntimeError):
+            finalizar_compra(1, 'compra-2')
+        db.session.rollback()
+        assert db.session.get(Alimento, 2) is None
+        assert db.session.query(Pedido).count() == 0
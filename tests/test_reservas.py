@@ -0,0 +1,12 @@
+from cinema.reservas import medir_reservas
+
+
+# Centenas de usuários pedindo o mesmo assento ao mesmo tempo pela API: só o INSERT de um passa pelo
+# índice único, os outros recebem 409 e nenhuma requisição termina em erro
+def test_reserva_concorrente_tem_um_vencedor_por_assento():
+    resultado = medir_reservas(assentos=2, concorrentes=200, saida=lambda mensagem: None)
+
+    assert resultado['status'] == {201: 2, 409: 2 * 199}
+    assert resultado['erros'] == 0
+    assert resultado['disputas_erradas'] == 0
+    assert resultado['por_segundo'] > 0
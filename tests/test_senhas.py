@@ -0,0 +1,40 @@
+from datetime import date
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from cinema import db
+from cinema.models import Usuario
+from cinema.senhas import autenticar, gerar_hash, precisa_rehash
+
+
+# O werkzeug grava o método expandido; um método curto na configuração não pode forçar rehash a cada login
+@pytest.mark.parametrize('metodo', ['scrypt', 'pbkdf2', 'pbkdf2:sha256', 'pbkdf2:sha256:600000'])
+def test_hash_com_metodo_configurado_nao_precisa_rehash(app, metodo):
+    app.config['SENHA_METODO'] = metodo
+    try:
+        with app.app_context():
+            assert not precisa_rehash(gerar_hash('segredo'))
+            outro = 'pbkdf2:sha256:1000' if metodo.startswith('scrypt') else 'scrypt'
+            assert precisa_rehash(generate_password_hash('segredo', method=outro))
+    finally:
+        app.config.pop('SENHA_METODO')
+
+
+def test_login_troca_hash_antigo(app):
+    app.config['SENHA_METODO'] = 'scrypt'
+    try:
+        with app.app_context():
+            usuario = Usuario('Antigo', 'antigo@cinema.com', generate_password_hash('segredo', method='pbkdf2'),
+                              date(2000, 1, 1))
+            db.session.add(usuario)
+            db.session.commit()
+
+            assert autenticar(usuario, 'segredo')
+            db.session.refresh(usuario)
+            assert usuario.senha.startswith('scrypt:32768:8:1$')
+            assert usuario.versao == 1
+            assert not precisa_rehash(usuario.senha)
+            assert not autenticar(usuario, 'errada')
+    finally:
+        app.config.pop('SENHA_METODO')
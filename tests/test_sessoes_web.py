@@ -0,0 +1,31 @@
+import pickle
+
+from markupsafe import Markup
+
+from cinema.sessoes_web import desserializar, serializar
+
+
+def test_dados_basicos_e_markup_voltam_iguais():
+    basicos = {'usuario_id': 1, 'is_admin': False, 'carrinho_id': None}
+    assert serializar(basicos)[:1] == b'm'
+    assert desserializar(serializar(basicos)) == basicos
+
+    com_flash = {'_flashes': [('success', Markup('<b>Compra finalizada</b>'))]}
+    volta = desserializar(serializar(com_flash))
+    assert volta == com_flash
+    assert isinstance(volta['_flashes'][0][1], Markup)
+
+
+class _Explosivo:
+    executado = False
+
+    def __reduce__(self):
+        return (setattr, (_Explosivo, 'executado', True))
+
+
+# Um pickle gravado na tabela (por uma versão antiga ou por quem tenha acesso a ela) nunca é carregado
+def test_pickle_e_formatos_desconhecidos_sao_ignorados():
+    assert desserializar(b'p' + pickle.dumps(_Explosivo())) is None
+    assert not _Explosivo.executado
+    assert desserializar(b'') is None
+    assert desserializar(b'j{quebrado') is None
@@ -0,0 +1,25 @@
+# Ponto de entrada de produção.
+#   Vários processos (Linux/macOS): gunicorn -c gunicorn.conf.py
+#       O gunicorn carrega este módulo uma vez no processo mestre (preload_app) e faz o fork dos
+#       workers, que compartilham a memória do app. kill -HUP <pid do mestre> troca os workers
+#       sem derrubar conexões (graceful restart); kill -TERM espera as requisições em andamento.
+#   Um processo com threads: python wsgi.py [porta]
+#       SIGTERM ou Ctrl+C param de aceitar conexões e esperam as requisições em andamento.
+# Streams de assentos (SSE): flask servir-eventos --porta 8001, ao lado dos workers. Em produção a
+#   página conecta nele (CINEMA_EVENTOS_URL) e o stream dentro do app fica desligado.
+# O perfil padrão aqui é producao (sem debug nem reloader); CINEMA_PERFIL troca. Exige CINEMA_SECRET_KEY
+# e o banco migrado (flask migrar, ou CINEMA_MIGRAR=1 para aplicar as migrações ao iniciar).
+import os
+import sys
+
+os.environ.setdefault('CINEMA_PERFIL', 'producao')
+
+from app import app
+from cinema.config import _env_bool
+from cinema.servidor import preaquecer, servir, verificar_esquema
+
+application = preaquecer(verificar_esquema(app, migrar=_env_bool('CINEMA_MIGRAR', False)))
+
+if __name__ == '__main__':
+    servir(application, os.environ.get('CINEMA_HOST', '0.0.0.0'),
+           int(sys.argv[1]) if len(sys.argv) > 1 else int(os.environ.get('CINEMA_PORTA', 8000)))